@@ -3,14 +3,29 @@ from dotenv import load_dotenv
 load_dotenv()  # take environment variables from .env.
 
 import os
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 
-import pandas as pd
-from langchain.chat_models import ChatOpenAI
-from langchain_experimental.agents import create_pandas_dataframe_agent
-from langchain.agents.agent_types import AgentType
+# Make the shared modules importable when running `streamlit run app.py`
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common import cache_dir
+from common.streaming import stream_tokens
+from common.tracing import trace, trace_panel
+
+# pandas, LangChain and the OpenAI client are imported on first use, once a file is
+# uploaded, so that the page paints and reruns without loading them
+if TYPE_CHECKING:
+    import pandas as pd
+    from langchain.chat_models import ChatOpenAI
+
+    from common.index_cache import IndexCache
+    from engine import AskCsvEngine, EngineRegistry
 
 # Page title
 st.set_page_config(page_title="🦜🔗 Ask the Data App")
@@ -18,11 +33,75 @@ st.title("🦜🔗 Ask the Data App")
 
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
+# Number of rows rendered in the DataFrame preview
+PREVIEW_ROWS = 100
+
+# Upper bound for the on-disk cache of parsed CSV files
+FRAME_CACHE_MAX_MB = int(os.getenv("ASK_CSV_CACHE_MAX_MB", "8192"))
+
+# Idle time after which a session's engine is dropped
+ENGINE_IDLE_TTL = float(os.getenv("ASK_CSV_ENGINE_IDLE_TTL", "1800"))
+
+
+@st.cache_resource
+def get_frame_cache() -> "IndexCache":
+    """
+    Returns the process-wide cache of parsed CSV files.
+
+    Returns:
+        - The parsed CSV cache.
+    """
+    from common.index_cache import IndexCache
+
+    # Frames stay in memory only as long as an engine uses them, reloads are
+    # served by the memory-mapped Parquet spill
+    return IndexCache(
+        cache_dir("ask_csv_frames"), max_bytes=FRAME_CACHE_MAX_MB * 1024**2, max_loaded=0
+    )
+
+
+@st.cache_resource
+def get_llm() -> "ChatOpenAI":
+    """
+    Returns the process-wide chat model, sending its requests through the shared LLM gateway.
+
+    Returns:
+        - The chat model.
+    """
+    from langchain.chat_models import ChatOpenAI
+
+    from common.llm_gateway import openai_clients
+
+    client, async_client = openai_clients()
+    return ChatOpenAI(
+        model_name="gpt-3.5-turbo-0613",
+        temperature=0.2,
+        openai_api_key=openai_api_key,
+        client=client.chat.completions,
+        async_client=async_client.chat.completions,
+        streaming=True,
+    )
+
+
+@st.cache_resource
+def get_engine_registry() -> "EngineRegistry":
+    """
+    Returns the process-wide registry of per-session engines.
+
+    Returns:
+        - The engine registry.
+    """
+    from engine import EngineRegistry
+
+    return EngineRegistry(idle_ttl=ENGINE_IDLE_TTL)
+
 
 # Load CSV file
-def load_csv(input_csv: UploadedFile) -> pd.DataFrame:
+def load_csv(input_csv: UploadedFile) -> "pd.DataFrame":
     """
-    This function loads a CSV file and displays it in a Streamlit expander.
+    This function loads a CSV file.
+
+    The file is parsed only once per content; later loads reuse the cached frame.
 
     Args:
         - input_csv: The uploaded CSV file.
@@ -30,10 +109,61 @@ def load_csv(input_csv: UploadedFile) -> pd.DataFrame:
     Returns:
         - The DataFrame created from the CSV file.
     """
-    df = pd.read_csv(input_csv)
+    from csv_loader import load_dataframe
+
+    return load_dataframe(input_csv.getvalue(), get_frame_cache())
+
+
+def show_dataframe(df: "pd.DataFrame") -> None:
+    """
+    This function displays a preview of a DataFrame in a Streamlit expander.
+
+    Args:
+        - df: The DataFrame to preview.
+    """
     with st.expander("See DataFrame"):
-        st.write(df)
-    return df
+        st.caption(
+            f"{len(df):,} rows × {len(df.columns)} columns, "
+            f"showing the first {min(len(df), PREVIEW_ROWS)}"
+        )
+        st.dataframe(df.head(PREVIEW_ROWS))
+
+
+def create_engine(csv_file: UploadedFile, verbose: bool = True) -> "AskCsvEngine":
+    """
+    This function creates an engine answering questions about the uploaded CSV file.
+
+    Args:
+        - csv_file: The uploaded CSV file.
+        - verbose: Whether the agent should operate in verbose mode.
+
+    Returns:
+        - The engine.
+    """
+    from engine import AskCsvEngine
+
+    return AskCsvEngine(load_csv(csv_file), get_llm(), verbose=verbose)
+
+
+def get_engine(csv_file: UploadedFile) -> "AskCsvEngine":
+    """
+    This function returns the engine of the current session for the uploaded CSV file.
+
+    The engine, with its loaded DataFrame, profile and agent, is reused across questions
+    and rebuilt only when a different file is uploaded.
+
+    Args:
+        - csv_file: The uploaded CSV file.
+
+    Returns:
+        - The engine of the current session.
+    """
+    session_id = get_script_run_ctx().session_id
+    return get_engine_registry().get(
+        session_id,
+        csv_file.file_id,
+        lambda: create_engine(csv_file),
+    )
 
 
 # Generate LLM response
@@ -41,7 +171,9 @@ def generate_response(csv_file: UploadedFile, input_query: str) -> st.success:
     """
     This function generates a response to a query using the uploaded CSV file and the query text.
 
-    It first loads the CSV file and creates a Pandas DataFrame Agent. Then, it performs a query using the Agent.
+    It reuses the session engine for the CSV file, which answers the query from the precomputed
+    dataset profile when possible and otherwise performs the query using a Pandas DataFrame Agent.
+    The answer is streamed into the page as it is generated.
 
     Args:
         - csv_file: The uploaded CSV file.
@@ -50,17 +182,19 @@ def generate_response(csv_file: UploadedFile, input_query: str) -> st.success:
     Returns:
         - The response to the query.
     """
-    llm = ChatOpenAI(
-        model_name="gpt-3.5-turbo-0613", temperature=0.2, openai_api_key=openai_api_key
-    )
-    df = load_csv(csv_file)
-    # Create Pandas DataFrame Agent
-    agent = create_pandas_dataframe_agent(
-        llm, df, verbose=True, agent_type=AgentType.OPENAI_FUNCTIONS
-    )
-    # Perform Query using the Agent
-    response = agent.run(input_query)
-    return st.success(response)
+    engine = get_engine(csv_file)
+    show_dataframe(engine.df)
+    # Perform Query using the engine, streaming the tokens of the answer
+    placeholder = st.empty()
+    with trace("ask_csv") as run:
+        result = stream_tokens(
+            lambda callbacks: engine.ask(input_query, callbacks),
+            placeholder,
+            render="success",
+        )
+    st.caption(result.caption())
+    trace_panel(run.trace_id if run else None)
+    return placeholder
 
 
 if __name__ == "__main__":
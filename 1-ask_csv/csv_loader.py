@@ -0,0 +1,244 @@
+"""
+Memory-efficient CSV loading with an on-disk Parquet spill.
+
+Column types are inferred once on a sample of the file: numeric columns are
+downcast to the smallest type that holds their values exactly and low-cardinality
+string columns become categoricals. The parser is given these types, so
+categorical columns are never materialized as Python strings. Large files are read in chunks,
+small ones in one multithreaded pass with the pyarrow engine. The optimized
+frame is written to Parquet so repeated loads of the same content are
+memory-mapped instead of parsed again.
+"""
+
+import io
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from common.index_cache import IndexCache
+
+# Rows used to infer the column types
+SAMPLE_ROWS = 10_000
+# Rows parsed per chunk by the default engine
+CHUNK_ROWS = 250_000
+# Files up to this size are parsed in one pass by pyarrow when the engine is "auto"
+PYARROW_MAX_BYTES = int(os.getenv("ASK_CSV_PYARROW_MAX_MB", "64")) * 1024**2
+# String columns with fewer distinct values than this share become categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+_PARQUET_FILE = "data.parquet"
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _is_text(series: pd.Series) -> bool:
+    return not isinstance(series.dtype, pd.CategoricalDtype) and (
+        pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+    )
+
+
+def infer_dtypes(sample: pd.DataFrame) -> Dict[str, str]:
+    """
+    Picks a compact type for every column based on a sample of the data.
+
+    Args:
+        - sample: The first rows of the CSV file.
+
+    Returns:
+        - A mapping of column names to "integer", "float" or "category" for the
+          columns that can be stored more compactly.
+    """
+    plan = {}
+    for column in sample.columns:
+        series = sample[column]
+        if pd.api.types.is_integer_dtype(series):
+            plan[column] = "integer"
+        elif pd.api.types.is_float_dtype(series):
+            plan[column] = "float"
+        elif _is_text(series) and len(series):
+            if series.nunique(dropna=True) / len(series) < CATEGORY_MAX_RATIO:
+                plan[column] = "category"
+    return plan
+
+
+def reader_dtypes(plan: Dict[str, str]) -> Dict[str, str]:
+    """
+    Translates a column type plan into the types applied by the CSV parser.
+
+    Narrow integer types would silently wrap values beyond the range of the sample,
+    and float32 would round most decimals, so numeric columns are parsed at full
+    width and downcast chunk by chunk, only where that loses nothing.
+
+    Args:
+        - plan: The column type plan of ``infer_dtypes``.
+
+    Returns:
+        - The ``dtype`` argument of ``pd.read_csv``.
+    """
+    types = {"integer": "int64", "float": "float64", "category": "category"}
+    return {column: types[kind] for column, kind in plan.items()}
+
+
+def _downcast_float(series: pd.Series) -> pd.Series:
+    """
+    Converts a float column to float32 only if every value survives the round trip.
+
+    Args:
+        - series: The float column.
+
+    Returns:
+        - The float32 column, or the column unchanged when float32 would round a value.
+    """
+    narrow = series.astype("float32")
+    return narrow if narrow.astype(series.dtype).equals(series) else series
+
+
+def optimize_frame(df: pd.DataFrame, plan: Dict[str, str]) -> pd.DataFrame:
+    """
+    Converts the columns of a frame to the types chosen by ``infer_dtypes``.
+
+    Args:
+        - df: The frame to convert.
+        - plan: The column type plan.
+
+    Returns:
+        - The converted frame.
+    """
+    for column, kind in plan.items():
+        if column not in df.columns:
+            continue
+        series = df[column]
+        if kind == "integer" and pd.api.types.is_integer_dtype(series):
+            df[column] = pd.to_numeric(series, downcast="integer")
+        elif kind == "float" and pd.api.types.is_float_dtype(series):
+            df[column] = _downcast_float(series)
+        elif kind == "category":
+            df[column] = series.astype("category")
+    return df
+
+
+def _concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenates chunks, merging the categories of categorical columns.
+
+    Args:
+        - chunks: The optimized chunks.
+
+    Returns:
+        - The concatenated frame.
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+
+    # Without a common set of categories pd.concat falls back to object columns
+    for column in chunks[0].columns:
+        if all(isinstance(chunk[column].dtype, pd.CategoricalDtype) for chunk in chunks):
+            categories = union_categoricals(
+                [chunk[column] for chunk in chunks]
+            ).categories
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def _read_chunks(
+    data: bytes, plan: Dict[str, str], dtypes: Optional[Dict[str, str]]
+) -> pd.DataFrame:
+    """
+    Parses CSV bytes chunk by chunk, optimizing each chunk before reading the next.
+
+    Args:
+        - data: The raw bytes of the CSV file.
+        - plan: The column type plan.
+        - dtypes: The types applied by the parser, None to let it infer them.
+
+    Returns:
+        - The parsed frame.
+    """
+    chunks = [
+        optimize_frame(chunk, plan)
+        for chunk in pd.read_csv(io.BytesIO(data), dtype=dtypes, chunksize=CHUNK_ROWS)
+    ]
+    return _concat_chunks(chunks)
+
+
+def read_csv(data: bytes, engine: str = "auto") -> pd.DataFrame:
+    """
+    Parses CSV bytes into a compact frame.
+
+    Args:
+        - data: The raw bytes of the CSV file.
+        - engine: "c" for chunked parsing, "pyarrow" for a multithreaded single pass,
+          "auto" for pyarrow up to ``PYARROW_MAX_BYTES`` and chunks above.
+
+    Returns:
+        - The parsed frame.
+    """
+    plan = infer_dtypes(pd.read_csv(io.BytesIO(data), nrows=SAMPLE_ROWS))
+    dtypes = reader_dtypes(plan)
+    if engine == "auto":
+        engine = "pyarrow" if len(data) <= PYARROW_MAX_BYTES else "c"
+
+    if engine == "pyarrow" and _has_pyarrow():
+        try:
+            df = pd.read_csv(io.BytesIO(data), engine="pyarrow", dtype=dtypes)
+        except ValueError:
+            # A value beyond the sample does not fit its inferred type
+            df = pd.read_csv(io.BytesIO(data), engine="pyarrow")
+        return optimize_frame(df, plan)
+
+    try:
+        return _read_chunks(data, plan, dtypes)
+    except ValueError:
+        # A value beyond the sample does not fit its inferred type, e.g. a missing
+        # value in an integer column: let the parser infer the types chunk by chunk
+        return _read_chunks(data, plan, None)
+
+
+def load_dataframe(data: bytes, cache: IndexCache) -> pd.DataFrame:
+    """
+    Returns the frame for the given CSV bytes, parsing them only once.
+
+    The parsed frame is spilled to Parquet (when pyarrow is installed) so later
+    loads of the same content are memory-mapped instead of parsed again. The
+    cache only keeps the frame in memory while something (a session engine)
+    still references it, see ``IndexCache``.
+
+    Args:
+        - data: The raw bytes of the CSV file.
+        - cache: The cache holding the spilled frames.
+
+    Returns:
+        - The loaded frame.
+    """
+    engine = os.getenv("ASK_CSV_ENGINE", "auto")
+    key = IndexCache.make_key(
+        data,
+        sample_rows=SAMPLE_ROWS,
+        category_max_ratio=CATEGORY_MAX_RATIO,
+        # Frames spilled before floats were kept exact must not be reused
+        floats="lossless",
+    )
+
+    def build(path: str) -> pd.DataFrame:
+        df = read_csv(data, engine=engine)
+        if _has_pyarrow():
+            df.to_parquet(Path(path) / _PARQUET_FILE, index=False)
+        return df
+
+    def load(path: str) -> pd.DataFrame:
+        parquet_path = Path(path) / _PARQUET_FILE
+        if parquet_path.exists():
+            return pd.read_parquet(parquet_path, memory_map=True)
+        return read_csv(data, engine=engine)
+
+    return cache.get_or_create(key, build, load)
@@ -0,0 +1,223 @@
+"""
+Precomputed dataset profile used to answer simple questions without the LLM.
+
+The profile (row count, schema, null counts, cardinality, numeric statistics and
+top values) is computed once per dataset with vectorized pandas operations. It
+answers schema and statistics questions directly, and its compact text form is
+given to the agent so it does not need exploratory ``df.head()`` tool calls.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+QUANTILES = (0.25, 0.5, 0.75)
+TOP_VALUES = 5
+
+# Optional trailing "in the csv/dataset/..." of a question
+_SUFFIX = r"(?:\s+(?:are\s+there\s+)?(?:in|of)\s+(?:the|this)\s+(?:csv|data|dataset|file|dataframe|table))?"
+_END = r"\s*\??\s*$"
+
+_ROWS_PATTERN = re.compile(
+    rf"^\s*how many (?:rows|records|entries|lines)(?:\s+are\s+there)?{_SUFFIX}{_END}",
+    re.IGNORECASE,
+)
+_COLUMN_COUNT_PATTERN = re.compile(
+    rf"^\s*how many columns(?:\s+are\s+there)?{_SUFFIX}{_END}", re.IGNORECASE
+)
+_COLUMN_NAMES_PATTERN = re.compile(
+    rf"^\s*(?:what are|list|show)(?: me)? the (?:column names|columns|column headers){_SUFFIX}{_END}",
+    re.IGNORECASE,
+)
+_STAT_PATTERN = re.compile(
+    rf"^\s*what is the (?P<stat>maximum|max|minimum|min|average|mean|median) "
+    rf"(?:value )?(?:of|in|for) (?:the )?(?:column )?[`'\"]?(?P<column>.+?)[`'\"]?(?: column)?{_END}",
+    re.IGNORECASE,
+)
+_NULLS_PATTERN = re.compile(
+    rf"^\s*how many (?:missing|null|nan|empty) values are there"
+    rf"(?: (?:in|of|for) (?:the )?(?:column )?[`'\"]?(?P<column>.+?)[`'\"]?(?: column)?)?{_END}",
+    re.IGNORECASE,
+)
+_DISTINCT_PATTERN = re.compile(
+    rf"^\s*how many (?:unique|distinct) values (?:are there )?(?:in|of|for) "
+    rf"(?:the )?(?:column )?[`'\"]?(?P<column>.+?)[`'\"]?(?: column)?{_END}",
+    re.IGNORECASE,
+)
+
+_STAT_NAMES = {
+    "maximum": "max",
+    "max": "max",
+    "minimum": "min",
+    "min": "min",
+    "average": "mean",
+    "mean": "mean",
+    "median": "p50",
+}
+
+
+@dataclass
+class ColumnProfile:
+    """
+    Summary statistics of a single column.
+    """
+
+    name: str
+    dtype: str
+    nulls: int
+    distinct: int
+    stats: Dict[str, Any] = field(default_factory=dict)
+    top_values: List[Tuple[Any, int]] = field(default_factory=list)
+
+
+@dataclass
+class DatasetProfile:
+    """
+    Summary statistics of a whole dataset.
+    """
+
+    rows: int
+    columns: List[ColumnProfile]
+
+    def column(self, name: str) -> Optional[ColumnProfile]:
+        """
+        Looks up a column by name, ignoring case and surrounding whitespace.
+
+        Args:
+            - name: The column name.
+
+        Returns:
+            - The column profile, or None if there is no such column.
+        """
+        wanted = name.strip().lower()
+        for column in self.columns:
+            if column.name.strip().lower() == wanted:
+                return column
+        return None
+
+    def answer(self, question: str) -> Optional[str]:
+        """
+        Answers a question directly from the profile when it matches a known form.
+
+        Args:
+            - question: The user question.
+
+        Returns:
+            - The answer, or None if the question needs the agent.
+        """
+        if _ROWS_PATTERN.match(question):
+            return f"There are {self.rows:,} rows."
+
+        if _COLUMN_COUNT_PATTERN.match(question):
+            return f"There are {len(self.columns)} columns."
+
+        if _COLUMN_NAMES_PATTERN.match(question):
+            names = ", ".join(column.name for column in self.columns)
+            return f"The column names are: {names}."
+
+        match = _STAT_PATTERN.match(question)
+        if match:
+            column = self.column(match.group("column"))
+            stat = _STAT_NAMES[match.group("stat").lower()]
+            if column is not None and stat in column.stats:
+                return f"The {match.group('stat').lower()} of {column.name} is {column.stats[stat]}."
+            return None
+
+        match = _NULLS_PATTERN.match(question)
+        if match:
+            if match.group("column") is None:
+                return f"There are {sum(c.nulls for c in self.columns):,} missing values."
+            column = self.column(match.group("column"))
+            if column is not None:
+                return f"There are {column.nulls:,} missing values in {column.name}."
+            return None
+
+        match = _DISTINCT_PATTERN.match(question)
+        if match:
+            column = self.column(match.group("column"))
+            if column is not None:
+                return f"There are {column.distinct:,} distinct values in {column.name}."
+
+        return None
+
+    def to_prompt(self) -> str:
+        """
+        Renders the profile as compact context for the agent prompt.
+
+        Returns:
+            - The profile as text.
+        """
+        lines = [f"The dataframe has {self.rows} rows and {len(self.columns)} columns:"]
+        for column in self.columns:
+            details = [column.dtype, f"nulls={column.nulls}", f"distinct={column.distinct}"]
+            details += [f"{name}={value}" for name, value in column.stats.items()]
+            if column.top_values:
+                top = ", ".join(f"{value!r} ({count})" for value, count in column.top_values)
+                details.append(f"top: {top}")
+            lines.append(f"- {column.name}: " + "; ".join(details))
+        return "\n".join(lines)
+
+
+def _scalar(value: Any) -> Any:
+    """
+    Converts NumPy scalars into plain Python values for display.
+
+    Args:
+        - value: The value to convert.
+
+    Returns:
+        - The plain Python value.
+    """
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float):
+        return round(value, 6)
+    return value
+
+
+def profile_dataframe(df: pd.DataFrame) -> DatasetProfile:
+    """
+    Computes the profile of a frame.
+
+    Args:
+        - df: The frame to profile.
+
+    Returns:
+        - The dataset profile.
+    """
+    nulls = df.isna().sum()
+    distinct = df.nunique(dropna=True)
+
+    numeric = df.select_dtypes(include="number")
+    stats: Dict[str, Dict[str, Any]] = {name: {} for name in numeric.columns}
+    if not numeric.empty:
+        summary = numeric.agg(["min", "max", "mean"])
+        quantiles = numeric.quantile(list(QUANTILES))
+        for name in numeric.columns:
+            stats[name]["min"] = _scalar(summary.at["min", name])
+            stats[name]["max"] = _scalar(summary.at["max", name])
+            stats[name]["mean"] = _scalar(summary.at["mean", name])
+            for q in QUANTILES:
+                stats[name][f"p{int(q * 100)}"] = _scalar(quantiles.at[q, name])
+
+    columns = []
+    for name in df.columns:
+        top_values = []
+        # Top values only make sense for columns that repeat values
+        if name not in stats and distinct[name] < len(df):
+            counts = df[name].value_counts(dropna=True).head(TOP_VALUES)
+            top_values = [(_scalar(value), int(count)) for value, count in counts.items()]
+        columns.append(
+            ColumnProfile(
+                name=str(name),
+                dtype=str(df[name].dtype),
+                nulls=int(nulls[name]),
+                distinct=int(distinct[name]),
+                stats=stats.get(name, {}),
+                top_values=top_values,
+            )
+        )
+
+    return DatasetProfile(rows=len(df), columns=columns)
@@ -0,0 +1,212 @@
+"""
+Session-scoped question answering engine for a loaded CSV file.
+
+An engine holds the loaded frame, its profile, the LLM client and the pandas
+agent, so follow-up questions on the same file skip all of that setup. The
+registry keeps one engine per session, rebuilds it when the session uploads a
+different file and drops engines that have been idle for too long. The engine
+owns its frame: the frame cache does not keep frames of its own, so dropping
+the engine frees the frame. That frame may also be shared with other sessions
+that opened the same file, so the agent never sees it: each question runs on a
+private copy, and the questions of an engine run one at a time.
+"""
+
+import gc
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+from langchain.agents.agent_types import AgentType
+from langchain_experimental.agents import create_pandas_dataframe_agent
+from langchain_experimental.tools.python.tool import PythonAstREPLTool
+
+from dataset_profile import profile_dataframe
+
+# Agent system prompt, followed by the dataset profile
+AGENT_PREFIX = (
+    "You are working with a pandas dataframe in Python. The name of the dataframe is `df`. "
+    "Its profile below is exact, use it instead of exploring the dataframe when it suffices."
+)
+
+
+class AskCsvEngine:
+    """
+    Answers questions about a single frame, reusing the agent across questions.
+    """
+
+    def __init__(self, df: pd.DataFrame, llm: Any, verbose: bool = True):
+        """
+        Initializes the engine.
+
+        Args:
+            - df: The frame to answer questions about.
+            - llm: The chat model used by the agent.
+            - verbose: Whether the agent should operate in verbose mode.
+        """
+        self.df = df
+        self.llm = llm
+        self.verbose = verbose
+        self.profile = profile_dataframe(df)
+        self._agent = None
+        self._lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    @property
+    def agent(self) -> Any:
+        """
+        Returns the pandas agent, creating it on first use.
+
+        Returns:
+            - The agent executor.
+        """
+        if self._agent is None:
+            self._agent = create_pandas_dataframe_agent(
+                self.llm,
+                self.df,
+                verbose=self.verbose,
+                agent_type=AgentType.OPENAI_FUNCTIONS,
+                prefix=AGENT_PREFIX + "\n\n" + self.profile.to_prompt(),
+                number_of_head_rows=3,
+            )
+        return self._agent
+
+    def _set_repl_frame(self, df: Optional[pd.DataFrame]) -> None:
+        """
+        Resets the Python tool of the agent to a fresh namespace.
+
+        Args:
+            - df: The frame bound to ``df`` in the namespace, None for an empty namespace.
+        """
+        for tool in self.agent.tools:
+            if isinstance(tool, PythonAstREPLTool):
+                tool.globals = {}
+                tool.locals = {} if df is None else {"df": df}
+
+    def ask(self, question: str, callbacks: Optional[List[Any]] = None) -> str:
+        """
+        Answers a question, from the dataset profile when possible.
+
+        Args:
+            - question: The question about the data.
+            - callbacks: LangChain callback handlers for the agent run.
+
+        Returns:
+            - The answer.
+        """
+        with self._lock:
+            self.last_used = time.monotonic()
+            # Answer schema and statistics questions without an LLM round-trip
+            answer = self.profile.answer(question)
+            if answer is not None:
+                return answer
+            # Code written by the agent (dropna(inplace=True), new columns) only changes
+            # this copy, so the frame and its profile stay exact for the next question
+            self._set_repl_frame(self.df.copy())
+            try:
+                return self.agent.run(question, callbacks=callbacks)
+            finally:
+                self._set_repl_frame(None)
+
+
+class EngineRegistry:
+    """
+    Keeps one engine per session and evicts engines left idle.
+    """
+
+    def __init__(self, idle_ttl: float = 30 * 60, sweep_interval: Optional[float] = None):
+        """
+        Initializes the registry.
+
+        Args:
+            - idle_ttl: The number of idle seconds after which an engine is dropped.
+            - sweep_interval: The seconds between two background sweeps of idle engines,
+              a tenth of the TTL (at most a minute) by default.
+        """
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval or min(idle_ttl / 10, 60.0)
+        self._lock = threading.Lock()
+        self._engines: Dict[str, Tuple[str, AskCsvEngine]] = {}
+        self._stopped = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+
+    def get(
+        self, session_id: str, file_id: str, build: Callable[[], AskCsvEngine]
+    ) -> AskCsvEngine:
+        """
+        Returns the engine of a session, building it if the file changed.
+
+        Args:
+            - session_id: The id of the user session.
+            - file_id: The id of the uploaded file.
+            - build: Creates a new engine for the uploaded file.
+
+        Returns:
+            - The engine of the session.
+        """
+        with self._lock:
+            self._evict_idle()
+            current = self._engines.get(session_id)
+            if current is not None and current[0] == file_id:
+                engine = current[1]
+                engine.last_used = time.monotonic()
+                return engine
+
+        # Build outside the lock so other sessions are not blocked by a slow load
+        engine = build()
+        with self._lock:
+            self._engines[session_id] = (file_id, engine)
+            evicted = self._evict_idle()
+            self._start_sweeper()
+        if evicted:
+            self._collect()
+        return engine
+
+    def discard(self, session_id: str) -> Optional[AskCsvEngine]:
+        """
+        Drops the engine of a session.
+
+        Args:
+            - session_id: The id of the user session.
+
+        Returns:
+            - The dropped engine, if any.
+        """
+        with self._lock:
+            entry = self._engines.pop(session_id, None)
+        return entry[1] if entry else None
+
+    def close(self) -> None:
+        """
+        Stops the background sweeper.
+        """
+        self._stopped.set()
+
+    def _evict_idle(self) -> int:
+        now = time.monotonic()
+        evicted = 0
+        for session_id, (_, engine) in list(self._engines.items()):
+            if now - engine.last_used > self.idle_ttl:
+                del self._engines[session_id]
+                evicted += 1
+        return evicted
+
+    def _start_sweeper(self) -> None:
+        # Idle engines are also dropped when no request comes in to trigger it
+        if self._sweeper is None:
+            self._sweeper = threading.Thread(
+                target=self._sweep, name="engine-sweeper", daemon=True
+            )
+            self._sweeper.start()
+
+    def _sweep(self) -> None:
+        while not self._stopped.wait(self.sweep_interval):
+            with self._lock:
+                evicted = self._evict_idle()
+            if evicted:
+                self._collect()
+
+    @staticmethod
+    def _collect() -> None:
+        # Agents hold reference cycles, collect them so the frames are freed now
+        gc.collect()
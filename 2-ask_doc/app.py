@@ -1,13 +1,29 @@
 from dotenv import load_dotenv
 import os
-from langchain_community.llms import HuggingFaceEndpoint
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores import Chroma
-from langchain.chains import RetrievalQA
-from langchain_community.embeddings import HuggingFaceHubEmbeddings
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 import streamlit as st
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 
+# Make the shared modules importable when running `streamlit run app.py`
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common import cache_dir
+from common.streaming import stream_tokens
+from common.tracing import trace, trace_panel
+
+# LangChain, Chroma and the Hugging Face Hub client are imported on first use, once a
+# question is submitted, so that the page paints and reruns without loading them
+if TYPE_CHECKING:
+    from langchain.vectorstores import Chroma
+    from langchain_community.llms import HuggingFaceEndpoint
+
+    from common.embeddings import EmbeddingCache
+    from common.index_cache import IndexCache
+    from common.response_cache import ResponseCache
+    from common.retrieval import VectorIndexRetriever
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -16,54 +32,196 @@ HUGGINGFACEHUB_API_TOKEN = os.getenv("HUGGINGFACEHUB_API_TOKEN")
 
 st.title("🦜🔗 Ask The Doc App")
 
+# Settings that shape the vector index, part of the index cache key
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 0
+EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+# Settings of the QA chain, part of the response cache key
+LLM_SETTINGS = {
+    "repo_id": "mistralai/Mistral-7B-Instruct-v0.2",
+    "max_length": 128,
+    "temperature": 0.5,
+}
+CHAIN_TYPE = "stuff"
+
+# Cosine similarity above which a cached answer to a similar question is reused
+RESPONSE_CACHE_SIMILARITY = os.getenv("RESPONSE_CACHE_SIMILARITY")
+
+# Upper bound for the on-disk index cache
+INDEX_CACHE_MAX_MB = int(os.getenv("ASK_DOC_INDEX_CACHE_MAX_MB", "2048"))
+
+
+@st.cache_resource
+def get_index_cache() -> "IndexCache":
+    """
+    Returns the process-wide cache of persisted document indexes.
+
+    Returns:
+        - The index cache.
+    """
+    from common.index_cache import IndexCache
+
+    return IndexCache(
+        cache_dir("ask_doc_indexes"), max_bytes=INDEX_CACHE_MAX_MB * 1024**2
+    )
+
+
+@st.cache_resource
+def get_embedding_cache() -> "EmbeddingCache":
+    """
+    Returns the process-wide cache of chunk embeddings.
+
+    Returns:
+        - The embedding cache.
+    """
+    from common.embeddings import EmbeddingCache
+
+    return EmbeddingCache(cache_dir("embeddings") / "vectors.sqlite")
+
 
-def generate_response(uploaded_file: UploadedFile, query_text: str) -> str:
+@st.cache_resource
+def get_response_cache() -> "ResponseCache":
+    """
+    Returns the process-wide cache of answers.
+
+    Returns:
+        - The response cache.
+    """
+    from common.response_cache import ResponseCache
+
+    return ResponseCache(
+        cache_dir("responses") / "responses.sqlite",
+        similarity_threshold=(
+            float(RESPONSE_CACHE_SIMILARITY) if RESPONSE_CACHE_SIMILARITY else None
+        ),
+    )
+
+
+@st.cache_resource
+def get_llm() -> "HuggingFaceEndpoint":
+    """
+    Returns the process-wide LLM, sending its requests through the shared LLM gateway.
+
+    Creating it validates the Hugging Face token with a request to the Hub, so it is
+    created once rather than for every question.
+
+    Returns:
+        - The LLM.
+    """
+    from langchain_community.llms import HuggingFaceEndpoint
+
+    from common.llm_gateway import configure_huggingface
+
+    configure_huggingface()
+    return HuggingFaceEndpoint(**LLM_SETTINGS, streaming=True, token=HUGGINGFACEHUB_API_TOKEN)
+
+
+@st.cache_resource(max_entries=8)
+def get_retriever(index_key: str, _db: "Chroma", _embeddings) -> "VectorIndexRetriever":
+    """
+    Returns the retriever of an indexed document, built once per document.
+
+    The backend (exact, IVF or HNSW) is picked from the number of chunks and the
+    ``RETRIEVER_*`` environment variables.
+
+    Args:
+        - index_key: The cache key of the document index.
+        - _db: The persisted vectorstore of the document.
+        - _embeddings: The embeddings used for the queries.
+
+    Returns:
+        - The retriever.
+    """
+    from common.retrieval import retriever_from_chroma
+
+    return retriever_from_chroma(_db, _embeddings)
+
+
+def generate_response(
+    uploaded_file: UploadedFile, query_text: str, callbacks: Optional[list] = None
+) -> str:
     """
     Generates a response to a query using the uploaded document and the query text.
 
     Args:
         - uploaded_file: The uploaded document.
         - query_text: The query text.
+        - callbacks: LangChain callback handlers, e.g. to stream the answer tokens.
 
     Returns:
         - The response to the query.
     """
     # Load document if file is uploaded
     if uploaded_file is not None:
-        documents = [uploaded_file.read().decode()]
+        from langchain.chains import RetrievalQA
+        from langchain.text_splitter import CharacterTextSplitter
+        from langchain.vectorstores import Chroma
+
+        from common.embeddings import create_hub_embeddings
+        from common.index_cache import IndexCache
+        from common.llm_gateway import configure_huggingface
+
+        # Send the Hugging Face Hub requests through the shared LLM gateway
+        configure_huggingface()
 
-        # Split documents into chunks
-        text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
-        texts = text_splitter.create_documents(documents)
+        data = uploaded_file.getvalue()
 
         # Select embeddings
-        embeddings = HuggingFaceHubEmbeddings(
-            model="sentence-transformers/all-mpnet-base-v2",
-            task="feature-extraction",
-            huggingfacehub_api_token=HUGGINGFACEHUB_API_TOKEN,
+        embeddings = create_hub_embeddings(
+            EMBEDDING_MODEL, HUGGINGFACEHUB_API_TOKEN, get_embedding_cache()
         )
 
-        # Create a vectorstore from documents
-        db = Chroma.from_documents(texts, embeddings)
+        def build_index(persist_directory: str) -> Chroma:
+            # Split documents into chunks
+            documents = [data.decode()]
+            text_splitter = CharacterTextSplitter(
+                chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+            )
+            texts = text_splitter.create_documents(documents)
 
-        # Create retriever interface
-        retriever = db.as_retriever()
+            # Create a vectorstore from documents
+            return Chroma.from_documents(
+                texts, embeddings, persist_directory=persist_directory
+            )
 
-        # Create QA chain
-        llm = HuggingFaceEndpoint(
-            repo_id="mistralai/Mistral-7B-Instruct-v0.2",
-            max_length=128,
-            temperature=0.5,
-            token=HUGGINGFACEHUB_API_TOKEN,
-        )
+        def load_index(persist_directory: str) -> Chroma:
+            return Chroma(
+                persist_directory=persist_directory, embedding_function=embeddings
+            )
 
-        qa = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=retriever,
+        index_key = IndexCache.make_key(
+            data,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            # The effective model, "fake/..." for the stand-in, so fake vectors are not reused
+            embedding_model=embeddings.model_name,
         )
 
-        return qa.run(query_text)
+        def answer() -> str:
+            # Reuse the persisted vectorstore of a document we have already indexed
+            db = get_index_cache().get_or_create(index_key, build_index, load_index)
+
+            # Create retriever interface over the stored vectors
+            retriever = get_retriever(index_key, db, embeddings)
+
+            # Create QA chain
+            qa = RetrievalQA.from_chain_type(
+                llm=get_llm(),
+                chain_type=CHAIN_TYPE,
+                retriever=retriever,
+            )
+
+            return qa.run(query_text, callbacks=callbacks)
+
+        # Repeated questions on the same document skip retrieval and generation
+        return get_response_cache().get_or_compute(
+            index_key,
+            query_text,
+            {**LLM_SETTINGS, "chain_type": CHAIN_TYPE},
+            answer,
+            embed_query=embeddings.embed_query,
+        )
     return "No file uploaded."
 
 
@@ -82,19 +240,28 @@ def main():
     )
 
     # Form for input and query submission
-    result = []
     with st.form("myform", clear_on_submit=True):
         submitted = st.form_submit_button(
             "Submit", disabled=not (uploaded_file and query_text)
         )
         if submitted:
-            with st.spinner("Calculating..."):
-                response = generate_response(uploaded_file, query_text)
-                result.append(response)
+            # Display result, streamed as it is generated
+            with trace("ask_doc") as run:
+                result = stream_tokens(
+                    lambda callbacks: generate_response(
+                        uploaded_file, query_text, callbacks
+                    ),
+                    st.empty(),
+                    render="info",
+                )
+            st.caption(result.caption())
+            trace_panel(run.trace_id if run else None)
 
-    # Display result
-    if len(result):
-        st.info(result[0])
+    stats = get_response_cache().stats()
+    st.sidebar.caption(
+        f"Response cache: {stats['hits']} hits, "
+        f"{stats['semantic_hits']} semantic hits, {stats['misses']} misses"
+    )
 
 
 if __name__ == "__main__":
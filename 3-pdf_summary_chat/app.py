@@ -1,15 +1,30 @@
 from dotenv import load_dotenv
 import os
-import tempfile
-from langchain_community.llms import HuggingFaceEndpoint
-from langchain.vectorstores import Chroma
-from langchain.chains import RetrievalQA
-from langchain_community.embeddings import HuggingFaceHubEmbeddings
-from langchain.chains.summarize import load_summarize_chain
-from langchain.document_loaders import PyPDFLoader
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 import streamlit as st
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 
+# Make the shared modules importable when running `streamlit run app.py`
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common import cache_dir
+from common.streaming import stream_tokens
+from common.tracing import trace, trace_panel
+from summarizer import MapReduceSummarizer, SummaryCache
+
+# LangChain, pypdf and the Hugging Face Hub client are imported on first use, once a
+# form is submitted, so that the page paints and reruns without loading them
+if TYPE_CHECKING:
+    from langchain_community.llms import HuggingFaceEndpoint
+
+    from common.embeddings import EmbeddingCache
+    from common.index_cache import IndexCache
+    from common.response_cache import ResponseCache
+    from common.retrieval import VectorIndexRetriever
+    from ingest import IngestedPdf
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -19,32 +34,147 @@ HUGGINGFACEHUB_API_TOKEN = os.getenv("HUGGINGFACEHUB_API_TOKEN")
 # Page title
 st.title("🦜🔗 Chat With The Paper")
 
+EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+# Concurrency of the summarization map/reduce LLM calls
+SUMMARY_MAX_WORKERS = int(os.getenv("SUMMARY_MAX_WORKERS", "4"))
+SUMMARY_FAN_IN = int(os.getenv("SUMMARY_FAN_IN", "4"))
+
+# Cosine similarity above which a cached answer to a similar question is reused
+RESPONSE_CACHE_SIMILARITY = os.getenv("RESPONSE_CACHE_SIMILARITY")
+
+# Upper bound for the on-disk cache of parsed PDFs
+PDF_CACHE_MAX_MB = int(os.getenv("PDF_CACHE_MAX_MB", "1024"))
+
+
+@st.cache_resource
+def get_embedding_cache() -> "EmbeddingCache":
+    """
+    Returns the process-wide cache of chunk embeddings.
+
+    Returns:
+        - The embedding cache.
+    """
+    from common.embeddings import EmbeddingCache
+
+    return EmbeddingCache(cache_dir("embeddings") / "vectors.sqlite")
 
-def summarize_pdf(uploaded_file: UploadedFile, llm: HuggingFaceEndpoint) -> str:
+
+@st.cache_resource
+def get_summary_cache() -> SummaryCache:
+    """
+    Returns the process-wide cache of intermediate chunk summaries.
+
+    Returns:
+        - The summary cache.
+    """
+    return SummaryCache(cache_dir("pdf_summaries") / "summaries.sqlite")
+
+
+@st.cache_resource
+def get_response_cache() -> "ResponseCache":
+    """
+    Returns the process-wide cache of answers.
+
+    Returns:
+        - The response cache.
+    """
+    from common.response_cache import ResponseCache
+
+    return ResponseCache(
+        cache_dir("responses") / "responses.sqlite",
+        similarity_threshold=(
+            float(RESPONSE_CACHE_SIMILARITY) if RESPONSE_CACHE_SIMILARITY else None
+        ),
+    )
+
+
+@st.cache_resource
+def get_pdf_cache() -> "IndexCache":
+    """
+    Returns the process-wide cache of parsed PDFs.
+
+    Returns:
+        - The parsed PDF cache.
+    """
+    from common.index_cache import IndexCache
+
+    return IndexCache(cache_dir("pdf_pages"), max_bytes=PDF_CACHE_MAX_MB * 1024**2)
+
+
+def load_pdf(uploaded_file: UploadedFile) -> "IngestedPdf":
+    """
+    Parses the uploaded PDF once and returns its cached pages and chunks.
+
+    Args:
+        - uploaded_file: The uploaded PDF file.
+
+    Returns:
+        - The handle on the parsed PDF.
+    """
+    from ingest import ingest_pdf
+
+    return ingest_pdf(uploaded_file.getvalue(), get_pdf_cache(), uploaded_file.name)
+
+
+@st.cache_resource(max_entries=8)
+def get_retriever(pdf_key: str, _pdf: "IngestedPdf", _embeddings) -> "VectorIndexRetriever":
+    """
+    Returns the retriever over the pages of a PDF, built once per PDF.
+
+    The backend (exact, IVF or HNSW) is picked from the number of pages and the
+    ``RETRIEVER_*`` environment variables.
+
+    Args:
+        - pdf_key: The cache key of the parsed PDF.
+        - _pdf: The parsed PDF.
+        - _embeddings: The embeddings used for the pages and the queries.
+
+    Returns:
+        - The retriever.
+    """
+    from common.retrieval import build_retriever
+
+    return build_retriever(list(_pdf.pages()), _embeddings)
+
+
+def summarize_pdf(
+    uploaded_file: UploadedFile,
+    llm: "HuggingFaceEndpoint",
+    callbacks: Optional[list] = None,
+) -> str:
     """
     Generates a summary of the uploaded PDF file.
 
     Args:
         - uploaded_file: The uploaded PDF file.
         - llm: The language model to use for summarization.
+        - callbacks: LangChain callback handlers, e.g. to stream the summary tokens.
 
     Returns:
         - The summary of the PDF file.
     """
-    if uploaded_file is not None:
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_file_path = tmp_file.name
-
-    loader = PyPDFLoader(tmp_file_path)
-    docs = loader.load_and_split()
-    chain = load_summarize_chain(llm, chain_type="map_reduce")
-    summary = chain.run(docs)
+    if uploaded_file is None:
+        return "No file uploaded."
+
+    pdf = load_pdf(uploaded_file)
+    summarizer = MapReduceSummarizer(
+        llm,
+        cache=get_summary_cache(),
+        max_workers=SUMMARY_MAX_WORKERS,
+        fan_in=SUMMARY_FAN_IN,
+    )
+    summary = summarizer.summarize(
+        [doc.page_content for doc in pdf.chunks()], callbacks=callbacks
+    )
     return summary
 
 
 def chat_with_pdf(
-    uploaded_file: UploadedFile, query_text: str, llm: HuggingFaceEndpoint
+    uploaded_file: UploadedFile,
+    query_text: str,
+    llm: "HuggingFaceEndpoint",
+    callbacks: Optional[list] = None,
 ) -> str:
     """
     Generates a response to a query using the uploaded PDF file and the query text.
@@ -53,63 +183,102 @@ def chat_with_pdf(
         - uploaded_file: The uploaded PDF file.
         - query_text: The query text.
         - llm: The language model to use for the QA chain.
+        - callbacks: LangChain callback handlers, e.g. to stream the answer tokens.
 
     Returns:
         - The response to the query.
     """
     if uploaded_file is not None:
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_file_path = tmp_file.name
+        from langchain.chains import RetrievalQA
+
+        from common.embeddings import create_hub_embeddings
 
         # Load the PDF
-        loader = PyPDFLoader(file_path=tmp_file_path)
-        data = loader.load()
+        pdf = load_pdf(uploaded_file)
 
         # Select embeddings
-        embeddings = HuggingFaceHubEmbeddings(
-            model="sentence-transformers/all-mpnet-base-v2",
-            task="feature-extraction",
-            huggingfacehub_api_token=HUGGINGFACEHUB_API_TOKEN,
+        embeddings = create_hub_embeddings(
+            EMBEDDING_MODEL, HUGGINGFACEHUB_API_TOKEN, get_embedding_cache()
         )
 
-        # Create a vectorstore from documents
-        db = Chroma.from_documents(data, embeddings)
+        def answer() -> str:
+            # Create retriever interface, reused across questions on the same PDF
+            retriever = get_retriever(pdf.key, pdf, embeddings)
 
-        # Create retriever interface
-        retriever = db.as_retriever()
+            # Create QA chain
+            qa = RetrievalQA.from_chain_type(
+                llm=llm,
+                chain_type="stuff",
+                retriever=retriever,
+            )
+            return qa.run(query_text, callbacks=callbacks)
 
-        # Create QA chain
-        qa = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=retriever,
+        # Repeated questions on the same PDF skip retrieval and generation
+        return get_response_cache().get_or_compute(
+            pdf.key,
+            query_text,
+            {**llm._identifying_params, "chain_type": "stuff"},
+            answer,
+            embed_query=embeddings.embed_query,
         )
-        return qa.run(query_text)
 
 
-def main():
+def create_llm() -> "HuggingFaceEndpoint":
     """
-    Main function to run the Streamlit UI.
+    Creates the language model used for summaries and answers.
+
+    Returns:
+        - The streaming Hugging Face endpoint.
     """
-    # File upload
-    uploaded_file = st.file_uploader("Upload a .pdf file.", type="pdf")
+    from langchain_community.llms import HuggingFaceEndpoint
+
+    from common.llm_gateway import configure_huggingface
 
-    # Initialize the language model
-    llm = HuggingFaceEndpoint(
+    # Send the Hugging Face Hub requests through the shared LLM gateway
+    configure_huggingface()
+    return HuggingFaceEndpoint(
         repo_id="mistralai/Mistral-7B-Instruct-v0.2",
         max_length=128,
         temperature=0.5,
+        streaming=True,
         token=HUGGINGFACEHUB_API_TOKEN,
     )
 
+
+@st.cache_resource
+def get_llm() -> "HuggingFaceEndpoint":
+    """
+    Returns the process-wide language model.
+
+    Creating it validates the Hugging Face token with a request to the Hub, so it is
+    created once rather than on every rerun.
+
+    Returns:
+        - The streaming Hugging Face endpoint.
+    """
+    return create_llm()
+
+
+def main():
+    """
+    Main function to run the Streamlit UI.
+    """
+    # File upload
+    uploaded_file = st.file_uploader("Upload a .pdf file.", type="pdf")
+
     # Summarization form
     with st.form("summary_form", clear_on_submit=True):
         submitted = st.form_submit_button("Summarize ...", disabled=not uploaded_file)
         if submitted:
-            with st.spinner("Calculating..."):
-                response = summarize_pdf(uploaded_file, llm)
-                st.info(response)
+            llm = get_llm()
+            with trace("pdf_summary") as run:
+                result = stream_tokens(
+                    lambda callbacks: summarize_pdf(uploaded_file, llm, callbacks),
+                    st.empty(),
+                    render="info",
+                )
+            st.caption(result.caption())
+            trace_panel(run.trace_id if run else None)
 
     # Query text input
     query_text = st.text_input(
@@ -119,19 +288,29 @@ def main():
     )
 
     # QA form
-    result = []
     with st.form("chat_form", clear_on_submit=True):
         submitted = st.form_submit_button(
             "Ask PDF ...", disabled=not (uploaded_file and query_text)
         )
         if submitted:
-            with st.spinner("Calculating..."):
-                response = chat_with_pdf(uploaded_file, query_text, llm)
-                result.append(response)
+            llm = get_llm()
+            # Display result, streamed as it is generated
+            with trace("pdf_chat") as run:
+                result = stream_tokens(
+                    lambda callbacks: chat_with_pdf(
+                        uploaded_file, query_text, llm, callbacks
+                    ),
+                    st.empty(),
+                    render="info",
+                )
+            st.caption(result.caption())
+            trace_panel(run.trace_id if run else None)
 
-    # Display result
-    if result:
-        st.info(result[0])
+    stats = get_response_cache().stats()
+    st.sidebar.caption(
+        f"Response cache: {stats['hits']} hits, "
+        f"{stats['semantic_hits']} semantic hits, {stats['misses']} misses"
+    )
 
 
 if __name__ == "__main__":
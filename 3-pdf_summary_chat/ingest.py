@@ -0,0 +1,128 @@
+"""
+Single-parse PDF ingestion shared by the summarize and chat paths.
+
+A PDF is parsed once per content hash. Pages are extracted one at a time and
+appended, together with their split chunks, to gzip-compressed JSON lines
+files, so memory stays flat for large PDFs and later requests just stream the
+cached records back. No temporary copy of the upload is written to disk.
+"""
+
+import gzip
+import io
+import json
+from pathlib import Path
+from typing import Iterator
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+from common.index_cache import IndexCache
+
+# Same defaults as PyPDFLoader.load_and_split
+CHUNK_SIZE = 4000
+CHUNK_OVERLAP = 200
+
+_PAGES_FILE = "pages.jsonl.gz"
+_CHUNKS_FILE = "chunks.jsonl.gz"
+
+
+def _read_documents(path: Path) -> Iterator[Document]:
+    """
+    Streams documents back from a gzip-compressed JSON lines file.
+
+    Args:
+        - path: The path of the file.
+
+    Yields:
+        - The stored documents, in order.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            yield Document(page_content=record["text"], metadata=record["metadata"])
+
+
+class IngestedPdf:
+    """
+    Handle on the cached pages and chunks of a parsed PDF.
+    """
+
+    def __init__(self, key: str, path: Path):
+        """
+        Initializes the handle.
+
+        Args:
+            - key: The content hash of the PDF.
+            - path: The directory holding the cached records.
+        """
+        self.key = key
+        self.path = Path(path)
+
+    def pages(self) -> Iterator[Document]:
+        """
+        Streams one document per PDF page, like ``PyPDFLoader.load``.
+
+        Yields:
+            - The page documents.
+        """
+        return _read_documents(self.path / _PAGES_FILE)
+
+    def chunks(self) -> Iterator[Document]:
+        """
+        Streams the split chunks, like ``PyPDFLoader.load_and_split``.
+
+        Yields:
+            - The chunk documents.
+        """
+        return _read_documents(self.path / _CHUNKS_FILE)
+
+
+def _parse_pdf(data: bytes, source: str, path: Path) -> None:
+    """
+    Parses a PDF page by page into the cache directory.
+
+    Args:
+        - data: The raw bytes of the PDF.
+        - source: The source name stored in the document metadata.
+        - path: The directory to write the records into.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+    )
+    reader = PdfReader(io.BytesIO(data))
+
+    with gzip.open(path / _PAGES_FILE, "wt", encoding="utf-8") as pages_file, gzip.open(
+        path / _CHUNKS_FILE, "wt", encoding="utf-8"
+    ) as chunks_file:
+        for number, page in enumerate(reader.pages):
+            metadata = {"source": source, "page": number}
+            text = page.extract_text()
+            pages_file.write(json.dumps({"text": text, "metadata": metadata}) + "\n")
+            for chunk in text_splitter.split_text(text):
+                chunks_file.write(
+                    json.dumps({"text": chunk, "metadata": metadata}) + "\n"
+                )
+
+
+def ingest_pdf(data: bytes, cache: IndexCache, source: str = "upload.pdf") -> IngestedPdf:
+    """
+    Returns the parsed PDF, parsing it only if its content was never seen before.
+
+    Args:
+        - data: The raw bytes of the PDF.
+        - cache: The cache holding the parsed PDFs.
+        - source: The source name stored in the document metadata.
+
+    Returns:
+        - The handle on the cached pages and chunks.
+    """
+    key = IndexCache.make_key(
+        data, parser="pypdf", chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+    )
+
+    def build(path: str) -> IngestedPdf:
+        _parse_pdf(data, source, Path(path))
+        return IngestedPdf(key, Path(path))
+
+    return cache.get_or_create(key, build, lambda path: IngestedPdf(key, Path(path)))
@@ -0,0 +1,235 @@
+"""
+Incremental map-reduce summarization with cached intermediate summaries.
+
+Every map and combine step is cached by the hash of its input text, the prompt
+version and the model parameters. Map calls run concurrently and the partial
+summaries are reduced in a tree whose groups end at content-defined boundaries,
+not at fixed positions. Inserting or removing a chunk then only changes the
+groups around it, so re-summarizing a lightly edited document only calls the LLM
+for the changed chunks and their ancestors, plus the odd neighbouring group.
+"""
+
+import contextvars
+import hashlib
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, List, Optional
+
+# Same prompts as LangChain's default map_reduce summarize chain
+MAP_PROMPT = """Write a concise summary of the following:
+
+
+"{text}"
+
+
+CONCISE SUMMARY:"""
+COMBINE_PROMPT = MAP_PROMPT
+
+# Bump when the prompts change in a way their text does not capture
+PROMPT_VERSION = "1"
+
+
+class SummaryCache:
+    """
+    SQLite store of intermediate summaries keyed by their input hash.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Opens (and creates if needed) the cache database.
+
+        Args:
+            - path: The path of the SQLite database file.
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, summary TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached summary for the given key, if any.
+
+        Args:
+            - key: The cache key.
+
+        Returns:
+            - The cached summary or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, summary: str) -> None:
+        """
+        Stores a summary in the cache.
+
+        Args:
+            - key: The cache key.
+            - summary: The summary to store.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary) VALUES (?, ?)",
+                (key, summary),
+            )
+            self._conn.commit()
+
+
+class MapReduceSummarizer:
+    """
+    Summarizes chunks concurrently and reduces the partial summaries in a tree.
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        cache: Optional[SummaryCache] = None,
+        max_workers: int = 4,
+        fan_in: int = 4,
+    ):
+        """
+        Initializes the summarizer.
+
+        Args:
+            - llm: The language model to use for summarization.
+            - cache: The cache of intermediate summaries, or None to disable it.
+            - max_workers: The maximum number of concurrent LLM calls.
+            - fan_in: The average number of summaries combined per reduce step.
+        """
+        self.llm = llm
+        self.cache = cache
+        self.max_workers = max_workers
+        self.fan_in = max(2, fan_in)
+        # The model parameters take part in every cache key
+        self._model_key = json.dumps(
+            getattr(llm, "_identifying_params", {}), sort_keys=True, default=str
+        )
+        self.llm_calls = 0
+        self._calls_lock = threading.Lock()
+
+    def _cache_key(self, prompt: str, text: str) -> str:
+        digest = hashlib.sha256()
+        for part in (PROMPT_VERSION, prompt, self._model_key, text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _summarize(
+        self, prompt: str, text: str, callbacks: Optional[List[Any]] = None
+    ) -> str:
+        """
+        Runs a single map or combine step, using the cache when possible.
+
+        Args:
+            - prompt: The prompt template with a ``{text}`` placeholder.
+            - text: The text to summarize.
+            - callbacks: LangChain callback handlers for the LLM call.
+
+        Returns:
+            - The summary of the text.
+        """
+        key = self._cache_key(prompt, text)
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        result = self.llm.invoke(
+            prompt.format(text=text), config={"callbacks": callbacks}
+        )
+        with self._calls_lock:
+            self.llm_calls += 1
+        summary = getattr(result, "content", result).strip()
+        if self.cache:
+            self.cache.put(key, summary)
+        return summary
+
+    def _summarize_all(
+        self, executor: ThreadPoolExecutor, prompt: str, texts: List[str]
+    ) -> List[str]:
+        """
+        Runs map or combine steps concurrently.
+
+        Args:
+            - executor: The thread pool.
+            - prompt: The prompt template with a ``{text}`` placeholder.
+            - texts: The texts to summarize.
+
+        Returns:
+            - The summaries in the order of the texts.
+        """
+        # Steps run in the context of the caller, e.g. its trace
+        contexts = [contextvars.copy_context() for _ in texts]
+        return list(
+            executor.map(
+                lambda text, context: context.run(self._summarize, prompt, text),
+                texts,
+                contexts,
+            )
+        )
+
+    def _groups(self, summaries: List[str]) -> List[str]:
+        """
+        Splits one tree level into the texts of its combine steps.
+
+        A group ends after a summary whose hash is a multiple of the fan-in, once it
+        holds two summaries, or when it reaches twice the fan-in. The boundaries
+        depend on the summaries only, so unchanged runs of summaries form the same
+        groups, with the same cache keys, wherever they sit in the document.
+
+        Args:
+            - summaries: The summaries of the level, in document order.
+
+        Returns:
+            - The joined summaries of every group.
+        """
+        groups: List[str] = []
+        current: List[str] = []
+        for summary in summaries:
+            current.append(summary)
+            digest = hashlib.sha256(summary.encode("utf-8")).digest()
+            boundary = int.from_bytes(digest[:8], "big") % self.fan_in == 0
+            if (boundary and len(current) >= 2) or len(current) >= 2 * self.fan_in:
+                groups.append("\n\n".join(current))
+                current = []
+        if current:
+            groups.append("\n\n".join(current))
+        return groups
+
+    def summarize(self, chunks: List[str], callbacks: Optional[List[Any]] = None) -> str:
+        """
+        Summarizes the given chunks into a single summary.
+
+        Args:
+            - chunks: The chunk texts in document order.
+            - callbacks: LangChain callback handlers for the final combine step only,
+              e.g. to stream the tokens of the summary.
+
+        Returns:
+            - The summary of the whole document.
+        """
+        if not chunks:
+            return ""
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Map step
+            summaries = self._summarize_all(executor, MAP_PROMPT, chunks)
+
+            # Reduce step, one tree level at a time
+            while len(summaries) > 1:
+                groups = self._groups(summaries)
+                if len(groups) == 1:
+                    break
+                summaries = self._summarize_all(executor, COMBINE_PROMPT, groups)
+
+        # The root combine step, also run for a single chunk like the original chain
+        return self._summarize(COMBINE_PROMPT, "\n\n".join(summaries), callbacks)
@@ -1,9 +1,24 @@
 from dotenv import load_dotenv
 import os
+import sys
+from pathlib import Path
 import streamlit as st
-from crewai import Agent, Task, Crew
 import warnings
-from typing import Dict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+# Make the shared modules importable when running `streamlit run app.py`
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common import cache_dir
+from common.streaming import stream_tasks
+from common.tracing import current_trace, span, trace, trace_panel
+from stage_cache import STAGES, StageCache, stage_fingerprint, stage_key
+
+# crewAI and LangChain are imported on first use, once content is generated, so that
+# the page paints and reruns without loading them
+if TYPE_CHECKING:
+    from crewai import Agent, Crew, Task
 
 # Load environment variables from .env file
 load_dotenv()
@@ -15,10 +30,24 @@ warnings.filterwarnings("ignore")
 openai_api_key = os.getenv("OPENAI_API_KEY")
 os.environ["OPENAI_MODEL_NAME"] = "gpt-3.5-turbo"
 
+# Bump to invalidate the cached stage outputs after a change the prompts do not show
+PROMPT_VERSION = "1"
+
+
+@st.cache_resource
+def get_stage_cache() -> StageCache:
+    """
+    Returns the cache of the planner, writer and editor outputs.
+
+    Returns:
+        - The stage cache.
+    """
+    return StageCache(cache_dir("content_stages") / "stages.sqlite")
+
 
 def create_agent(
     role: str, goal: str, backstory: str, allow_delegation: bool, verbose: bool
-) -> Agent:
+) -> "Agent":
     """
     Creates an agent with the given parameters.
 
@@ -32,16 +61,22 @@ def create_agent(
     Returns:
         - An instance of the Agent class.
     """
+    from crewai import Agent
+
+    from common.llm_gateway import chat_openai
+
     return Agent(
         role=role,
         goal=goal,
         backstory=backstory,
         allow_delegation=allow_delegation,
         verbose=verbose,
+        # One model per agent, all sharing the connections and limits of the gateway
+        llm=chat_openai(),
     )
 
 
-def create_task(description: str, expected_output: str, agent: Agent) -> Task:
+def create_task(description: str, expected_output: str, agent: "Agent") -> "Task":
     """
     Creates a task with the given parameters.
 
@@ -53,6 +88,8 @@ def create_task(description: str, expected_output: str, agent: Agent) -> Task:
     Returns:
         - An instance of the Task class.
     """
+    from crewai import Task
+
     return Task(
         description=description,
         expected_output=expected_output,
@@ -60,7 +97,9 @@ def create_task(description: str, expected_output: str, agent: Agent) -> Task:
     )
 
 
-def create_crew(agents: list, tasks: list, verbose: int) -> Crew:
+def create_crew(
+    agents: list, tasks: list, verbose: int, task_callback: Optional[Callable] = None
+) -> "Crew":
     """
     Creates a crew with the given agents and tasks.
 
@@ -68,14 +107,19 @@ def create_crew(agents: list, tasks: list, verbose: int) -> Crew:
         - agents: A list of Agent instances.
         - tasks: A list of Task instances.
         - verbose: The verbosity level.
+        - task_callback: Called with the output of each task once it is done.
 
     Returns:
         - An instance of the Crew class.
     """
-    return Crew(agents=agents, tasks=tasks, verbose=verbose)
+    from crewai import Crew
+
+    return Crew(
+        agents=agents, tasks=tasks, verbose=verbose, task_callback=task_callback
+    )
 
 
-def initialize_agents() -> Dict[str, Agent]:
+def initialize_agents() -> Dict[str, "Agent"]:
     """
     Initializes the content planner, writer, and editor agents.
 
@@ -109,7 +153,7 @@ def initialize_agents() -> Dict[str, Agent]:
     return {"planner": planner, "writer": writer, "editor": editor}
 
 
-def initialize_tasks(agents: Dict[str, Agent]) -> list:
+def initialize_tasks(agents: Dict[str, "Agent"]) -> list:
     """
     Initializes the tasks for the content planner, writer, and editor.
 
@@ -153,26 +197,117 @@ def initialize_tasks(agents: Dict[str, Agent]) -> list:
     return [plan, write, edit]
 
 
-def run_crew(topic: str, verbose: int) -> str:
+@dataclass
+class StageRun:
+    """
+    Outputs of the planner, writer and editor stages of one run.
+    """
+
+    outputs: Dict[str, str] = field(default_factory=dict)
+    # Stages served from the cache instead of being generated
+    cached: List[str] = field(default_factory=list)
+
+
+def run_stages(
+    topic: str,
+    verbose: int,
+    task_callback: Optional[Callable] = None,
+    start_stage: Optional[str] = None,
+    cache: Optional[StageCache] = None,
+    agents: Optional[Dict[str, "Agent"]] = None,
+) -> StageRun:
+    """
+    Runs the plan, write and edit stages, reusing cached outputs.
+
+    Each stage runs as a single-task crew whose context is the output of the
+    previous stage, cached or not, as in the sequential crew. Within a trace
+    (see ``common.tracing``), each stage is recorded as a span.
+
+    Args:
+        - topic: The topic for the content.
+        - verbose: The verbosity level.
+        - task_callback: Called with the output of each task once it is done or read from the cache.
+        - start_stage: The first stage to regenerate, e.g. "edit" to re-edit the cached
+          draft. By default every stage is read from the cache when possible.
+        - cache: The stage cache, the shared one by default.
+        - agents: The planner, writer and editor agents, created when not given.
+
+    Returns:
+        - The stage outputs.
+    """
+    from crewai.tasks.task_output import TaskOutput
+
+    if start_stage is not None and start_stage not in STAGES:
+        raise ValueError(f"Unknown stage: {start_stage}")
+    cache = cache or get_stage_cache()
+    agents = agents or initialize_agents()
+    tasks = dict(zip(STAGES, initialize_tasks(agents)))
+    stage_agents = dict(zip(STAGES, (agents["planner"], agents["writer"], agents["editor"])))
+    first_generated = STAGES.index(start_stage) if start_stage else len(STAGES)
+
+    run = StageRun()
+    traced = current_trace()
+    if traced is not None:
+        traced.attach(agents.values())
+    upstream: Optional[str] = None
+    upstream_task: Optional["Task"] = None
+    try:
+        for index, stage in enumerate(STAGES):
+            agent, task = stage_agents[stage], tasks[stage]
+            fingerprint = stage_fingerprint(agent, task, PROMPT_VERSION)
+            # Outputs produced with older prompts can never be hit again
+            cache.invalidate_stale(stage, fingerprint)
+            key = stage_key(stage, topic, fingerprint, upstream)
+
+            with span(stage, "stage") as step:
+                output = cache.get(key) if index < first_generated else None
+                step.set(cache="miss" if output is None else "hit")
+
+                if output is not None:
+                    task.interpolate_inputs({"topic": topic})
+                    task.output = TaskOutput(
+                        description=task.description, exported_output=output, raw_output=output
+                    )
+                    run.cached.append(stage)
+                    if task_callback is not None:
+                        task_callback(task.output)
+                else:
+                    if upstream_task is not None:
+                        task.context = [upstream_task]
+                    crew = create_crew(
+                        agents=[agent], tasks=[task], verbose=verbose, task_callback=task_callback
+                    )
+                    output = str(crew.kickoff(inputs={"topic": topic}))
+                    cache.put(key, stage, topic, fingerprint, output)
+                step.set(output_chars=len(output))
+
+            run.outputs[stage] = output
+            upstream, upstream_task = output, task
+    finally:
+        if traced is not None:
+            traced.detach(agents.values())
+    return run
+
+
+def run_crew(
+    topic: str,
+    verbose: int,
+    task_callback: Optional[Callable] = None,
+    start_stage: Optional[str] = None,
+) -> str:
     """
     Runs the multi-agent system to generate content on the given topic.
 
     Args:
         - topic: The topic for the content.
         - verbose: The verbosity level.
+        - task_callback: Called with the output of each task once it is done.
+        - start_stage: The first stage to regenerate, cached stages are reused by default.
 
     Returns:
         - The generated content in markdown format.
     """
-    agents = initialize_agents()
-    tasks = initialize_tasks(agents)
-    crew = create_crew(
-        agents=[agents["planner"], agents["writer"], agents["editor"]],
-        tasks=tasks,
-        verbose=verbose,
-    )
-    result = crew.kickoff(inputs={"topic": topic})
-    return result
+    return run_stages(topic, verbose, task_callback, start_stage).outputs["edit"]
 
 
 def main():
@@ -184,12 +319,28 @@ def main():
     topic = st.text_input(
         "Enter the topic for the content:", value="Artificial Intelligence"
     )
-    verbose = st.selectbox("Select verbosity level:", [0, 1, 2], index=2)
+    verbose = st.selectbox("Select verbosity level:", [0, 1, 2], index=0)
+    start_stage = st.selectbox(
+        "Regenerate from stage:",
+        [None, *STAGES],
+        format_func=lambda stage: "Nothing, reuse cached stages" if stage is None else stage,
+    )
 
     if st.button("Generate Content"):
-        result = run_crew(topic, verbose)
+        runs: List[StageRun] = []
+
+        def run(task_callback: Callable) -> str:
+            runs.append(run_stages(topic, verbose, task_callback, start_stage))
+            return runs[-1].outputs["edit"]
+
+        with trace("content_generator", topic=topic) as traced:
+            result = stream_tasks(run, st.container())
         st.markdown("### Generated Content")
-        st.markdown(result)
+        st.markdown(result.text)
+        st.caption(result.caption("task"))
+        if runs[-1].cached:
+            st.caption(f"Served from the cache: {', '.join(runs[-1].cached)}")
+        trace_panel(traced.trace_id if traced else None)
 
 
 if __name__ == "__main__":
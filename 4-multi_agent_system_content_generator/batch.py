@@ -0,0 +1,303 @@
+"""
+Batch mode of the content generator.
+
+Generates one article per topic with up to ``--workers`` crews running at the
+same time. All their LLM calls share one token bucket, so the batch never
+exceeds ``--rpm`` requests per minute. Each article is written to the output
+directory as soon as it is done, and one JSON line per article is appended to
+``manifest.jsonl`` there. Logs are JSON lines on stderr and the crews run
+quietly; the run ends with a throughput report (articles per hour, tokens per
+article, latency percentiles).
+
+Stage outputs go through the same stage cache as the app, so topics generated
+recently are served from it and an interrupted batch is cheap to rerun.
+
+Usage:
+    python batch.py topics.txt --output-dir articles --workers 4 --rpm 60
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import statistics
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from app import initialize_agents, run_stages
+from common import text_hash
+from common.rate_limit import RateLimitCallbackHandler, TokenBucket
+from common.tracing import trace
+from stage_cache import STAGES, normalize_topic
+
+logger = logging.getLogger(__name__)
+
+USAGE_KEYS = ("prompt_tokens", "completion_tokens", "total_tokens", "successful_requests")
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats log records as one JSON object per line.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def read_topics(path: Path) -> Iterator[str]:
+    """
+    Reads topics from a text file (one per line), a CSV file with a ``topic``
+    column or a JSONL file of ``{"topic": ...}`` objects.
+
+    Args:
+        - path: The topics file.
+
+    Returns:
+        - An iterator over the topics.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        suffix = path.suffix.lower()
+        if suffix == ".csv":
+            topics = (row["topic"] for row in csv.DictReader(file))
+        elif suffix == ".jsonl":
+            topics = (json.loads(line)["topic"] for line in file if line.strip())
+        else:
+            topics = (line for line in file if not line.startswith("#"))
+        for topic in topics:
+            if topic.strip():
+                yield topic.strip()
+
+
+def slugify(topic: str) -> str:
+    """
+    Builds the file name stem of an article.
+
+    Args:
+        - topic: The topic.
+
+    Returns:
+        - The slug of the topic, followed by a short hash of the topic so that topics
+          with the same slug (punctuation, non-ASCII, long prefixes) get distinct files.
+    """
+    topic = normalize_topic(topic)
+    slug = re.sub(r"[^a-z0-9]+", "-", topic).strip("-")[:80] or "article"
+    return f"{slug}-{text_hash(topic)[:8]}"
+
+
+def write_article(output_dir: Path, topic: str, text: str) -> Path:
+    """
+    Writes an article, replacing the file atomically so readers never see half of it.
+
+    Args:
+        - output_dir: The output directory.
+        - topic: The topic.
+        - text: The article in markdown format.
+
+    Returns:
+        - The path of the article.
+    """
+    path = output_dir / f"{slugify(topic)}.md"
+    partial = path.with_suffix(".md.tmp")
+    partial.write_text(text, encoding="utf-8")
+    os.replace(partial, path)
+    return path
+
+
+class ArticleWorker:
+    """
+    Generates one article with fresh, quiet agents under the shared rate limit.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        rate_limiter: RateLimitCallbackHandler,
+        start_stage: Optional[str] = None,
+    ):
+        """
+        Initializes the worker.
+
+        Args:
+            - output_dir: The directory the articles are written to.
+            - rate_limiter: The callback handler shared by every crew.
+            - start_stage: The first stage to regenerate, cached stages are reused by default.
+        """
+        self.output_dir = output_dir
+        self.rate_limiter = rate_limiter
+        self.start_stage = start_stage
+
+    def __call__(self, topic: str) -> Dict[str, Any]:
+        """
+        Generates the article of one topic and writes it to disk.
+
+        Args:
+            - topic: The topic.
+
+        Returns:
+            - The manifest record of the article.
+        """
+        agents = initialize_agents()
+        for agent in agents.values():
+            # The agents print every step when verbose, too much for a batch
+            agent.verbose = False
+            if not isinstance(agent.llm.callbacks, list):
+                agent.llm.callbacks = []
+            agent.llm.callbacks.append(self.rate_limiter)
+
+        record: Dict[str, Any] = {"topic": topic}
+        start = time.perf_counter()
+        try:
+            with trace("content_batch", topic=topic):
+                run = run_stages(topic, 0, start_stage=self.start_stage, agents=agents)
+            path = write_article(self.output_dir, topic, run.outputs["edit"])
+            record.update(status="ok", file=path.name, cached_stages=run.cached)
+        except Exception as exc:
+            logger.exception("Article failed", extra={"fields": {"topic": topic}})
+            record.update(status="error", error=f"{type(exc).__name__}: {exc}")
+        record["seconds"] = round(time.perf_counter() - start, 3)
+        summaries = [agent._token_process.get_summary() for agent in agents.values()]
+        record["usage"] = {
+            key: sum(summary.get(key, 0) for summary in summaries) for key in USAGE_KEYS
+        }
+        return record
+
+
+def throughput_report(records: List[Dict[str, Any]], wall_time: float) -> Dict[str, Any]:
+    """
+    Summarizes the throughput of a batch.
+
+    Args:
+        - records: The manifest records of the batch.
+        - wall_time: The duration of the batch in seconds.
+
+    Returns:
+        - The article counts, articles per hour, tokens per article and latency percentiles.
+    """
+    done = [record for record in records if record["status"] == "ok"]
+    report: Dict[str, Any] = {
+        "articles": len(done),
+        "errors": len(records) - len(done),
+        "wall_seconds": round(wall_time, 1),
+        "articles_per_hour": round(3600 * len(done) / wall_time, 1) if wall_time else None,
+    }
+    if done:
+        latencies = sorted(record["seconds"] for record in done)
+        report["latency_p50"] = round(statistics.median(latencies), 1)
+        report["latency_p95"] = round(latencies[int(0.95 * (len(latencies) - 1))], 1)
+        report["tokens_per_article"] = round(
+            sum(record["usage"]["total_tokens"] for record in done) / len(done)
+        )
+        report["cached_stages"] = sum(len(record["cached_stages"]) for record in done)
+    return report
+
+
+def run_batch(
+    topics: List[str],
+    output_dir: Path,
+    workers: int = 4,
+    rpm: float = 60,
+    start_stage: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Generates the articles of every topic, writing each one as soon as it is done.
+
+    Args:
+        - topics: The topics, duplicates are generated once.
+        - output_dir: The directory for the articles and the manifest.
+        - workers: The number of crews running at the same time.
+        - rpm: The maximum number of LLM requests per minute, over all crews.
+        - start_stage: The first stage to regenerate, cached stages are reused by default.
+
+    Returns:
+        - The throughput report.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    worker = ArticleWorker(
+        output_dir, RateLimitCallbackHandler(TokenBucket.per_minute(rpm)), start_stage
+    )
+    records: List[Dict[str, Any]] = []
+    seen: Set[str] = set()
+    start = time.perf_counter()
+
+    manifest_path = output_dir / "manifest.jsonl"
+    with open(manifest_path, "a", encoding="utf-8") as manifest, ThreadPoolExecutor(
+        max_workers=workers
+    ) as executor:
+        running: Set[Future] = set()
+        for topic in topics:
+            if normalize_topic(topic) in seen:
+                continue
+            seen.add(normalize_topic(topic))
+            running.add(executor.submit(worker, topic))
+
+        while running:
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                record = future.result()
+                records.append(record)
+                manifest.write(json.dumps(record) + "\n")
+                manifest.flush()
+                done = sum(1 for item in records if item["status"] == "ok")
+                logger.info(
+                    "Article %s",
+                    record["status"],
+                    extra={
+                        "fields": {
+                            **record,
+                            "progress": f"{len(records)}/{len(seen)}",
+                            "articles_per_hour": round(
+                                3600 * done / (time.perf_counter() - start), 1
+                            ),
+                        }
+                    },
+                )
+
+    return throughput_report(records, time.perf_counter() - start)
+
+
+def main():
+    """
+    Parses the command line and runs the batch.
+    """
+    parser = argparse.ArgumentParser(description="Batch content generation")
+    parser.add_argument("topics", type=Path, nargs="?", help="Text, CSV or JSONL file of topics")
+    parser.add_argument("--topic", action="append", default=[], help="Topic, repeatable")
+    parser.add_argument("--output-dir", type=Path, default=Path("articles"))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=float(os.getenv("LLM_RPM", "60")))
+    parser.add_argument("--start-stage", choices=STAGES, help="First stage to regenerate")
+    args = parser.parse_args()
+
+    topics = list(args.topic)
+    if args.topics:
+        topics.extend(read_topics(args.topics))
+    if not topics:
+        parser.error("give a topics file and/or --topic")
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    logging.basicConfig(level=logging.INFO, handlers=[handler])
+    # Third-party loggers only report problems
+    for name in ("httpx", "openai", "urllib3"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    report = run_batch(topics, args.output_dir, args.workers, args.rpm, args.start_stage)
+    logger.info("Batch done", extra={"fields": report})
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
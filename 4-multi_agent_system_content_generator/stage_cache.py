@@ -0,0 +1,223 @@
+"""
+Stage-level cache of the content generation pipeline.
+
+The planner, writer and editor stages are cached separately. The key of a stage
+output combines the normalized topic, the stage fingerprint (agent role, goal
+and backstory, task prompt, model and prompt version) and the hash of the
+upstream stage output. Re-editing a post therefore reuses the cached plan and
+draft, and a new plan automatically invalidates the drafts written from the old
+one. When a prompt changes, the entries of that stage with another fingerprint
+are deleted; the rest of the cache is bounded by a TTL and an LRU size limit.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Make the shared modules importable when running this file directly
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common import text_hash
+
+STAGES = ("plan", "write", "edit")
+
+MAX_ENTRIES = int(os.getenv("CONTENT_STAGE_CACHE_MAX_ENTRIES", "500"))
+# The plan covers the latest trends, so outputs are not kept forever
+TTL = float(os.getenv("CONTENT_STAGE_CACHE_TTL", str(24 * 3600)))
+
+
+def normalize_topic(topic: str) -> str:
+    """
+    Normalizes a topic so that trivially different spellings share cache entries.
+
+    Args:
+        - topic: The topic.
+
+    Returns:
+        - The lower-cased topic with collapsed whitespace.
+    """
+    return re.sub(r"\s+", " ", topic).strip().casefold()
+
+
+def _template(component: Any, name: str) -> str:
+    """
+    Returns a prompt field of an agent or task as written, before interpolation.
+
+    ``interpolate_inputs`` overwrites the field with the inputs filled in and keeps
+    the template in ``_original_<name>``, so a reused agent would otherwise carry
+    the topic of its previous run.
+
+    Args:
+        - component: The crewAI agent or task.
+        - name: The field, e.g. "goal" or "description".
+
+    Returns:
+        - The template of the field.
+    """
+    return getattr(component, f"_original_{name}", None) or getattr(component, name)
+
+
+def stage_fingerprint(agent: Any, task: Any, prompt_version: str) -> str:
+    """
+    Fingerprints everything that shapes the output of a stage besides its inputs.
+
+    Args:
+        - agent: The crewAI agent of the stage, fresh or reused from earlier runs.
+        - task: The crewAI task of the stage.
+        - prompt_version: A version bumped by hand for changes not visible in the prompts.
+
+    Returns:
+        - The fingerprint.
+    """
+    return text_hash(
+        json.dumps(
+            {
+                "role": _template(agent, "role"),
+                "goal": _template(agent, "goal"),
+                "backstory": _template(agent, "backstory"),
+                "description": _template(task, "description"),
+                "expected_output": _template(task, "expected_output"),
+                "model": os.getenv("OPENAI_MODEL_NAME"),
+                "prompt_version": prompt_version,
+            },
+            sort_keys=True,
+        )
+    )
+
+
+def stage_key(stage: str, topic: str, fingerprint: str, upstream: Optional[str]) -> str:
+    """
+    Builds the cache key of a stage output.
+
+    Args:
+        - stage: One of ``STAGES``.
+        - topic: The topic.
+        - fingerprint: The stage fingerprint.
+        - upstream: The output of the previous stage, None for the first one.
+
+    Returns:
+        - The cache key.
+    """
+    upstream_hash = text_hash(upstream) if upstream is not None else ""
+    return text_hash(
+        json.dumps([stage, normalize_topic(topic), fingerprint, upstream_hash])
+    )
+
+
+class StageCache:
+    """
+    SQLite store of stage outputs.
+    """
+
+    def __init__(self, path: Path, max_entries: int = MAX_ENTRIES, ttl: float = TTL):
+        """
+        Opens (and creates if needed) the cache database.
+
+        Args:
+            - path: The path of the SQLite database file.
+            - max_entries: The maximum number of outputs kept, least recently used first out.
+            - ttl: The number of seconds an output stays valid.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS stage_outputs ("
+            "key TEXT PRIMARY KEY, stage TEXT NOT NULL, topic TEXT NOT NULL, "
+            "fingerprint TEXT NOT NULL, output TEXT NOT NULL, "
+            "created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Looks up a stage output.
+
+        Args:
+            - key: The cache key.
+
+        Returns:
+            - The output, or None when missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output FROM stage_outputs WHERE key = ? AND created > ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE stage_outputs SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, stage: str, topic: str, fingerprint: str, output: str) -> None:
+        """
+        Stores a stage output, evicting expired and least recently used entries.
+
+        Args:
+            - key: The cache key.
+            - stage: The stage.
+            - topic: The topic.
+            - fingerprint: The stage fingerprint.
+            - output: The stage output.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stage_outputs "
+                "(key, stage, topic, fingerprint, output, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, stage, normalize_topic(topic), fingerprint, output, now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM stage_outputs WHERE created <= ?", (now - self.ttl,)
+            )
+            self._conn.execute(
+                "DELETE FROM stage_outputs WHERE key IN (SELECT key FROM stage_outputs "
+                "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def invalidate_stale(self, stage: str, fingerprint: str) -> int:
+        """
+        Deletes the outputs of a stage produced with other prompts.
+
+        Args:
+            - stage: The stage.
+            - fingerprint: The current fingerprint of the stage.
+
+        Returns:
+            - The number of deleted outputs.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM stage_outputs WHERE stage = ? AND fingerprint != ?",
+                (stage, fingerprint),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit and miss counters of this process.
+
+        Returns:
+            - A dictionary with the counters.
+        """
+        return {"hits": self.hits, "misses": self.misses}
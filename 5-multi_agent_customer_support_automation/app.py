@@ -1,10 +1,27 @@
 from dotenv import load_dotenv
 import os
+import sys
+from pathlib import Path
 import streamlit as st
-from crewai import Agent, Task, Crew
-from crewai_tools import SerperDevTool, ScrapeWebsiteTool, WebsiteSearchTool
 import warnings
-from typing import Dict, Any
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+# Make the shared modules importable when running `streamlit run app.py`
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common import cache_dir
+from common.streaming import stream_tasks
+from common.tracing import current_trace, trace, trace_panel
+
+# crewAI, its tools, LangChain and the knowledge base are imported on first use, once
+# a response is generated, so that the page paints and reruns without loading them
+if TYPE_CHECKING:
+    from crewai import Agent, Crew, Task
+
+    from budget import BudgetTracker
+    from common.memory import MemoryStore
+    from common.tool_cache import ToolCache
+    from knowledge_base import KnowledgeBase
 
 # Load environment variables from .env file
 load_dotenv()
@@ -17,9 +34,75 @@ openai_api_key = os.getenv("OPENAI_API_KEY")
 os.environ["OPENAI_MODEL_NAME"] = "gpt-3.5-turbo"
 
 
+@st.cache_resource
+def get_memory_store() -> "MemoryStore":
+    """
+    Returns the persistent crew memory store shared by every run.
+
+    Returns:
+        - The memory store.
+    """
+    from common.memory import create_memory_store
+
+    return create_memory_store()
+
+
+@st.cache_resource
+def get_tool_cache() -> "ToolCache":
+    """
+    Returns the tool result cache shared by every process on the machine.
+
+    Returns:
+        - The tool cache.
+    """
+    from common.tool_cache import ToolCache
+
+    return ToolCache(cache_dir("tools") / "tools.sqlite")
+
+
+def get_knowledge_base() -> Optional["KnowledgeBase"]:
+    """
+    Returns the pre-indexed docs knowledge base, if it has been built.
+
+    Not cached itself, so an index built while the app runs is picked up.
+
+    Returns:
+        - The knowledge base, or None when ``knowledge_base.py`` has not been run.
+    """
+    from knowledge_base import DEFAULT_INDEX_DIR, KnowledgeBase
+
+    # The current version of the index, a new one after every ingestion
+    version = DEFAULT_INDEX_DIR.resolve()
+    if not KnowledgeBase.exists(version):
+        return None
+    return load_knowledge_base(str(version))
+
+
+@st.cache_resource(max_entries=1)
+def load_knowledge_base(version: str) -> "KnowledgeBase":
+    """
+    Returns the process-wide knowledge base loaded from a version of the index.
+
+    Args:
+        - version: The version directory of the index.
+
+    Returns:
+        - The knowledge base.
+    """
+    from common.embeddings import EmbeddingCache, create_openai_embeddings
+    from knowledge_base import KnowledgeBase
+
+    # Queries must be embedded with the model the index was built with
+    model = KnowledgeBase.read_manifest(Path(version))["embedding_model"]
+    embeddings = create_openai_embeddings(
+        model, EmbeddingCache(cache_dir("embeddings") / "vectors.sqlite")
+    )
+    return KnowledgeBase(Path(version), embeddings)
+
+
 def create_agent(
     role: str, goal: str, backstory: str, allow_delegation: bool, verbose: bool
-) -> Agent:
+) -> "Agent":
     """
     Creates an agent with the given parameters.
 
@@ -33,18 +116,24 @@ def create_agent(
     Returns:
         - An instance of the Agent class.
     """
+    from crewai import Agent
+
+    from common.llm_gateway import chat_openai
+
     return Agent(
         role=role,
         goal=goal,
         backstory=backstory,
         allow_delegation=allow_delegation,
         verbose=verbose,
+        # One model per agent, all sharing the connections and limits of the gateway
+        llm=chat_openai(),
     )
 
 
 def create_task(
-    description: str, expected_output: str, agent: Agent, tools: list = None
-) -> Task:
+    description: str, expected_output: str, agent: "Agent", tools: list = None
+) -> "Task":
     """
     Creates a task with the given parameters.
 
@@ -57,6 +146,8 @@ def create_task(
     Returns:
         - An instance of the Task class.
     """
+    from crewai import Task
+
     return Task(
         description=description,
         expected_output=expected_output,
@@ -65,7 +156,14 @@ def create_task(
     )
 
 
-def create_crew(agents: list, tasks: list, verbose: int, memory: bool) -> Crew:
+def create_crew(
+    agents: list,
+    tasks: list,
+    verbose: int,
+    memory: bool,
+    task_callback: Optional[Callable] = None,
+    memory_namespace: str = "default",
+) -> "Crew":
     """
     Creates a crew with the given agents and tasks.
 
@@ -74,14 +172,30 @@ def create_crew(agents: list, tasks: list, verbose: int, memory: bool) -> Crew:
         - tasks: A list of Task instances.
         - verbose: The verbosity level.
         - memory: Whether the crew should use memory.
+        - task_callback: Called with the output of each task once it is done.
+        - memory_namespace: The memory namespace of the run, shared by the runs of the same customer.
 
     Returns:
         - An instance of the Crew class.
     """
-    return Crew(agents=agents, tasks=tasks, verbose=verbose, memory=memory)
+    from crewai import Crew
+
+    from common.memory import attach_memory
+
+    crew = Crew(
+        agents=agents,
+        tasks=tasks,
+        verbose=verbose,
+        # The persistent store replaces crewAI's per-run memory storages
+        memory=False,
+        task_callback=task_callback,
+    )
+    if memory:
+        attach_memory(crew, get_memory_store(), memory_namespace)
+    return crew
 
 
-def initialize_agents() -> Dict[str, Agent]:
+def initialize_agents() -> Dict[str, "Agent"]:
     """
     Initializes the support agent and support quality assurance agent.
 
@@ -121,19 +235,50 @@ def initialize_agents() -> Dict[str, Agent]:
     }
 
 
-def initialize_tasks(agents: Dict[str, Agent]) -> list:
+def initialize_tools() -> Dict[str, Any]:
+    """
+    Initializes the tools used by the support agent.
+
+    Not cached: the tools are cheap wrappers around the cached knowledge base and
+    tool cache, and a knowledge base built or rebuilt meanwhile must be picked up.
+
+    Returns:
+        - A dictionary with initialized tools.
+    """
+    from crewai_tools import ScrapeWebsiteTool
+
+    from common.tool_cache import cached_tool
+    from knowledge_base import DocsSearchTool
+
+    knowledge_base = get_knowledge_base()
+    if knowledge_base is not None:
+        # Only the passages relevant to the inquiry reach the agent's context
+        docs_tool = DocsSearchTool(knowledge_base=knowledge_base)
+    else:
+        # The docs page rarely changes, serve it from the shared tool cache
+        docs_tool = cached_tool(
+            ScrapeWebsiteTool(
+                website_url="https://docs.crewai.com/how-to/Creating-a-Crew-and-kick-it-off/"
+            ),
+            get_tool_cache(),
+        )
+    return {"docs_tool": docs_tool}
+
+
+def initialize_tasks(
+    agents: Dict[str, "Agent"], tools: Optional[Dict[str, Any]] = None
+) -> list:
     """
     Initializes the tasks for the support agent and support quality assurance agent.
 
     Args:
         - agents: A dictionary with initialized agents.
+        - tools: A dictionary with initialized tools, created when not given.
 
     Returns:
         - A list of Task instances.
     """
-    docs_scrape_tool = ScrapeWebsiteTool(
-        website_url="https://docs.crewai.com/how-to/Creating-a-Crew-and-kick-it-off/"
-    )
+    tools = tools or initialize_tools()
 
     inquiry_resolution = create_task(
         description=(
@@ -150,7 +295,7 @@ def initialize_tasks(agents: Dict[str, Agent]) -> list:
             "Ensure the answer is complete, leaving no questions unanswered, and maintain a helpful and friendly tone throughout."
         ),
         agent=agents["support_agent"],
-        tools=[docs_scrape_tool],
+        tools=[tools["docs_tool"]],
     )
 
     quality_assurance_review = create_task(
@@ -171,27 +316,71 @@ def initialize_tasks(agents: Dict[str, Agent]) -> list:
     return [inquiry_resolution, quality_assurance_review]
 
 
-def run_crew(inputs: Dict[str, Any], verbose: int, memory: bool) -> str:
+def run_crew(
+    inputs: Dict[str, Any],
+    verbose: int,
+    memory: bool,
+    task_callback: Optional[Callable] = None,
+    agents: Optional[Dict[str, "Agent"]] = None,
+    tools: Optional[Dict[str, Any]] = None,
+    tracker: Optional["BudgetTracker"] = None,
+) -> str:
     """
     Runs the multi-agent system to generate a support response based on the given inputs.
 
+    The run is bounded by an execution budget (delegations, LLM calls, tokens and
+    a deadline). When it is exhausted, the best draft written so far is returned.
+
     Args:
         - inputs: The input parameters for the task.
         - verbose: The verbosity level.
         - memory: Whether the crew should use memory.
+        - task_callback: Called with the output of each task once it is done.
+        - agents: Agents to reuse across tickets, created when not given.
+        - tools: Tools to reuse across tickets, created when not given.
+        - tracker: Tracks the spend of the run, created from the environment when not given.
+
+    Within a trace (see ``common.tracing``), each agent run is recorded as a task span.
 
     Returns:
         - The generated response in markdown format.
     """
-    agents = initialize_agents()
-    tasks = initialize_tasks(agents)
+    from budget import BudgetExceeded, BudgetTracker
+
+    agents = agents or initialize_agents()
+    tracker = tracker or BudgetTracker()
+    tasks = initialize_tasks(agents, tools)
+
+    def on_task_done(output: Any) -> None:
+        tracker.record_task_output(output)
+        if task_callback is not None:
+            task_callback(output)
+
     crew = create_crew(
         agents=[agents["support_agent"], agents["support_quality_assurance_agent"]],
         tasks=tasks,
         verbose=verbose,
         memory=memory,
+        task_callback=on_task_done,
+        # Earlier inquiries of the same customer become context for this one
+        memory_namespace=f"customer:{inputs['customer']}",
     )
-    result = crew.kickoff(inputs=inputs)
+    run = current_trace()
+    tracker.attach(agents.values())
+    if run is not None:
+        run.attach(agents.values())
+    try:
+        result = crew.kickoff(inputs=inputs)
+    except BudgetExceeded:
+        draft = tracker.best_draft()
+        if draft is None:
+            raise
+        result = draft
+    finally:
+        # Agents may be reused for the next ticket
+        tracker.detach(agents.values())
+        if run is not None:
+            run.detach(agents.values())
     return result
 
 
@@ -211,10 +400,32 @@ def main():
     memory = st.checkbox("Enable memory for the crew", value=True)
 
     if st.button("Generate Response"):
+        from budget import BudgetTracker
+
         inputs = {"customer": customer, "person": person, "inquiry": inquiry}
-        result = run_crew(inputs, verbose, memory)
+        tracker = BudgetTracker()
+        with trace("customer_support", customer=customer) as run:
+            result = stream_tasks(
+                lambda task_callback: run_crew(
+                    inputs, verbose, memory, task_callback, tracker=tracker
+                ),
+                st.container(),
+            )
         st.markdown("### Generated Response")
-        st.markdown(result)
+        report = tracker.report()
+        if report["stopped_by"]:
+            st.warning(
+                f"The execution budget ran out ({report['stopped_by']}), "
+                "this is the best draft written so far."
+            )
+        st.markdown(result.text)
+        st.caption(result.caption("task"))
+        with st.expander("Execution budget"):
+            st.json(report)
+        if memory:
+            with st.expander("Memory"):
+                st.json(get_memory_store().stats())
+        trace_panel(run.trace_id if run else None)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,280 @@
+"""
+Execution budget of a support crew run.
+
+A ``BudgetTracker`` counts the LLM calls, tokens, delegations and elapsed time
+of one crew run through LangChain callbacks attached to every agent's LLM. As
+soon as a limit is crossed the next LLM callback raises ``BudgetExceeded``,
+which stops the crew; the caller then returns the best draft produced so far.
+The tracker also reports where the budget was spent, per agent.
+"""
+
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# Tool names crewAI gives the delegation tools
+_DELEGATION = re.compile(
+    r"Action:\s*(Delegate work to co-worker|Ask question to co-worker)", re.IGNORECASE
+)
+_FINAL_ANSWER = re.compile(r"Final Answer:\s*(.*)", re.DOTALL)
+
+
+def _env_limit(name: str, default: Optional[float], cast=int) -> Optional[float]:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    # 0 or a negative value disables the limit
+    value = cast(value)
+    return value if value > 0 else None
+
+
+@dataclass
+class ExecutionBudget:
+    """
+    Limits of one crew run, None meaning unlimited.
+    """
+
+    max_delegations: Optional[int] = 2
+    max_llm_calls: Optional[int] = 16
+    # Seconds since the start of the run after which no new LLM call is made
+    deadline: Optional[float] = 180.0
+    max_tokens: Optional[int] = 40_000
+
+    @classmethod
+    def from_env(cls) -> "ExecutionBudget":
+        """
+        Reads the budget from the ``SUPPORT_MAX_DELEGATIONS``, ``SUPPORT_MAX_LLM_CALLS``,
+        ``SUPPORT_DEADLINE_SECONDS`` and ``SUPPORT_MAX_TOKENS`` environment variables.
+
+        Returns:
+            - The execution budget.
+        """
+        defaults = cls()
+        return cls(
+            max_delegations=_env_limit("SUPPORT_MAX_DELEGATIONS", defaults.max_delegations),
+            max_llm_calls=_env_limit("SUPPORT_MAX_LLM_CALLS", defaults.max_llm_calls),
+            deadline=_env_limit("SUPPORT_DEADLINE_SECONDS", defaults.deadline, float),
+            max_tokens=_env_limit("SUPPORT_MAX_TOKENS", defaults.max_tokens),
+        )
+
+
+class BudgetExceeded(Exception):
+    """
+    Raised inside the crew when one of the budget limits is crossed.
+    """
+
+    def __init__(self, limit: str, message: str):
+        super().__init__(message)
+        self.limit = limit
+
+
+class BudgetCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler reporting the LLM calls of one agent to the tracker.
+    """
+
+    # Let BudgetExceeded propagate instead of being logged and ignored
+    raise_error = True
+
+    def __init__(self, tracker: "BudgetTracker", agent: str):
+        self.tracker = tracker
+        self.agent = agent
+
+    def on_llm_start(
+        self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any
+    ) -> None:
+        self.tracker.before_llm_call(self.agent)
+
+    def on_chat_model_start(
+        self, serialized: Dict[str, Any], messages: List[List[Any]], **kwargs: Any
+    ) -> None:
+        self.tracker.before_llm_call(self.agent)
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        self.tracker.after_llm_call(self.agent, response)
+
+
+class BudgetTracker:
+    """
+    Spend of one crew run against its budget.
+    """
+
+    def __init__(self, budget: Optional[ExecutionBudget] = None):
+        """
+        Initializes the tracker, starting the clock.
+
+        Args:
+            - budget: The limits of the run, read from the environment by default.
+        """
+        self.budget = budget or ExecutionBudget.from_env()
+        self.start = time.monotonic()
+        self.llm_calls = 0
+        self.tokens = 0
+        self.delegations = 0
+        self.per_agent: Dict[str, Dict[str, float]] = {}
+        self.stopped_by: Optional[str] = None
+        self._drafts: List[str] = []
+        self._task_outputs: List[str] = []
+        self._handlers: Dict[int, BudgetCallbackHandler] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start
+
+    def _agent_spend(self, agent: str) -> Dict[str, float]:
+        return self.per_agent.setdefault(
+            agent, {"llm_calls": 0, "tokens": 0, "delegations": 0, "llm_seconds": 0.0}
+        )
+
+    def _stop(self, limit: str, message: str) -> None:
+        if self.stopped_by is None:
+            self.stopped_by = limit
+        raise BudgetExceeded(limit, message)
+
+    def before_llm_call(self, agent: str) -> None:
+        """
+        Checks the budget before an LLM call and counts it.
+
+        Args:
+            - agent: The role of the calling agent.
+        """
+        budget = self.budget
+        with self._lock:
+            if self.stopped_by is not None:
+                self._stop(self.stopped_by, f"Budget exhausted: {self.stopped_by}")
+            if budget.deadline is not None and self.elapsed >= budget.deadline:
+                self._stop("deadline", f"Deadline of {budget.deadline:.0f}s reached")
+            if budget.max_llm_calls is not None and self.llm_calls >= budget.max_llm_calls:
+                self._stop("llm_calls", f"Limit of {budget.max_llm_calls} LLM calls reached")
+            if budget.max_tokens is not None and self.tokens >= budget.max_tokens:
+                self._stop("tokens", f"Limit of {budget.max_tokens} tokens reached")
+            self.llm_calls += 1
+            spend = self._agent_spend(agent)
+            spend["llm_calls"] += 1
+            spend["_started"] = time.monotonic()
+
+    def after_llm_call(self, agent: str, response: LLMResult) -> None:
+        """
+        Records the tokens and the draft of an LLM call, and counts delegations.
+
+        Args:
+            - agent: The role of the calling agent.
+            - response: The LLM result.
+        """
+        text = "".join(
+            generation.text for generations in response.generations for generation in generations
+        )
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        # Rough estimate when the provider does not report usage, e.g. when streaming
+        tokens = usage.get("total_tokens") or len(text) // 4
+
+        with self._lock:
+            self.tokens += tokens
+            spend = self._agent_spend(agent)
+            spend["tokens"] += tokens
+            started = spend.pop("_started", None)
+            if started is not None:
+                spend["llm_seconds"] += time.monotonic() - started
+
+            final = _FINAL_ANSWER.search(text)
+            if final and final.group(1).strip():
+                self._drafts.append(final.group(1).strip())
+
+            if _DELEGATION.search(text):
+                self.delegations += 1
+                spend["delegations"] += 1
+                limit = self.budget.max_delegations
+                if limit is not None and self.delegations > limit:
+                    # Stop before the delegation tool runs
+                    self._stop("delegations", f"Limit of {limit} delegations reached")
+
+    def record_task_output(self, output: Any) -> None:
+        """
+        Keeps a finished task output as a draft candidate.
+
+        Args:
+            - output: The crewAI task output.
+        """
+        text = str(getattr(output, "raw_output", None) or output).strip()
+        if text:
+            with self._lock:
+                self._task_outputs.append(text)
+
+    def best_draft(self) -> Optional[str]:
+        """
+        Returns the best answer produced so far.
+
+        The output of the last finished task wins, then the last final answer
+        written by any agent, including a delegated co-worker.
+
+        Returns:
+            - The best draft, or None if nothing usable was produced.
+        """
+        with self._lock:
+            if self._task_outputs:
+                return self._task_outputs[-1]
+            if self._drafts:
+                return self._drafts[-1]
+        return None
+
+    def attach(self, agents: Iterable[Any]) -> None:
+        """
+        Adds a budget callback handler to the LLM of every agent.
+
+        Args:
+            - agents: The crewAI agents of the run.
+        """
+        for agent in agents:
+            if not isinstance(agent.llm.callbacks, list):
+                agent.llm.callbacks = []
+            handler = BudgetCallbackHandler(self, agent.role)
+            self._handlers[id(agent)] = handler
+            agent.llm.callbacks.append(handler)
+
+    def detach(self, agents: Iterable[Any]) -> None:
+        """
+        Removes the handlers added by ``attach``, so agents can be reused.
+
+        Args:
+            - agents: The crewAI agents of the run.
+        """
+        for agent in agents:
+            handler = self._handlers.pop(id(agent), None)
+            if handler is not None and handler in agent.llm.callbacks:
+                agent.llm.callbacks.remove(handler)
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Summarizes where the budget was spent.
+
+        Returns:
+            - The totals, the limits, the per-agent spend and what stopped the run.
+        """
+        budget = self.budget
+        with self._lock:
+            return {
+                "stopped_by": self.stopped_by,
+                "elapsed_seconds": round(self.elapsed, 2),
+                "llm_calls": self.llm_calls,
+                "tokens": self.tokens,
+                "delegations": self.delegations,
+                "limits": {
+                    "deadline": budget.deadline,
+                    "max_llm_calls": budget.max_llm_calls,
+                    "max_tokens": budget.max_tokens,
+                    "max_delegations": budget.max_delegations,
+                },
+                "per_agent": {
+                    agent: {
+                        key: round(value, 2) for key, value in spend.items() if key != "_started"
+                    }
+                    for agent, spend in self.per_agent.items()
+                },
+            }
@@ -0,0 +1,319 @@
+"""
+Pre-indexed documentation knowledge base for the support crew.
+
+The ingestion job reads a local docs corpus (Markdown, text or HTML files, plus
+optional URLs fetched once), splits it into passages, embeds them and writes a
+persistent index directory:
+
+- ``passages.jsonl``: one passage per line with its text and source.
+- ``vectors.npy``: the float32 passage vectors, row i for passage i.
+- ``manifest.json``: the embedding model and chunking settings.
+
+Every ingestion writes a new versioned directory next to the index path, which
+is a symlink to the current version, swapped atomically once the version is
+complete.
+
+At answer time ``DocsSearchTool`` embeds the agent's query and returns only the
+top-k passages, instead of the whole scraped page.
+
+Usage:
+    python knowledge_base.py ./docs --url https://docs.crewai.com/how-to/Creating-a-Crew-and-kick-it-off/
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Type
+
+import numpy as np
+from crewai_tools import BaseTool
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from pydantic.v1 import BaseModel, Field
+
+# Make the shared modules importable when running this file directly
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common import CACHE_ROOT, cache_dir
+from common.embeddings import EmbeddingCache, create_openai_embeddings
+from common.retrieval import RetrieverSettings, VectorIndexRetriever, build_retriever
+
+# Settings that shape the index, recorded in its manifest
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 150
+EMBEDDING_MODEL = os.getenv("SUPPORT_KB_EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Where the support app looks for the index, a symlink to its current version
+DEFAULT_INDEX_DIR = Path(os.getenv("SUPPORT_KB_DIR", str(CACHE_ROOT / "support_kb")))
+
+DOC_SUFFIXES = (".md", ".mdx", ".txt", ".rst", ".html", ".htm")
+
+
+def _html_to_text(html: str) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup(["script", "style", "nav", "footer"]):
+        tag.decompose()
+    lines = (line.strip() for line in soup.get_text("\n").splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def load_sources(docs_dir: Optional[Path], urls: List[str]) -> Iterator[Document]:
+    """
+    Reads the documentation corpus.
+
+    Args:
+        - docs_dir: The directory with the docs files, searched recursively.
+        - urls: Pages to fetch and add to the corpus.
+
+    Returns:
+        - An iterator over one document per file or page.
+    """
+    if docs_dir is not None:
+        for path in sorted(docs_dir.rglob("*")):
+            if path.suffix.lower() not in DOC_SUFFIXES or not path.is_file():
+                continue
+            text = path.read_text(encoding="utf-8", errors="ignore")
+            if path.suffix.lower() in (".html", ".htm"):
+                text = _html_to_text(text)
+            yield Document(
+                page_content=text,
+                metadata={"source": str(path.relative_to(docs_dir))},
+            )
+
+    if urls:
+        import requests
+
+        for url in urls:
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+            yield Document(
+                page_content=_html_to_text(response.text), metadata={"source": url}
+            )
+
+
+def remove_stale_versions(index_dir: Path) -> None:
+    """
+    Removes the versions of an index other than the current one.
+
+    Those are the previous versions, kept until now for the apps that were still
+    loading them, and the leftovers of interrupted ingestions.
+
+    Args:
+        - index_dir: The index path.
+    """
+    current = os.readlink(index_dir) if index_dir.is_symlink() else None
+    for path in index_dir.parent.glob(glob.escape(index_dir.name) + ".*"):
+        if path.name == current:
+            continue
+        if path.is_symlink() or path.is_file():
+            path.unlink()
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def ingest(
+    documents: Iterator[Document],
+    embeddings: Embeddings,
+    index_dir: Path,
+    model: str = EMBEDDING_MODEL,
+) -> int:
+    """
+    Chunks and embeds documents and writes the index directory.
+
+    The files are written to a new version directory, then the index symlink is
+    replaced in one rename, so a running app never reads a half-written index.
+    The previous version is kept until the next ingestion.
+
+    Args:
+        - documents: The documents to index.
+        - embeddings: The embeddings used for the passages.
+        - index_dir: The index path to (re)create.
+        - model: The embedding model name, recorded in the manifest.
+
+    Returns:
+        - The number of indexed passages.
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP
+    )
+    passages = splitter.split_documents(list(documents))
+    if not passages:
+        raise ValueError("The docs corpus is empty")
+    vectors = np.asarray(
+        embeddings.embed_documents([passage.page_content for passage in passages]),
+        dtype=np.float32,
+    )
+
+    index_dir.parent.mkdir(parents=True, exist_ok=True)
+    remove_stale_versions(index_dir)
+    version = index_dir.with_name(f"{index_dir.name}.{time.time_ns()}")
+    version.mkdir()
+    np.save(version / "vectors.npy", vectors)
+    with open(version / "passages.jsonl", "w", encoding="utf-8") as file:
+        for passage in passages:
+            record = {"text": passage.page_content, "source": passage.metadata["source"]}
+            file.write(json.dumps(record) + "\n")
+    manifest = {
+        "embedding_model": model,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "passages": len(passages),
+        "dimension": int(vectors.shape[1]),
+        "built_at": time.time(),
+    }
+    (version / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+    # Point the index at the new version, replacing the symlink in one rename
+    link = version.with_name(version.name + ".link")
+    os.symlink(version.name, link)
+    if index_dir.is_dir() and not index_dir.is_symlink():
+        # Plain directory of an earlier layout: moved aside, removed by the next ingestion
+        index_dir.rename(index_dir.with_name(f"{index_dir.name}.{time.time_ns()}"))
+    os.replace(link, index_dir)
+    return len(passages)
+
+
+class KnowledgeBase:
+    """
+    Read-only view of an index directory.
+    """
+
+    def __init__(
+        self,
+        index_dir: Path,
+        embeddings: Embeddings,
+        settings: Optional[RetrieverSettings] = None,
+    ):
+        """
+        Loads the index.
+
+        Args:
+            - index_dir: The index path written by ``ingest``.
+            - embeddings: The embeddings used for the queries, same model as the index.
+            - settings: The retriever settings, read from the environment by default.
+        """
+        # Read every file from the same version, even if the index is swapped meanwhile
+        index_dir = index_dir.resolve()
+        self.manifest = self.read_manifest(index_dir)
+        with open(index_dir / "passages.jsonl", encoding="utf-8") as file:
+            self.passages = [
+                Document(page_content=record["text"], metadata={"source": record["source"]})
+                for record in map(json.loads, file)
+            ]
+        vectors = np.load(index_dir / "vectors.npy", mmap_mode="r")
+        self.retriever: VectorIndexRetriever = build_retriever(
+            self.passages, embeddings, settings, vectors=vectors
+        )
+
+    @staticmethod
+    def read_manifest(index_dir: Path) -> Dict[str, Any]:
+        """
+        Reads the manifest of an index.
+
+        Args:
+            - index_dir: The index directory.
+
+        Returns:
+            - The manifest, with the embedding model the queries must use.
+        """
+        return json.loads((index_dir / "manifest.json").read_text())
+
+    @staticmethod
+    def exists(index_dir: Path) -> bool:
+        """
+        Checks whether an index has been built.
+
+        Args:
+            - index_dir: The index directory.
+
+        Returns:
+            - True if the directory holds a complete index.
+        """
+        return (index_dir / "manifest.json").exists()
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Tuple[str, str]]:
+        """
+        Finds the passages most relevant to a query.
+
+        Args:
+            - query: The search query.
+            - k: The number of passages, the retriever setting by default.
+
+        Returns:
+            - The (source, text) pairs of the best passages, best first.
+        """
+        vector = np.asarray(self.retriever.embeddings.embed_query(query))
+        ids, _ = self.retriever.index.search(vector, k or self.retriever.k)
+        return [
+            (self.passages[i].metadata["source"], self.passages[i].page_content)
+            for i in ids
+        ]
+
+
+class DocsSearchToolSchema(BaseModel):
+    """Input for DocsSearchTool."""
+
+    query: str = Field(..., description="What to look up in the crewAI documentation")
+
+
+class DocsSearchTool(BaseTool):
+    name: str = "Search the crewAI documentation"
+    description: str = (
+        "Returns the passages of the crewAI documentation most relevant to a query, "
+        "with their source."
+    )
+    args_schema: Type[BaseModel] = DocsSearchToolSchema
+    knowledge_base: Any
+
+    def _run(self, query: str) -> str:
+        """
+        Searches the knowledge base.
+
+        Args:
+            - query: The search query.
+
+        Returns:
+            - The relevant passages with their source.
+        """
+        results = self.knowledge_base.search(query)
+        if not results:
+            return "No relevant passage found in the documentation."
+        return "\n\n".join(
+            f"[{number}] Source: {source}\n{text}"
+            for number, (source, text) in enumerate(results, start=1)
+        )
+
+
+def main():
+    """
+    Builds the knowledge base from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Build the support knowledge base")
+    parser.add_argument("docs_dir", type=Path, nargs="?", help="Directory of docs files")
+    parser.add_argument("--url", action="append", default=[], help="Page to add, repeatable")
+    parser.add_argument("--index-dir", type=Path, default=DEFAULT_INDEX_DIR)
+    args = parser.parse_args()
+    if args.docs_dir is None and not args.url:
+        parser.error("give a docs directory and/or --url")
+
+    embeddings = create_openai_embeddings(
+        EMBEDDING_MODEL, EmbeddingCache(cache_dir("embeddings") / "vectors.sqlite")
+    )
+    start = time.perf_counter()
+    count = ingest(load_sources(args.docs_dir, args.url), embeddings, args.index_dir)
+    print(
+        f"Indexed {count} passages into {args.index_dir} "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+"""
+Headless ticket queue worker for the customer support crew.
+
+Inquiries are queued in a SQLite database and processed by N worker threads,
+each running its own crew. All LLM calls of all crews go through one token
+bucket, so the worker never exceeds the configured requests per minute. Each
+thread builds its agents once and reuses them for every ticket it handles; the
+tools are stateless and shared by all threads. Answers, latency, token usage and
+the execution budget report are stored with each ticket.
+
+Usage:
+    python worker.py enqueue --customer DeepLearningAI --person "Andrew Ng" --inquiry "..."
+    python worker.py enqueue --file tickets.jsonl
+    python worker.py run --workers 4 --rpm 60 --drain
+    python worker.py stats
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import statistics
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app import initialize_agents, initialize_tools, run_crew
+from budget import BudgetTracker, ExecutionBudget
+from common import cache_dir
+from common.rate_limit import RateLimitCallbackHandler, TokenBucket
+from common.tracing import trace
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB = Path(
+    os.getenv("SUPPORT_QUEUE_DB", str(cache_dir("support_queue") / "tickets.sqlite"))
+)
+
+USAGE_KEYS = ("prompt_tokens", "completion_tokens", "total_tokens", "successful_requests")
+
+
+class TicketQueue:
+    """
+    SQLite ticket queue, safe to use from several threads and processes.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Opens (and creates if needed) the queue database.
+
+        Args:
+            - path: The path of the SQLite database file.
+        """
+        self.path = path
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tickets ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, customer TEXT NOT NULL, "
+            "person TEXT NOT NULL, inquiry TEXT NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'queued', attempts INTEGER NOT NULL DEFAULT 0, "
+            "enqueued_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+            "response TEXT, error TEXT, latency REAL, prompt_tokens INTEGER, "
+            "completion_tokens INTEGER, total_tokens INTEGER, successful_requests INTEGER, "
+            "budget TEXT)"
+        )
+        try:
+            # Queues created before the budget report was stored
+            conn.execute("ALTER TABLE tickets ADD COLUMN budget TEXT")
+        except sqlite3.OperationalError:
+            pass
+        conn.execute("CREATE INDEX IF NOT EXISTS tickets_status ON tickets (status, id)")
+        conn.commit()
+        conn.close()
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread, SQLite serializes the writers
+        if not hasattr(self._local, "conn"):
+            self._local.conn = self._connect()
+        return self._local.conn
+
+    def enqueue(self, customer: str, person: str, inquiry: str) -> int:
+        """
+        Adds a ticket to the queue.
+
+        Args:
+            - customer: The customer name.
+            - person: The contact person.
+            - inquiry: The inquiry text.
+
+        Returns:
+            - The ticket id.
+        """
+        cursor = self._conn.execute(
+            "INSERT INTO tickets (customer, person, inquiry, enqueued_at) VALUES (?, ?, ?, ?)",
+            (customer, person, inquiry, time.time()),
+        )
+        return cursor.lastrowid
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Marks the oldest queued ticket as running and returns it.
+
+        Returns:
+            - The ticket, or None if the queue is empty.
+        """
+        conn = self._conn
+        # An immediate transaction takes the write lock, so two workers never claim the same ticket
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, customer, person, inquiry FROM tickets "
+                "WHERE status = 'queued' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE tickets SET status = 'running', started_at = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (time.time(), row[0]),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return dict(zip(("id", "customer", "person", "inquiry"), row))
+
+    def complete(
+        self,
+        ticket_id: int,
+        response: str,
+        latency: float,
+        usage: Dict[str, int],
+        budget: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Stores the response of a ticket.
+
+        Args:
+            - ticket_id: The ticket id.
+            - response: The generated response.
+            - latency: The processing time in seconds.
+            - usage: The token usage of the ticket.
+            - budget: The execution budget report of the run.
+        """
+        self._conn.execute(
+            "UPDATE tickets SET status = 'done', finished_at = ?, response = ?, error = NULL, "
+            "latency = ?, prompt_tokens = ?, completion_tokens = ?, total_tokens = ?, "
+            "successful_requests = ?, budget = ? WHERE id = ?",
+            (
+                time.time(),
+                response,
+                latency,
+                *(usage.get(key, 0) for key in USAGE_KEYS),
+                json.dumps(budget) if budget is not None else None,
+                ticket_id,
+            ),
+        )
+
+    def fail(self, ticket_id: int, error: str, latency: float, max_attempts: int) -> None:
+        """
+        Records a failure, requeuing the ticket until it ran out of attempts.
+
+        Args:
+            - ticket_id: The ticket id.
+            - error: The error message.
+            - latency: The processing time in seconds.
+            - max_attempts: The number of attempts after which the ticket is given up.
+        """
+        self._conn.execute(
+            "UPDATE tickets SET status = CASE WHEN attempts >= ? THEN 'error' ELSE 'queued' END, "
+            "finished_at = ?, error = ?, latency = ? WHERE id = ?",
+            (max_attempts, time.time(), error, latency, ticket_id),
+        )
+
+    def requeue_stale(self, timeout: float) -> int:
+        """
+        Requeues tickets left running by a worker that died.
+
+        Args:
+            - timeout: The number of seconds after which a running ticket is considered lost.
+
+        Returns:
+            - The number of requeued tickets.
+        """
+        cursor = self._conn.execute(
+            "UPDATE tickets SET status = 'queued' WHERE status = 'running' AND started_at < ?",
+            (time.time() - timeout,),
+        )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Summarizes the queue.
+
+        Returns:
+            - The ticket counts per status, latency percentiles, token totals and the
+              number of tickets answered with a draft because the budget ran out.
+        """
+        counts = dict(
+            self._conn.execute("SELECT status, COUNT(*) FROM tickets GROUP BY status").fetchall()
+        )
+        latencies = sorted(
+            row[0]
+            for row in self._conn.execute(
+                "SELECT latency FROM tickets WHERE status = 'done' AND latency IS NOT NULL"
+            )
+        )
+        tokens = self._conn.execute(
+            "SELECT COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(completion_tokens), 0) "
+            "FROM tickets WHERE status = 'done'"
+        ).fetchone()
+        stopped_early = self._conn.execute(
+            "SELECT COUNT(*) FROM tickets WHERE status = 'done' "
+            "AND json_extract(budget, '$.stopped_by') IS NOT NULL"
+        ).fetchone()[0]
+        summary: Dict[str, Any] = {"counts": counts, "stopped_early": stopped_early}
+        if latencies:
+            summary["latency_p50"] = statistics.median(latencies)
+            summary["latency_p95"] = latencies[int(0.95 * (len(latencies) - 1))]
+            summary["prompt_tokens_per_ticket"] = tokens[0] / len(latencies)
+            summary["completion_tokens_per_ticket"] = tokens[1] / len(latencies)
+        return summary
+
+
+def _usage(agents: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Sums the token usage recorded so far by the agents.
+
+    Args:
+        - agents: The agents.
+
+    Returns:
+        - The cumulated token usage.
+    """
+    summaries = [agent._token_process.get_summary() for agent in agents.values()]
+    return {key: sum(summary.get(key, 0) for summary in summaries) for key in USAGE_KEYS}
+
+
+class SupportWorker:
+    """
+    Pool of threads processing tickets under a shared LLM rate limit.
+    """
+
+    def __init__(
+        self,
+        queue: TicketQueue,
+        workers: int = 4,
+        rpm: float = 60,
+        verbose: int = 0,
+        max_attempts: int = 3,
+        poll_interval: float = 2.0,
+        budget: Optional[ExecutionBudget] = None,
+        memory: bool = False,
+    ):
+        """
+        Initializes the worker.
+
+        Args:
+            - queue: The ticket queue.
+            - workers: The number of crews running at the same time.
+            - rpm: The maximum number of LLM requests per minute, over all crews.
+            - verbose: The verbosity level of the crews.
+            - max_attempts: The number of attempts per ticket.
+            - poll_interval: The number of seconds to wait when the queue is empty.
+            - budget: The execution budget of each ticket, read from the environment by default.
+            - memory: Whether the crews remember earlier tickets of the same customer.
+        """
+        self.queue = queue
+        self.workers = workers
+        self.verbose = verbose
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.budget = budget or ExecutionBudget.from_env()
+        self.memory = memory
+        self.rate_limiter = RateLimitCallbackHandler(TokenBucket.per_minute(rpm))
+        self._stop = threading.Event()
+
+    def _create_agents(self) -> Dict[str, Any]:
+        agents = initialize_agents()
+        for agent in agents.values():
+            if not isinstance(agent.llm.callbacks, list):
+                agent.llm.callbacks = []
+            agent.llm.callbacks.append(self.rate_limiter)
+        return agents
+
+    def _loop(self, drain: bool) -> None:
+        # Agents hold per-run state, so each thread keeps its own
+        agents = self._create_agents()
+        while not self._stop.is_set():
+            ticket = self.queue.claim()
+            if ticket is None:
+                if drain:
+                    return
+                self._stop.wait(self.poll_interval)
+                continue
+
+            before = _usage(agents)
+            start = time.perf_counter()
+            inputs = {key: ticket[key] for key in ("customer", "person", "inquiry")}
+            tracker = BudgetTracker(self.budget)
+            try:
+                with trace("support_worker", ticket=ticket["id"]):
+                    response = run_crew(
+                        inputs,
+                        self.verbose,
+                        memory=self.memory,
+                        agents=agents,
+                        # Per ticket, so a rebuilt knowledge base is used by the next ticket
+                        tools=initialize_tools(),
+                        tracker=tracker,
+                    )
+            except Exception as exc:
+                latency = time.perf_counter() - start
+                logger.exception("Ticket %s failed", ticket["id"])
+                self.queue.fail(
+                    ticket["id"], f"{type(exc).__name__}: {exc}", latency, self.max_attempts
+                )
+                continue
+
+            latency = time.perf_counter() - start
+            after = _usage(agents)
+            usage = {key: after[key] - before[key] for key in USAGE_KEYS}
+            report = tracker.report()
+            self.queue.complete(ticket["id"], str(response), latency, usage, report)
+            logger.info(
+                "Ticket %s done in %.1fs, %d prompt + %d completion tokens%s",
+                ticket["id"],
+                latency,
+                usage["prompt_tokens"],
+                usage["completion_tokens"],
+                f", stopped early by the {report['stopped_by']} limit"
+                if report["stopped_by"]
+                else "",
+            )
+
+    def run(self, drain: bool = False) -> None:
+        """
+        Processes tickets until stopped, or until the queue is empty when draining.
+
+        Args:
+            - drain: Whether to return once the queue is empty.
+        """
+        threads = [
+            threading.Thread(target=self._loop, args=(drain,), daemon=True)
+            for _ in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            logger.info("Stopping after the tickets in progress ...")
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+    def stop(self) -> None:
+        """
+        Asks the worker threads to stop after their current ticket.
+        """
+        self._stop.set()
+
+
+def main():
+    """
+    Parses the command line and runs the requested command.
+    """
+    parser = argparse.ArgumentParser(description="Support ticket queue worker")
+    parser.add_argument("--db", type=Path, default=DEFAULT_DB)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add tickets to the queue")
+    enqueue.add_argument("--file", type=Path, help="JSONL with customer, person, inquiry")
+    enqueue.add_argument("--customer")
+    enqueue.add_argument("--person")
+    enqueue.add_argument("--inquiry")
+
+    run = commands.add_parser("run", help="Process queued tickets")
+    run.add_argument("--workers", type=int, default=4)
+    run.add_argument("--rpm", type=float, default=float(os.getenv("LLM_RPM", "60")))
+    run.add_argument("--verbose", type=int, default=0, choices=[0, 1, 2])
+    run.add_argument("--max-attempts", type=int, default=3)
+    run.add_argument("--drain", action="store_true", help="Exit once the queue is empty")
+    run.add_argument(
+        "--memory", action="store_true", help="Remember earlier tickets of each customer"
+    )
+    run.add_argument(
+        "--stale-after", type=float, default=1800, help="Requeue tickets running longer"
+    )
+
+    commands.add_parser("stats", help="Show queue statistics")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(threadName)s %(message)s")
+    queue = TicketQueue(args.db)
+
+    if args.command == "enqueue":
+        tickets: List[Dict[str, str]] = []
+        if args.file:
+            with open(args.file, encoding="utf-8") as file:
+                tickets.extend(json.loads(line) for line in file if line.strip())
+        if args.inquiry:
+            tickets.append(
+                {"customer": args.customer, "person": args.person, "inquiry": args.inquiry}
+            )
+        if not tickets:
+            parser.error("give --file or --customer/--person/--inquiry")
+        for ticket in tickets:
+            queue.enqueue(ticket["customer"], ticket["person"], ticket["inquiry"])
+        logger.info("Queued %d ticket(s)", len(tickets))
+    elif args.command == "run":
+        requeued = queue.requeue_stale(args.stale_after)
+        if requeued:
+            logger.info("Requeued %d stale ticket(s)", requeued)
+        SupportWorker(
+            queue,
+            workers=args.workers,
+            rpm=args.rpm,
+            verbose=args.verbose,
+            max_attempts=args.max_attempts,
+            memory=args.memory,
+        ).run(drain=args.drain)
+        logger.info("Queue: %s", json.dumps(queue.stats()))
+    else:
+        print(json.dumps(queue.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
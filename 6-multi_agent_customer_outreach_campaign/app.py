@@ -1,11 +1,28 @@
 from dotenv import load_dotenv
 import os
+import sys
+from pathlib import Path
 import streamlit as st
-from crewai import Agent, Task, Crew
-from crewai_tools import DirectoryReadTool, FileReadTool, SerperDevTool, BaseTool
 import warnings
-from typing import Dict, Any
-import openai
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+# Make the shared modules importable when running `streamlit run app.py`
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from common import cache_dir
+from common.streaming import stream_tasks
+from common.tracing import current_trace, trace, trace_panel
+from sentiment import CachedSentiment, SentimentCache, create_sentiment_backend
+from task_graph import GraphRun, TaskGraph
+
+# crewAI, its tools and LangChain are imported on first use, once a lead is
+# processed, so that the page paints and reruns without loading them
+if TYPE_CHECKING:
+    from crewai import Agent, Crew, Task
+    from crewai_tools import BaseTool
+
+    from common.memory import MemoryStore
+    from common.tool_cache import ToolCache
 
 # Load environment variables from .env file
 load_dotenv()
@@ -17,36 +34,55 @@ warnings.filterwarnings("ignore")
 openai_api_key = os.getenv("OPENAI_API_KEY")
 os.environ["OPENAI_MODEL_NAME"] = "gpt-3.5-turbo"
 
+# Directory with the sales instructions read while profiling a lead
+INSTRUCTIONS_DIR = "./instructions"
 
-# Define SentimentAnalysisTool class
-class SentimentAnalysisTool(BaseTool):
-    name: str = "Sentiment Analysis Tool"
-    description: str = (
-        "Analyzes the sentiment of text "
-        "to ensure positive and engaging communication."
-    )
+# Maximum number of tool calls and crews of a lead running at the same time
+TASK_GRAPH_MAX_WORKERS = int(os.getenv("TASK_GRAPH_MAX_WORKERS", "8"))
 
-    def _run(self, text: str) -> str:
-        """
-        Analyzes the sentiment of the given text using OpenAI API.
 
-        Args:
-            - text: The input text to analyze.
+@st.cache_resource
+def get_memory_store() -> "MemoryStore":
+    """
+    Returns the persistent crew memory store shared by every run.
+
+    Returns:
+        - The memory store.
+    """
+    from common.memory import create_memory_store
+
+    return create_memory_store()
 
-        Returns:
-            - The sentiment analysis result.
-        """
-        response = openai.Completion.create(
-            engine="text-davinci-003",
-            prompt=f"Analyze the sentiment of the following text and provide a brief summary of the sentiment: {text}",
-            max_tokens=60,
-        )
-        return response.choices[0].text.strip()
+
+@st.cache_resource
+def get_tool_cache() -> "ToolCache":
+    """
+    Returns the tool result cache shared by every process on the machine.
+
+    Returns:
+        - The tool cache.
+    """
+    from common.tool_cache import ToolCache
+
+    return ToolCache(cache_dir("tools") / "tools.sqlite")
+
+
+@st.cache_resource
+def get_sentiment_backend() -> CachedSentiment:
+    """
+    Returns the process-wide sentiment backend selected by ``SENTIMENT_BACKEND``.
+
+    Returns:
+        - The cached sentiment backend.
+    """
+    return create_sentiment_backend(
+        cache=SentimentCache(cache_dir("sentiment") / "sentiments.sqlite")
+    )
 
 
 def create_agent(
     role: str, goal: str, backstory: str, allow_delegation: bool, verbose: bool
-) -> Agent:
+) -> "Agent":
     """
     Creates an agent with the given parameters.
 
@@ -60,18 +96,24 @@ def create_agent(
     Returns:
         - An instance of the Agent class.
     """
+    from crewai import Agent
+
+    from common.llm_gateway import chat_openai
+
     return Agent(
         role=role,
         goal=goal,
         backstory=backstory,
         allow_delegation=allow_delegation,
         verbose=verbose,
+        # One model per agent, all sharing the connections and limits of the gateway
+        llm=chat_openai(),
     )
 
 
 def create_task(
-    description: str, expected_output: str, agent: Agent, tools: list = None
-) -> Task:
+    description: str, expected_output: str, agent: "Agent", tools: list = None
+) -> "Task":
     """
     Creates a task with the given parameters.
 
@@ -84,6 +126,8 @@ def create_task(
     Returns:
         - An instance of the Task class.
     """
+    from crewai import Task
+
     return Task(
         description=description,
         expected_output=expected_output,
@@ -92,7 +136,14 @@ def create_task(
     )
 
 
-def create_crew(agents: list, tasks: list, verbose: int, memory: bool) -> Crew:
+def create_crew(
+    agents: list,
+    tasks: list,
+    verbose: int,
+    memory: bool,
+    task_callback: Optional[Callable] = None,
+    memory_namespace: str = "default",
+) -> "Crew":
     """
     Creates a crew with the given agents and tasks.
 
@@ -101,14 +152,30 @@ def create_crew(agents: list, tasks: list, verbose: int, memory: bool) -> Crew:
         - tasks: A list of Task instances.
         - verbose: The verbosity level.
         - memory: Whether the crew should use memory.
+        - task_callback: Called with the output of each task once it is done.
+        - memory_namespace: The memory namespace of the run, shared by the runs of the same customer.
 
     Returns:
         - An instance of the Crew class.
     """
-    return Crew(agents=agents, tasks=tasks, verbose=verbose, memory=memory)
+    from crewai import Crew
 
+    from common.memory import attach_memory
 
-def initialize_agents() -> Dict[str, Agent]:
+    crew = Crew(
+        agents=agents,
+        tasks=tasks,
+        verbose=verbose,
+        # The persistent store replaces crewAI's per-run memory storages
+        memory=False,
+        task_callback=task_callback,
+    )
+    if memory:
+        attach_memory(crew, get_memory_store(), memory_namespace)
+    return crew
+
+
+def initialize_agents() -> Dict[str, "Agent"]:
     """
     Initializes the sales representative and lead sales representative agents.
 
@@ -150,7 +217,28 @@ def initialize_agents() -> Dict[str, Agent]:
     }
 
 
-def initialize_tasks(agents: Dict[str, Agent], tools: Dict[str, BaseTool]) -> list:
+def initialize_tools() -> Dict[str, "BaseTool"]:
+    """
+    Initializes the tools used by the agents.
+
+    Returns:
+        - A dictionary with initialized tools.
+    """
+    from crewai_tools import DirectoryReadTool, FileReadTool, SerperDevTool
+
+    from common.tool_cache import cached_tool
+    from sentiment_tool import SentimentAnalysisTool
+
+    return {
+        "directory_read_tool": DirectoryReadTool(directory=INSTRUCTIONS_DIR),
+        "file_read_tool": FileReadTool(),
+        # Identical searches for the same lead are served from the shared tool cache
+        "search_tool": cached_tool(SerperDevTool(), get_tool_cache()),
+        "sentiment_analysis_tool": SentimentAnalysisTool(backend=get_sentiment_backend()),
+    }
+
+
+def initialize_tasks(agents: Dict[str, "Agent"], tools: Dict[str, "BaseTool"]) -> list:
     """
     Initializes the tasks for the sales representative and lead sales representative agents.
 
@@ -168,7 +256,8 @@ def initialize_tasks(agents: Dict[str, Agent], tools: Dict[str, BaseTool]) -> li
             "Utilize all available data sources to compile a detailed profile, "
             "focusing on key decision-makers, recent business developments, and potential needs "
             "that align with our offerings. This task is crucial for tailoring our engagement strategy effectively. "
-            "Don't make assumptions and only use information you absolutely sure about."
+            "Don't make assumptions and only use information you absolutely sure about.\n\n"
+            "The following research has already been gathered for you:\n{research}"
         ),
         expected_output=(
             "A comprehensive report on {lead_name}, including company background, key personnel, recent milestones, and identified needs. "
@@ -200,10 +289,144 @@ def initialize_tasks(agents: Dict[str, Agent], tools: Dict[str, BaseTool]) -> li
         tools=[tools["sentiment_analysis_tool"], tools["search_tool"]],
     )
 
+    # The outreach task reads the profiling report even when run by its own crew
+    personalized_outreach_task.context = [lead_profiling_task]
+
     return [lead_profiling_task, personalized_outreach_task]
 
 
-def run_crew(inputs: Dict[str, Any], verbose: int, memory: bool) -> str:
+def format_research(research: Dict[str, Any]) -> str:
+    """
+    Formats the prefetched tool outputs for the lead profiling task.
+
+    Args:
+        - research: The tool outputs, keyed by task graph node name.
+
+    Returns:
+        - The research as one text block.
+    """
+    return "\n\n".join(f"## {name}\n{output}" for name, output in research.items())
+
+
+def build_lead_graph(
+    inputs: Dict[str, Any],
+    verbose: int,
+    memory: bool,
+    task_callback: Optional[Callable] = None,
+    agents: Optional[Dict[str, "Agent"]] = None,
+    tools: Optional[Dict[str, "BaseTool"]] = None,
+) -> TaskGraph:
+    """
+    Builds the task graph generating the outreach campaign of one lead.
+
+    The directory listing, the instruction files and the web search do not
+    depend on each other and run concurrently. The lead profiling crew starts
+    once they are all done, and the outreach crew once the profile is ready.
+
+    Args:
+        - inputs: The input parameters for the task.
+        - verbose: The verbosity level.
+        - memory: Whether the crews should use memory.
+        - task_callback: Called with the output of each task once it is done.
+        - agents: Agents to reuse across leads, created when not given.
+        - tools: Tools to reuse across leads, created when not given.
+
+    Returns:
+        - The task graph.
+    """
+    agents = agents or initialize_agents()
+    tools = tools or initialize_tools()
+    lead_profiling_task, personalized_outreach_task = initialize_tasks(agents, tools)
+
+    graph = TaskGraph()
+    research_nodes: List[str] = ["directory_read", "search"]
+    graph.add("directory_read", lambda _: tools["directory_read_tool"].run())
+    graph.add(
+        "search",
+        lambda _: tools["search_tool"].run(
+            search_query=f"{inputs['lead_name']} {inputs['industry']}"
+        ),
+    )
+    # One node per instruction file, so the reads overlap with each other and the search
+    for path in sorted(Path(INSTRUCTIONS_DIR).rglob("*")):
+        if path.is_file():
+            name = f"file_read:{path.relative_to(INSTRUCTIONS_DIR)}"
+            graph.add(
+                name,
+                lambda _, path=path: tools["file_read_tool"].run(file_path=str(path)),
+            )
+            research_nodes.append(name)
+
+    def profile(research: Dict[str, Any]) -> str:
+        crew = create_crew(
+            agents=[agents["sales_rep_agent"]],
+            tasks=[lead_profiling_task],
+            verbose=verbose,
+            memory=memory,
+            task_callback=task_callback,
+            memory_namespace=f"lead:{inputs['lead_name']}",
+        )
+        return crew.kickoff(inputs={**inputs, "research": format_research(research)})
+
+    def outreach(_: Dict[str, Any]) -> str:
+        crew = create_crew(
+            agents=[agents["lead_sales_rep_agent"]],
+            tasks=[personalized_outreach_task],
+            verbose=verbose,
+            memory=memory,
+            task_callback=task_callback,
+            memory_namespace=f"lead:{inputs['lead_name']}",
+        )
+        return crew.kickoff(inputs=inputs)
+
+    graph.add("lead_profiling", profile, depends_on=research_nodes)
+    graph.add("personalized_outreach", outreach, depends_on=["lead_profiling"])
+    return graph
+
+
+def run_lead_graph(
+    inputs: Dict[str, Any],
+    verbose: int,
+    memory: bool,
+    task_callback: Optional[Callable] = None,
+    agents: Optional[Dict[str, "Agent"]] = None,
+    tools: Optional[Dict[str, "BaseTool"]] = None,
+) -> GraphRun:
+    """
+    Runs the task graph of one lead.
+
+    Args:
+        - inputs: The input parameters for the task.
+        - verbose: The verbosity level.
+        - memory: Whether the crews should use memory.
+        - task_callback: Called with the output of each task once it is done.
+        - agents: Agents to reuse across leads, created when not given.
+        - tools: Tools to reuse across leads, created when not given.
+
+    Within a trace (see ``common.tracing``), each node and agent run is recorded as a span.
+
+    Returns:
+        - The results and the timings of the run.
+    """
+    agents = agents or initialize_agents()
+    graph = build_lead_graph(inputs, verbose, memory, task_callback, agents, tools)
+    run = current_trace()
+    if run is None:
+        return graph.run(max_workers=TASK_GRAPH_MAX_WORKERS)
+    run.attach(agents.values())
+    try:
+        return graph.run(max_workers=TASK_GRAPH_MAX_WORKERS)
+    finally:
+        # Agents may be reused for the next lead
+        run.detach(agents.values())
+
+
+def run_crew(
+    inputs: Dict[str, Any],
+    verbose: int,
+    memory: bool,
+    task_callback: Optional[Callable] = None,
+) -> str:
     """
     Runs the multi-agent system to generate a sales response based on the given inputs.
 
@@ -211,26 +434,13 @@ def run_crew(inputs: Dict[str, Any], verbose: int, memory: bool) -> str:
         - inputs: The input parameters for the task.
         - verbose: The verbosity level.
         - memory: Whether the crew should use memory.
+        - task_callback: Called with the output of each task once it is done.
 
     Returns:
         - The generated response in markdown format.
     """
-    agents = initialize_agents()
-    tools = {
-        "directory_read_tool": DirectoryReadTool(directory="./instructions"),
-        "file_read_tool": FileReadTool(),
-        "search_tool": SerperDevTool(),
-        "sentiment_analysis_tool": SentimentAnalysisTool(),
-    }
-    tasks = initialize_tasks(agents, tools)
-    crew = create_crew(
-        agents=[agents["sales_rep_agent"], agents["lead_sales_rep_agent"]],
-        tasks=tasks,
-        verbose=verbose,
-        memory=memory,
-    )
-    result = crew.kickoff(inputs=inputs)
-    return result
+    run = run_lead_graph(inputs, verbose, memory, task_callback)
+    return run.results["personalized_outreach"]
 
 
 def main():
@@ -259,9 +469,23 @@ def main():
             "position": position,
             "milestone": milestone,
         }
-        result = run_crew(inputs, verbose, memory)
+        runs: List[GraphRun] = []
+
+        def run(task_callback: Callable) -> str:
+            runs.append(run_lead_graph(inputs, verbose, memory, task_callback))
+            return runs[-1].results["personalized_outreach"]
+
+        with trace("customer_outreach", lead=lead_name) as traced:
+            result = stream_tasks(run, st.container())
         st.markdown("### Generated Response")
-        st.markdown(result)
+        st.markdown(result.text)
+        st.caption(result.caption("task"))
+        with st.expander("Timing report"):
+            st.markdown(runs[-1].report())
+        if memory:
+            with st.expander("Memory"):
+                st.json(get_memory_store().stats())
+        trace_panel(traced.trace_id if traced else None)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,250 @@
+"""
+Batch mode of the outreach campaign crew.
+
+Reads leads from a CSV or JSONL file and runs the lead task graph of ``app.py``
+for each of them on a bounded pool of worker threads. Every worker creates its
+agents and tools once and reuses them for all of its leads. Results are
+appended to a JSONL file as soon as each lead is done. That file is also the
+checkpoint: leads already in it with status "ok" are skipped on the next run,
+so an interrupted batch resumes where it stopped and failed leads are retried.
+
+Usage:
+    python batch.py leads.csv --output results.jsonl --workers 4
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, Set
+
+from app import initialize_agents, initialize_tools, run_lead_graph
+from common.tracing import trace
+
+logger = logging.getLogger(__name__)
+
+# Fields every lead must provide, the inputs of the crew tasks
+LEAD_FIELDS = ("lead_name", "industry", "key_decision_maker", "position", "milestone")
+
+
+def read_leads(path: Path) -> Iterator[Dict[str, str]]:
+    """
+    Reads leads from a CSV file with a header row or from a JSONL file.
+
+    Args:
+        - path: The leads file, ``.csv`` or ``.jsonl``.
+
+    Returns:
+        - An iterator over the leads, restricted to the lead fields.
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.suffix.lower() == ".csv":
+            rows = csv.DictReader(file)
+        else:
+            rows = (json.loads(line) for line in file if line.strip())
+        for number, row in enumerate(rows, start=1):
+            missing = [name for name in LEAD_FIELDS if not row.get(name)]
+            if missing:
+                raise ValueError(f"Lead {number} in {path} is missing {missing}")
+            yield {name: str(row[name]).strip() for name in LEAD_FIELDS}
+
+
+def lead_id(lead: Dict[str, str]) -> str:
+    """
+    Derives a stable id from the lead fields, used to resume a batch.
+
+    Args:
+        - lead: The lead.
+
+    Returns:
+        - The lead id.
+    """
+    payload = json.dumps([lead[name] for name in LEAD_FIELDS])
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def completed_leads(output: Path) -> Set[str]:
+    """
+    Reads the ids of the leads already processed successfully.
+
+    Args:
+        - output: The results file of a previous run.
+
+    Returns:
+        - The ids of the completed leads.
+    """
+    done: Set[str] = set()
+    if not output.exists():
+        return done
+    with open(output, encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interruption, the lead is run again
+                continue
+            if record.get("status") == "ok":
+                done.add(record["lead_id"])
+    return done
+
+
+class LeadWorker:
+    """
+    Runs leads with agents and tools kept per worker thread.
+
+    Agents and tasks hold per-run state, so they are never shared between
+    threads, only between the successive leads of one thread.
+    """
+
+    def __init__(self, verbose: int = 0, memory: bool = False):
+        """
+        Initializes the worker.
+
+        Args:
+            - verbose: The verbosity level of the crews.
+            - memory: Whether the crews should use memory.
+        """
+        self.verbose = verbose
+        self.memory = memory
+        self._local = threading.local()
+
+    def __call__(self, lead: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Runs the task graph of one lead.
+
+        Args:
+            - lead: The lead.
+
+        Returns:
+            - The result record of the lead.
+        """
+        if not hasattr(self._local, "agents"):
+            self._local.agents = initialize_agents()
+            self._local.tools = initialize_tools()
+
+        record: Dict[str, Any] = {"lead_id": lead_id(lead), "lead": lead}
+        start = time.perf_counter()
+        try:
+            with trace("outreach_batch", lead_id=record["lead_id"]):
+                run = run_lead_graph(
+                    lead,
+                    self.verbose,
+                    self.memory,
+                    agents=self._local.agents,
+                    tools=self._local.tools,
+                )
+            record.update(
+                status="ok",
+                output=str(run.results["personalized_outreach"]),
+                critical_path=run.critical_path(),
+            )
+        except Exception as exc:
+            logger.exception("Lead %s failed", lead["lead_name"])
+            record.update(status="error", error=f"{type(exc).__name__}: {exc}")
+        record["seconds"] = round(time.perf_counter() - start, 3)
+        return record
+
+
+def run_batch(
+    leads_path: Path,
+    output: Path,
+    workers: int = 4,
+    verbose: int = 0,
+    memory: bool = False,
+) -> Dict[str, int]:
+    """
+    Processes every lead not completed yet and appends the results to the output.
+
+    At most twice as many leads as workers are in flight at any time, so large
+    files are streamed rather than loaded at once.
+
+    Args:
+        - leads_path: The leads file, ``.csv`` or ``.jsonl``.
+        - output: The JSONL results file, also used as the checkpoint.
+        - workers: The number of leads processed at the same time.
+        - verbose: The verbosity level of the crews.
+        - memory: Whether the crews should use memory.
+
+    Returns:
+        - The number of leads skipped, succeeded and failed.
+    """
+    done = completed_leads(output)
+    # Terminate a line cut short by an interruption before appending
+    if output.exists() and output.stat().st_size:
+        with open(output, "rb") as file:
+            file.seek(-1, 2)
+            truncated = file.read() != b"\n"
+        if truncated:
+            with open(output, "a", encoding="utf-8") as file:
+                file.write("\n")
+    counts = {"skipped": 0, "ok": 0, "error": 0}
+    worker = LeadWorker(verbose, memory)
+    start = time.perf_counter()
+
+    with open(output, "a", encoding="utf-8") as results, ThreadPoolExecutor(
+        max_workers=workers
+    ) as executor:
+        running: Set[Future] = set()
+
+        def drain(block_until: int) -> None:
+            # Write finished leads until at most `block_until` are in flight
+            while len(running) > block_until:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    running.discard(future)
+                    record = future.result()
+                    results.write(json.dumps(record) + "\n")
+                    results.flush()
+                    counts[record["status"]] += 1
+                    processed = counts["ok"] + counts["error"]
+                    logger.info(
+                        "%s %s in %.1fs (%d done, %.2f leads/min)",
+                        record["status"],
+                        record["lead"]["lead_name"],
+                        record["seconds"],
+                        processed,
+                        60 * processed / (time.perf_counter() - start),
+                    )
+
+        for lead in read_leads(leads_path):
+            if lead_id(lead) in done:
+                counts["skipped"] += 1
+                continue
+            # Duplicated leads in the input are only processed once
+            done.add(lead_id(lead))
+            running.add(executor.submit(worker, lead))
+            drain(2 * workers)
+        drain(0)
+
+    return counts
+
+
+def main():
+    """
+    Parses the command line and runs the batch.
+    """
+    parser = argparse.ArgumentParser(description="Batch lead processing")
+    parser.add_argument("leads", type=Path, help="CSV or JSONL file of leads")
+    parser.add_argument("--output", type=Path, default=Path("results.jsonl"))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--verbose", type=int, default=0, choices=[0, 1, 2])
+    parser.add_argument("--memory", action="store_true", help="Enable crew memory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    counts = run_batch(args.leads, args.output, args.workers, args.verbose, args.memory)
+    logger.info(
+        "Batch done: %d succeeded, %d failed, %d skipped as completed or duplicated",
+        counts["ok"],
+        counts["error"],
+        counts["skipped"],
+    )
+
+
+if __name__ == "__main__":
+    main()
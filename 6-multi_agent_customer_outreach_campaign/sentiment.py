@@ -0,0 +1,364 @@
+"""
+Sentiment scoring of outreach drafts with pluggable backends.
+
+``LexiconSentiment`` scores text locally on CPU with a small valence lexicon,
+negation and intensifier rules, in the spirit of VADER. ``OpenAISentiment``
+asks a chat model to score a whole batch of drafts in one request. Either can
+be wrapped in ``CachedSentiment``, which scores only the drafts whose text hash
+is not cached yet.
+"""
+
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from common import text_hash
+
+# Word valences from -3 (very negative) to 3 (very positive)
+LEXICON: Dict[str, float] = {
+    # Positive
+    "achievement": 2.0, "amazing": 2.8, "appreciate": 2.0, "appreciated": 2.0,
+    "benefit": 1.6, "benefits": 1.6, "best": 2.4, "better": 1.6, "brilliant": 2.8,
+    "celebrate": 2.4, "clear": 1.0, "collaborate": 1.4, "collaboration": 1.4,
+    "compelling": 1.8, "confident": 1.8, "congratulations": 2.8, "congrats": 2.6,
+    "delighted": 2.8, "easy": 1.4, "effective": 1.8, "efficient": 1.6,
+    "empower": 1.8, "engaging": 1.8, "enjoy": 2.0, "excellent": 2.8,
+    "excited": 2.4, "exciting": 2.4, "fantastic": 2.8, "glad": 2.0, "good": 1.8,
+    "grateful": 2.2, "great": 2.4, "grow": 1.4, "growth": 1.4, "happy": 2.6,
+    "help": 1.2, "helpful": 1.8, "impressive": 2.4, "improve": 1.6,
+    "improved": 1.6, "innovative": 2.0, "inspiring": 2.4, "interested": 1.4,
+    "like": 1.4, "love": 3.0, "milestone": 1.4, "opportunity": 1.6,
+    "outstanding": 2.8, "partner": 1.2, "partnership": 1.4, "perfect": 2.6,
+    "pleased": 2.2, "pleasure": 2.4, "positive": 2.0, "proud": 2.2,
+    "recommend": 1.6, "reliable": 1.8, "remarkable": 2.4, "seamless": 1.8,
+    "success": 2.4, "successful": 2.4, "support": 1.4, "thank": 1.8,
+    "thanks": 1.8, "thrilled": 2.8, "trust": 1.8, "valuable": 2.0, "value": 1.4,
+    "welcome": 1.8, "win": 2.2, "wonderful": 2.8,
+    # Negative
+    "annoying": -2.2, "bad": -2.4, "broken": -2.2, "burden": -1.8,
+    "complicated": -1.4, "concern": -1.4, "concerned": -1.6, "confusing": -1.8,
+    "costly": -1.6, "difficult": -1.6, "disappointed": -2.4,
+    "disappointing": -2.4, "expensive": -1.4, "fail": -2.4, "failed": -2.4,
+    "failure": -2.6, "frustrated": -2.4, "frustrating": -2.4, "hard": -1.0,
+    "hate": -3.0, "issue": -1.2, "issues": -1.2, "lose": -2.0, "losing": -2.0,
+    "loss": -2.2, "miss": -1.2, "missed": -1.4, "pain": -2.0, "poor": -2.2,
+    "problem": -1.8, "problems": -1.8, "regret": -2.2, "risk": -1.4,
+    "risky": -1.6, "sad": -2.2, "slow": -1.4, "sorry": -1.2, "struggle": -1.8,
+    "struggling": -1.8, "terrible": -3.0, "unfortunately": -1.8,
+    "unhappy": -2.4, "urgent": -1.0, "waste": -2.2, "worried": -2.0,
+    "worse": -2.2, "worst": -3.0, "wrong": -2.0,
+}
+
+NEGATIONS = {
+    "not", "no", "never", "none", "nobody", "nothing", "neither", "nor",
+    "without", "cannot", "can't", "don't", "doesn't", "didn't", "isn't",
+    "aren't", "wasn't", "weren't", "won't", "wouldn't", "shouldn't",
+}
+
+# Multipliers applied to the valence of the next word
+INTENSIFIERS = {
+    "absolutely": 1.3, "extremely": 1.4, "highly": 1.3, "incredibly": 1.4,
+    "really": 1.2, "so": 1.2, "truly": 1.2, "very": 1.3,
+    "barely": 0.6, "slightly": 0.6, "somewhat": 0.7,
+}
+
+_WORD = re.compile(r"[a-z']+|!")
+
+
+@dataclass
+class SentimentScore:
+    """
+    Sentiment of one text.
+    """
+
+    # "positive", "neutral" or "negative"
+    label: str
+    # Compound score from -1 (most negative) to 1 (most positive)
+    score: float
+    summary: str
+
+
+def label_for(score: float, threshold: float = 0.05) -> str:
+    """
+    Maps a compound score to a label.
+
+    Args:
+        - score: The compound score.
+        - threshold: The absolute score under which text is neutral.
+
+    Returns:
+        - The sentiment label.
+    """
+    if score >= threshold:
+        return "positive"
+    if score <= -threshold:
+        return "negative"
+    return "neutral"
+
+
+class LexiconSentiment:
+    """
+    Local rule-based scorer, thousands of drafts per second on one core.
+    """
+
+    name = "lexicon"
+
+    def _score(self, text: str) -> SentimentScore:
+        tokens = _WORD.findall(text.lower())
+        total = 0.0
+        positive: List[str] = []
+        negative: List[str] = []
+        for i, token in enumerate(tokens):
+            valence = LEXICON.get(token)
+            if valence is None:
+                continue
+            previous = tokens[max(0, i - 3) : i]
+            if i and tokens[i - 1] in INTENSIFIERS:
+                valence *= INTENSIFIERS[tokens[i - 1]]
+            if any(word in NEGATIONS for word in previous):
+                valence *= -0.74
+            total += valence
+            (positive if valence > 0 else negative).append(token)
+
+        # Exclamation marks amplify the overall tone, up to three of them
+        exclamations = min(tokens.count("!"), 3)
+        if total:
+            total += math.copysign(0.29 * exclamations, total)
+
+        score = round(total / math.sqrt(total * total + 15), 4)
+        label = label_for(score)
+        summary = f"{label.capitalize()} sentiment (score {score:+.2f})."
+        if positive:
+            summary += f" Positive cues: {', '.join(sorted(set(positive))[:5])}."
+        if negative:
+            summary += f" Negative cues: {', '.join(sorted(set(negative))[:5])}."
+        return SentimentScore(label, score, summary)
+
+    def score_batch(self, texts: List[str]) -> List[SentimentScore]:
+        """
+        Scores a batch of texts.
+
+        Args:
+            - texts: The texts to score.
+
+        Returns:
+            - One score per text, in order.
+        """
+        return [self._score(text) for text in texts]
+
+
+class OpenAISentiment:
+    """
+    Remote scorer asking a chat model to rate a whole batch in one request.
+    """
+
+    def __init__(self, client: Any = None, model: str = "gpt-3.5-turbo"):
+        """
+        Initializes the scorer.
+
+        Args:
+            - client: The OpenAI client, on the shared LLM gateway when not given.
+            - model: The chat model used for scoring.
+        """
+        if client is None:
+            from common.llm_gateway import openai_clients
+
+            client, _ = openai_clients()
+        self.client = client
+        self.model = model
+        self.name = f"openai:{model}"
+
+    def score_batch(self, texts: List[str]) -> List[SentimentScore]:
+        """
+        Scores a batch of texts with a single chat completion.
+
+        Args:
+            - texts: The texts to score.
+
+        Returns:
+            - One score per text, in order.
+        """
+        if not texts:
+            return []
+        numbered = "\n\n".join(f"[{i}]\n{text}" for i, text in enumerate(texts))
+        response = self.client.chat.completions.create(
+            model=self.model,
+            temperature=0,
+            response_format={"type": "json_object"},
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "You analyze the sentiment of sales outreach drafts. Reply with a JSON "
+                        'object {"results": [...]} holding, for every numbered text in order, '
+                        'an object with "score" (a number from -1 to 1) and "summary" '
+                        "(one sentence describing the sentiment)."
+                    ),
+                },
+                {"role": "user", "content": numbered},
+            ],
+        )
+        results = json.loads(response.choices[0].message.content)["results"]
+        if len(results) != len(texts):
+            raise ValueError(
+                f"Expected {len(texts)} sentiment results, got {len(results)}"
+            )
+        scores = []
+        for result in results:
+            score = max(-1.0, min(1.0, float(result["score"])))
+            scores.append(SentimentScore(label_for(score), score, str(result["summary"])))
+        return scores
+
+
+class SentimentCache:
+    """
+    SQLite store mapping (backend, text hash) to a sentiment score.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Opens (and creates if needed) the cache database.
+
+        Args:
+            - path: The path of the SQLite database file.
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sentiments ("
+            "backend TEXT NOT NULL, hash TEXT NOT NULL, score TEXT NOT NULL, "
+            "PRIMARY KEY (backend, hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, backend: str, hashes: List[str]) -> Dict[str, SentimentScore]:
+        """
+        Looks up the cached scores for the given text hashes.
+
+        Args:
+            - backend: The name of the scoring backend.
+            - hashes: The text hashes to look up.
+
+        Returns:
+            - A dictionary mapping the found hashes to their scores.
+        """
+        found: Dict[str, SentimentScore] = {}
+        with self._lock:
+            # Stay well below SQLite's limit on the number of query parameters
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start : start + 500]
+                rows = self._conn.execute(
+                    f"SELECT hash, score FROM sentiments WHERE backend = ? "
+                    f"AND hash IN ({', '.join('?' * len(batch))})",
+                    [backend, *batch],
+                ).fetchall()
+                for digest, score in rows:
+                    found[digest] = SentimentScore(**json.loads(score))
+        return found
+
+    def put_many(self, backend: str, scores: Dict[str, SentimentScore]) -> None:
+        """
+        Stores scores in the cache.
+
+        Args:
+            - backend: The name of the scoring backend.
+            - scores: A dictionary mapping text hashes to scores.
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sentiments (backend, hash, score) VALUES (?, ?, ?)",
+                [
+                    (backend, digest, json.dumps(asdict(score)))
+                    for digest, score in scores.items()
+                ],
+            )
+            self._conn.commit()
+
+
+class CachedSentiment:
+    """
+    Wraps a backend so every distinct text is scored at most once.
+    """
+
+    def __init__(
+        self,
+        backend: Any,
+        cache: Optional[SentimentCache] = None,
+        max_memory_entries: int = 10_000,
+    ):
+        """
+        Initializes the wrapper.
+
+        Args:
+            - backend: The scoring backend.
+            - cache: The persistent score cache, or None for an in-memory cache only.
+            - max_memory_entries: The number of scores kept in memory before it is reset.
+        """
+        self.backend = backend
+        self.name = backend.name
+        self.cache = cache
+        self.max_memory_entries = max_memory_entries
+        self._memory: Dict[str, SentimentScore] = {}
+        self._lock = threading.Lock()
+
+    def score_batch(self, texts: List[str]) -> List[SentimentScore]:
+        """
+        Scores a batch of texts, sending only uncached distinct texts to the backend.
+
+        Args:
+            - texts: The texts to score.
+
+        Returns:
+            - One score per text, in order.
+        """
+        hashes = [text_hash(text) for text in texts]
+        with self._lock:
+            scores = {digest: self._memory[digest] for digest in hashes if digest in self._memory}
+        missing = [digest for digest in dict.fromkeys(hashes) if digest not in scores]
+        if missing and self.cache is not None:
+            scores.update(self.cache.get_many(self.name, missing))
+            missing = [digest for digest in missing if digest not in scores]
+
+        if missing:
+            texts_by_hash = dict(zip(hashes, texts))
+            computed = dict(
+                zip(missing, self.backend.score_batch([texts_by_hash[d] for d in missing]))
+            )
+            if self.cache is not None:
+                self.cache.put_many(self.name, computed)
+            scores.update(computed)
+
+        with self._lock:
+            if len(self._memory) + len(scores) > self.max_memory_entries:
+                self._memory.clear()
+            self._memory.update(scores)
+        return [scores[digest] for digest in hashes]
+
+
+def create_sentiment_backend(
+    backend: Optional[str] = None, cache: Optional[SentimentCache] = None
+) -> CachedSentiment:
+    """
+    Creates the cached sentiment backend selected by ``SENTIMENT_BACKEND``.
+
+    Args:
+        - backend: "lexicon" or "openai", read from the environment by default.
+        - cache: The persistent score cache.
+
+    Returns:
+        - The cached sentiment backend.
+    """
+    backend = backend or os.getenv("SENTIMENT_BACKEND", "lexicon")
+    if backend == "lexicon":
+        return CachedSentiment(LexiconSentiment(), cache)
+    if backend == "openai":
+        model = os.getenv("SENTIMENT_OPENAI_MODEL", "gpt-3.5-turbo")
+        return CachedSentiment(OpenAISentiment(model=model), cache)
+    raise ValueError(f"Unknown sentiment backend: {backend}")
@@ -0,0 +1,43 @@
+"""
+crewAI tool scoring the sentiment of outreach drafts.
+
+Kept apart from the app so that crewAI's tools are only imported once a lead is
+processed, see ``initialize_tools``.
+"""
+
+import re
+from typing import Any
+
+from crewai_tools import BaseTool
+
+
+class SentimentAnalysisTool(BaseTool):
+    name: str = "Sentiment Analysis Tool"
+    description: str = (
+        "Analyzes the sentiment of text "
+        "to ensure positive and engaging communication. "
+        "To score several drafts in one call, separate them with a line containing only ---."
+    )
+    # The sentiment backend, see sentiment.create_sentiment_backend
+    backend: Any
+
+    def _run(self, text: str) -> str:
+        """
+        Analyzes the sentiment of the given drafts in one batch.
+
+        Args:
+            - text: The input text to analyze, drafts separated by lines of ---.
+
+        Returns:
+            - The sentiment analysis result, one line per draft.
+        """
+        drafts = [
+            draft.strip() for draft in re.split(r"^\s*---\s*$", text, flags=re.M)
+        ]
+        drafts = [draft for draft in drafts if draft] or [text]
+        scores = self.backend.score_batch(drafts)
+        if len(scores) == 1:
+            return scores[0].summary
+        return "\n".join(
+            f"Draft {i}: {score.summary}" for i, score in enumerate(scores, start=1)
+        )
@@ -0,0 +1,212 @@
+"""
+Minimal task-graph executor with a critical-path timing report.
+
+Nodes declare the names of the nodes whose results they need. Every node whose
+dependencies are done is submitted to a thread pool right away, so independent
+tool calls and crews overlap while dependent ones wait for their inputs.
+Within a trace (see ``common.tracing``), each node is recorded as a span.
+"""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from common.tracing import span
+
+
+@dataclass
+class NodeTiming:
+    """
+    Start and end of a node, in seconds since the start of the run.
+    """
+
+    start: float
+    end: float
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+@dataclass
+class GraphRun:
+    """
+    Results and timings of a task-graph run.
+    """
+
+    results: Dict[str, Any]
+    timings: Dict[str, NodeTiming]
+    dependencies: Dict[str, Tuple[str, ...]]
+    wall_time: float = 0.0
+
+    def critical_path(self) -> List[str]:
+        """
+        Returns the chain of nodes that bounded the wall-clock time of the run.
+
+        Starting from the node that finished last, each step follows the
+        dependency that finished last, i.e. the one the node waited for.
+
+        Returns:
+            - The node names on the critical path, in execution order.
+        """
+        if not self.timings:
+            return []
+        node = max(self.timings, key=lambda name: self.timings[name].end)
+        path = [node]
+        while True:
+            deps = [dep for dep in self.dependencies[node] if dep in self.timings]
+            if not deps:
+                break
+            node = max(deps, key=lambda name: self.timings[name].end)
+            path.append(node)
+        return path[::-1]
+
+    def report(self) -> str:
+        """
+        Formats the per-node timings and the critical path as a markdown table.
+
+        Returns:
+            - The timing report.
+        """
+        critical = set(self.critical_path())
+        serial_time = sum(timing.duration for timing in self.timings.values())
+        lines = [
+            "| Node | Start (s) | Duration (s) | Critical path |",
+            "| --- | ---: | ---: | :---: |",
+        ]
+        for name, timing in sorted(self.timings.items(), key=lambda item: item[1].start):
+            lines.append(
+                f"| {name} | {timing.start:.2f} | {timing.duration:.2f} | "
+                f"{'●' if name in critical else ''} |"
+            )
+        lines.append("")
+        lines.append(
+            f"Wall time {self.wall_time:.2f}s, serial time {serial_time:.2f}s, "
+            f"critical path: {' → '.join(self.critical_path())}"
+        )
+        return "\n".join(lines)
+
+
+class TaskGraph:
+    """
+    A directed acyclic graph of named callables.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty graph.
+        """
+        self._nodes: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._dependencies: Dict[str, Tuple[str, ...]] = {}
+
+    def add(
+        self,
+        name: str,
+        run: Callable[[Dict[str, Any]], Any],
+        depends_on: Sequence[str] = (),
+    ) -> "TaskGraph":
+        """
+        Adds a node to the graph.
+
+        Args:
+            - name: The unique name of the node.
+            - run: Called with the results of the dependencies, keyed by node name.
+            - depends_on: The names of the nodes whose results are needed.
+
+        Returns:
+            - The graph, for chaining.
+        """
+        if name in self._nodes:
+            raise ValueError(f"Duplicate task graph node: {name}")
+        self._nodes[name] = run
+        self._dependencies[name] = tuple(depends_on)
+        return self
+
+    def _check(self) -> None:
+        # Unknown dependencies and cycles would otherwise deadlock the run
+        for name, deps in self._dependencies.items():
+            missing = [dep for dep in deps if dep not in self._nodes]
+            if missing:
+                raise ValueError(f"Node {name} depends on unknown nodes: {missing}")
+        visiting, done = set(), set()
+
+        def visit(name: str) -> None:
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Task graph has a cycle through {name}")
+            visiting.add(name)
+            for dep in self._dependencies[name]:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self._nodes:
+            visit(name)
+
+    def run(self, max_workers: int = 8) -> GraphRun:
+        """
+        Runs every node once all of its dependencies have finished.
+
+        A failing node is recorded and its dependents are skipped; the first
+        error is raised once the nodes already running have finished.
+
+        Args:
+            - max_workers: The maximum number of nodes running at the same time.
+
+        Returns:
+            - The results and timings of the run.
+        """
+        self._check()
+        results: Dict[str, Any] = {}
+        timings: Dict[str, NodeTiming] = {}
+        errors: Dict[str, BaseException] = {}
+        lock = threading.Lock()
+        start = time.perf_counter()
+
+        def execute(name: str) -> Any:
+            inputs = {dep: results[dep] for dep in self._dependencies[name]}
+            node_start = time.perf_counter() - start
+            try:
+                with span(name, "node"):
+                    return self._nodes[name](inputs)
+            finally:
+                with lock:
+                    timings[name] = NodeTiming(node_start, time.perf_counter() - start)
+
+        pending = dict(self._dependencies)
+        running: Dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                if not errors:
+                    ready = [
+                        name
+                        for name, deps in pending.items()
+                        if all(dep in results for dep in deps)
+                    ]
+                    for name in ready:
+                        del pending[name]
+                        # Nodes run in the context of the caller, e.g. its trace
+                        context = contextvars.copy_context()
+                        running[executor.submit(context.run, execute, name)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as exc:
+                        errors[name] = exc
+
+        if errors:
+            raise next(iter(errors.values()))
+        return GraphRun(
+            results=results,
+            timings=timings,
+            dependencies=dict(self._dependencies),
+            wall_time=time.perf_counter() - start,
+        )
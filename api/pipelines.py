@@ -0,0 +1,295 @@
+"""
+The pipelines of the six apps, callable without Streamlit.
+
+Each app is imported on first use under its own module name, as they are all
+called ``app.py``, with its folder on ``sys.path`` for its sibling modules
+(their names do not clash). Everything the apps keep with ``st.cache_resource``
+(chat models, parsed files, vector indexes, retrievers, response, stage and tool
+caches) is then shared by every request of the process. crewAI agents hold
+per-run state, so as in the batch CLIs each worker thread builds its own agents
+once and reuses them for the requests it handles.
+"""
+
+import hashlib
+import importlib.util
+import io
+import logging
+import sys
+import threading
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Folder of every app
+APP_DIRS = {
+    "ask_csv": "1-ask_csv",
+    "ask_doc": "2-ask_doc",
+    "pdf": "3-pdf_summary_chat",
+    "content_generator": "4-multi_agent_system_content_generator",
+    "customer_support": "5-multi_agent_customer_support_automation",
+    "customer_outreach": "6-multi_agent_customer_outreach_campaign",
+}
+
+# Guards the dictionaries below only, never held while an app or object is built
+_lock = threading.Lock()
+# One lock per app or shared object, so a slow build only blocks requests waiting for it
+_build_locks: Dict[str, threading.Lock] = {}
+_apps: Dict[str, ModuleType] = {}
+_shared: Dict[str, Any] = {}
+_local = threading.local()
+
+
+def _build_lock(name: str) -> threading.Lock:
+    with _lock:
+        return _build_locks.setdefault(name, threading.Lock())
+
+
+def load_app(name: str) -> ModuleType:
+    """
+    Imports an app once per process.
+
+    Args:
+        - name: The app, a key of ``APP_DIRS``.
+
+    Returns:
+        - The app module.
+    """
+    module = _apps.get(name)
+    if module is not None:
+        return module
+    with _build_lock(f"app:{name}"):
+        if name not in _apps:
+            directory = ROOT / APP_DIRS[name]
+            with _lock:
+                for path in (str(ROOT), str(directory)):
+                    if path not in sys.path:
+                        sys.path.append(path)
+            # Outside `streamlit run`, every page element logs a warning
+            logging.getLogger("streamlit").setLevel(logging.ERROR)
+            spec = importlib.util.spec_from_file_location(f"{name}_app", directory / "app.py")
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _apps[name] = module
+        return _apps[name]
+
+
+def loaded_apps() -> List[str]:
+    """
+    Returns the apps imported so far.
+
+    Never blocks, so it is safe to call from the event loop while an app is imported.
+    """
+    # Copying a dict is atomic, no lock needed
+    return sorted(_apps.copy())
+
+
+def shared(name: str, create: Callable[[], Any]) -> Any:
+    """
+    Returns a process-wide object, creating it on first use.
+
+    Args:
+        - name: The name of the object.
+        - create: Creates the object.
+
+    Returns:
+        - The object.
+    """
+    value = _shared.get(name)
+    if value is not None:
+        return value
+    # Created outside the global lock, e.g. an LLM validating its token over the network
+    with _build_lock(f"shared:{name}"):
+        if name not in _shared:
+            _shared[name] = create()
+        return _shared[name]
+
+
+def per_thread(name: str, create: Callable[[], Any]) -> Any:
+    """
+    Returns an object kept by the current thread, creating it on first use.
+
+    Args:
+        - name: The name of the object.
+        - create: Creates the object.
+
+    Returns:
+        - The object.
+    """
+    value = getattr(_local, name, None)
+    if value is None:
+        value = create()
+        setattr(_local, name, value)
+    return value
+
+
+def quiet(agents: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turns off the step by step output of agents, too much for a server.
+
+    Args:
+        - agents: The crewAI agents.
+
+    Returns:
+        - The same agents.
+    """
+    for agent in agents.values():
+        agent.verbose = False
+    return agents
+
+
+class Upload(io.BytesIO):
+    """
+    Stands in for the file returned by Streamlit's file uploader.
+    """
+
+    def __init__(self, data: bytes, name: str):
+        """
+        Initializes the upload.
+
+        Args:
+            - data: The file content.
+            - name: The file name.
+        """
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+        self.file_id = hashlib.sha256(data).hexdigest()
+
+
+def ask_csv(data: bytes, filename: str, question: str, callbacks: List[Any]) -> str:
+    """
+    Answers a question about a CSV file.
+
+    Args:
+        - data: The CSV file.
+        - filename: The file name.
+        - question: The question.
+        - callbacks: LangChain callback handlers of the run.
+
+    Returns:
+        - The answer.
+    """
+    app = load_app("ask_csv")
+    upload = Upload(data, filename)
+    # One engine per dataset, shared by every client asking about it
+    engine = app.get_engine_registry().get(
+        upload.file_id,
+        upload.file_id,
+        lambda: app.create_engine(upload, verbose=False),
+    )
+    return engine.ask(question, callbacks)
+
+
+def ask_doc(data: bytes, filename: str, question: str, callbacks: List[Any]) -> str:
+    """
+    Answers a question about a text document.
+
+    Args:
+        - data: The document.
+        - filename: The file name.
+        - question: The question.
+        - callbacks: LangChain callback handlers of the run.
+
+    Returns:
+        - The answer.
+    """
+    return load_app("ask_doc").generate_response(Upload(data, filename), question, callbacks)
+
+
+def summarize_pdf(data: bytes, filename: str, callbacks: List[Any]) -> str:
+    """
+    Summarizes a PDF file.
+
+    Args:
+        - data: The PDF file.
+        - filename: The file name.
+        - callbacks: LangChain callback handlers of the final combine step.
+
+    Returns:
+        - The summary.
+    """
+    app = load_app("pdf")
+    llm = shared("pdf_llm", app.create_llm)
+    return app.summarize_pdf(Upload(data, filename), llm, callbacks)
+
+
+def chat_with_pdf(data: bytes, filename: str, question: str, callbacks: List[Any]) -> str:
+    """
+    Answers a question about a PDF file.
+
+    Args:
+        - data: The PDF file.
+        - filename: The file name.
+        - question: The question.
+        - callbacks: LangChain callback handlers of the run.
+
+    Returns:
+        - The answer.
+    """
+    app = load_app("pdf")
+    llm = shared("pdf_llm", app.create_llm)
+    return app.chat_with_pdf(Upload(data, filename), question, llm, callbacks)
+
+
+def generate_content(
+    topic: str, start_stage: Optional[str], task_callback: Callable[[Any], None]
+) -> str:
+    """
+    Generates an article with the planner, writer and editor crew.
+
+    Args:
+        - topic: The topic.
+        - start_stage: The first stage to regenerate, cached stages are reused by default.
+        - task_callback: Called with the output of each task once it is done.
+
+    Returns:
+        - The article in markdown format.
+    """
+    app = load_app("content_generator")
+    agents = per_thread("content_agents", lambda: quiet(app.initialize_agents()))
+    run = app.run_stages(topic, 0, task_callback, start_stage, agents=agents)
+    return run.outputs["edit"]
+
+
+def answer_support(
+    inputs: Dict[str, Any], memory: bool, task_callback: Callable[[Any], None]
+) -> str:
+    """
+    Answers a customer inquiry with the support crew.
+
+    Args:
+        - inputs: The customer, person and inquiry.
+        - memory: Whether the crew remembers earlier inquiries of the customer.
+        - task_callback: Called with the output of each task once it is done.
+
+    Returns:
+        - The reviewed answer in markdown format.
+    """
+    app = load_app("customer_support")
+    # Per request, as in the ticket worker, so a rebuilt knowledge base is picked up
+    tools = app.initialize_tools()
+    agents = per_thread("support_agents", lambda: quiet(app.initialize_agents()))
+    return str(app.run_crew(inputs, 0, memory, task_callback, agents=agents, tools=tools))
+
+
+def run_outreach(
+    inputs: Dict[str, Any], memory: bool, task_callback: Callable[[Any], None]
+) -> str:
+    """
+    Writes the outreach campaign of a lead with the sales crews.
+
+    Args:
+        - inputs: The lead name, industry, key decision maker, position and milestone.
+        - memory: Whether the crews remember earlier runs for the lead.
+        - task_callback: Called with the output of each task once it is done.
+
+    Returns:
+        - The outreach emails in markdown format.
+    """
+    app = load_app("customer_outreach")
+    agents = per_thread("outreach_agents", lambda: quiet(app.initialize_agents()))
+    tools = per_thread("outreach_tools", app.initialize_tools)
+    run = app.run_lead_graph(inputs, 0, memory, task_callback, agents=agents, tools=tools)
+    return str(run.results["personalized_outreach"])
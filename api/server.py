@@ -0,0 +1,645 @@
+"""
+Headless HTTP API of the six apps, for services calling them without a browser.
+
+The chains and crews are blocking, so every request runs in a bounded thread
+pool (``API_MAX_WORKERS``) while the event loop keeps serving other clients.
+At most ``API_MAX_PENDING`` requests are running or queued; beyond that the
+server answers 503 with a ``Retry-After`` header instead of queueing without
+bound. Indexes, chat models and caches are shared by the whole process, and
+each worker thread reuses its crewAI agents (see ``pipelines.py``).
+
+Every endpoint answers with JSON, or with server-sent events when called with
+``?stream=true``: ``token`` events carry the LLM tokens as they are generated,
+``task`` events the output of each crew task, then a final ``result`` or
+``error`` event.
+
+A request is cancelled when its client disconnects, when it runs longer than
+``API_REQUEST_TIMEOUT`` seconds, or with ``DELETE /requests/{id}``. The id is
+the ``X-Request-ID`` header sent by the client, or generated and returned in
+that header. Cancellation is cooperative (see ``common.cancellation``): the run
+stops at its next LLM call or token and its worker is freed.
+
+Usage:
+    python api/server.py --host 0.0.0.0 --port 8000
+    curl -F file=@data.csv -F question="How many rows are there?" localhost:8000/ask-csv
+    curl -N -H "Content-Type: application/json" -d '{"topic": "AI"}' \\
+        "localhost:8000/crews/content?stream=true"
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Literal, Optional
+
+from fastapi import FastAPI, File, Form, HTTPException, Request, Response, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from langchain_core.callbacks import BaseCallbackHandler
+from pydantic import BaseModel
+
+# Make the shared modules importable when running `python api/server.py`
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import pipelines
+from common.cancellation import CancellationCallbackHandler, Cancelled, CancelToken, cancellable
+from common.tracing import current_trace, trace
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.getenv("API_MAX_WORKERS", "8"))
+# Requests running or waiting for a worker, beyond which new ones are turned away
+MAX_PENDING = int(os.getenv("API_MAX_PENDING", "32"))
+REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", "600"))
+MAX_UPLOAD_MB = float(os.getenv("API_MAX_UPLOAD_MB", "200"))
+# Apps imported at startup rather than by their first request, e.g. "ask_doc,pdf"
+PRELOAD = [name for name in os.getenv("API_PRELOAD", "").split(",") if name]
+
+# Seconds between keep-alive comments of an idle event stream
+KEEP_ALIVE = 15.0
+
+
+class Job:
+    """
+    One request being run in the worker pool.
+    """
+
+    def __init__(self, request_id: str, name: str, loop: asyncio.AbstractEventLoop):
+        """
+        Initializes the job.
+
+        Args:
+            - request_id: The id of the request.
+            - name: The pipeline, also the name of its trace.
+            - loop: The event loop of the server.
+        """
+        self.id = request_id
+        self.name = name
+        self.loop = loop
+        self.token = CancelToken()
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.summary: Optional[Dict[str, Any]] = None
+        self.future: Optional[asyncio.Future] = None
+
+    def emit(self, kind: str, data: Any) -> None:
+        """
+        Sends an event to the client, from any thread.
+
+        Args:
+            - kind: The kind of event, e.g. "token" or "task".
+            - data: The payload of the event.
+        """
+        try:
+            self.loop.call_soon_threadsafe(self.events.put_nowait, (kind, data))
+        except RuntimeError:
+            # The server is shutting down
+            pass
+
+    def callbacks(self) -> List[BaseCallbackHandler]:
+        """
+        Returns the LangChain callback handlers of a chain run by the job.
+
+        Returns:
+            - Handlers streaming the tokens, stopping the chain once cancelled and tracing it.
+        """
+        handlers = [EventCallbackHandler(self), CancellationCallbackHandler(self.token)]
+        run = current_trace()
+        if run is not None:
+            handlers.append(run.handler())
+        return handlers
+
+    def task_callback(self, output: Any) -> None:
+        """
+        Streams the output of a finished crew task.
+
+        Args:
+            - output: The crewAI task output.
+        """
+        self.emit(
+            "task",
+            {
+                "description": getattr(output, "description", ""),
+                "output": str(getattr(output, "raw_output", None) or output),
+            },
+        )
+
+    def info(self) -> Dict[str, Any]:
+        """
+        Describes the job.
+
+        Returns:
+            - The id, pipeline, state and age of the job.
+        """
+        return {
+            "request_id": self.id,
+            "pipeline": self.name,
+            "state": "running" if self.started else "queued",
+            "seconds": round(time.time() - self.created, 3),
+            "cancelled": self.token.cancelled,
+        }
+
+
+class EventCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler forwarding new LLM tokens to the client of a job.
+    """
+
+    def __init__(self, job: Job):
+        self.job = job
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.job.emit("token", token)
+
+
+class JobRunner:
+    """
+    Bounded pool of worker threads running the jobs.
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS, max_pending: int = MAX_PENDING):
+        """
+        Initializes the runner.
+
+        Args:
+            - max_workers: The number of requests running at the same time.
+            - max_pending: The number of requests running or queued.
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api")
+        self.jobs: Dict[str, Job] = {}
+
+    def submit(self, name: str, run: Callable[[Job], str], request_id: Optional[str]) -> Job:
+        """
+        Queues a job. Only called from the event loop, so no lock is needed.
+
+        Args:
+            - name: The pipeline.
+            - run: Runs the pipeline in a worker thread.
+            - request_id: The id chosen by the client, generated when None.
+
+        Returns:
+            - The job.
+        """
+        if len(self.jobs) >= self.max_pending:
+            raise HTTPException(
+                503, "Too many requests in progress", headers={"Retry-After": "5"}
+            )
+        request_id = request_id or uuid.uuid4().hex
+        if request_id in self.jobs:
+            raise HTTPException(409, f"Request {request_id} is already in progress")
+        loop = asyncio.get_running_loop()
+        job = Job(request_id, name, loop)
+        job.future = loop.run_in_executor(self.executor, self._run, job, run)
+        self.jobs[request_id] = job
+        job.future.add_done_callback(lambda _: self.jobs.pop(request_id, None))
+        return job
+
+    @staticmethod
+    def _run(job: Job, run: Callable[[Job], str]) -> str:
+        """
+        Runs a job in a worker thread, traced and cancellable.
+
+        Args:
+            - job: The job.
+            - run: Runs the pipeline.
+
+        Returns:
+            - The output of the pipeline.
+        """
+        try:
+            # Cancelled while waiting for a worker
+            job.token.raise_if_cancelled()
+            job.started = time.time()
+            with cancellable(job.token), trace(job.name, request_id=job.id) as traced:
+                try:
+                    result = run(job)
+                except Cancelled:
+                    raise
+                except Exception as exc:
+                    # SDKs may wrap the exception raised by the gateway
+                    if job.token.cancelled:
+                        raise Cancelled(job.token.reason) from exc
+                    raise
+            if traced is not None:
+                job.summary = traced.summary()
+            return result
+        finally:
+            job.emit("done", None)
+
+    def cancel(self, request_id: str, reason: str) -> bool:
+        """
+        Cancels a job.
+
+        Args:
+            - request_id: The id of the request.
+            - reason: Why the job is cancelled.
+
+        Returns:
+            - Whether the job was found.
+        """
+        job = self.jobs.get(request_id)
+        if job is None:
+            return False
+        job.token.cancel(reason)
+        return True
+
+    def shutdown(self) -> None:
+        """
+        Cancels every job and stops the workers.
+        """
+        for job in list(self.jobs.values()):
+            job.token.cancel("server shutting down")
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+runner = JobRunner()
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """
+    Preloads the apps of ``API_PRELOAD`` on startup and cancels every job on shutdown.
+    """
+    loop = asyncio.get_running_loop()
+    for name in PRELOAD:
+        # Move the import time of the apps out of their first request
+        await loop.run_in_executor(runner.executor, pipelines.load_app, name)
+    yield
+    runner.shutdown()
+
+
+app = FastAPI(title="LLM Projects Hub API", lifespan=lifespan)
+
+
+def error_status(exc: BaseException) -> int:
+    """
+    Maps the exception of a failed job to an HTTP status.
+
+    Args:
+        - exc: The exception.
+
+    Returns:
+        - The HTTP status.
+    """
+    if isinstance(exc, Cancelled):
+        return 409
+    if isinstance(exc, ImportError):
+        # The dependencies of the app are not installed
+        return 503
+    return 500
+
+
+async def wait_for_result(job: Job, request: Request) -> str:
+    """
+    Waits for a job, cancelling it when the client goes away or the request times out.
+
+    Args:
+        - job: The job.
+        - request: The HTTP request.
+
+    Returns:
+        - The output of the job.
+    """
+
+    async def disconnected() -> None:
+        while not await request.is_disconnected():
+            await asyncio.sleep(0.5)
+
+    watcher = asyncio.ensure_future(disconnected())
+    try:
+        done, _ = await asyncio.wait(
+            {job.future, watcher}, timeout=REQUEST_TIMEOUT, return_when=asyncio.FIRST_COMPLETED
+        )
+    finally:
+        watcher.cancel()
+    if job.future not in done:
+        if watcher in done:
+            job.token.cancel("client disconnected")
+            # Nobody is listening any more
+            raise HTTPException(499, "Client disconnected")
+        job.token.cancel("timed out")
+        raise HTTPException(504, f"Request timed out after {REQUEST_TIMEOUT:g} seconds")
+    try:
+        return job.future.result()
+    except Exception as exc:
+        if error_status(exc) == 500:
+            logger.exception("Request %s failed", job.id)
+        raise HTTPException(error_status(exc), f"{type(exc).__name__}: {exc}")
+
+
+def sse(event: str, data: Any) -> str:
+    """
+    Formats a server-sent event.
+
+    Args:
+        - event: The event name.
+        - data: The payload, sent as JSON.
+
+    Returns:
+        - The event in wire format.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def event_stream(job: Job) -> AsyncIterator[str]:
+    """
+    Streams the events of a job, cancelling it if the client goes away.
+
+    Args:
+        - job: The job.
+
+    Returns:
+        - The server-sent events.
+    """
+    deadline = time.monotonic() + REQUEST_TIMEOUT
+    try:
+        yield sse("start", {"request_id": job.id})
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                job.token.cancel("timed out")
+                yield sse("error", {"status": 504, "error": "Request timed out"})
+                return
+            try:
+                kind, data = await asyncio.wait_for(
+                    job.events.get(), timeout=min(KEEP_ALIVE, remaining)
+                )
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            if kind != "done":
+                yield sse(kind, data)
+                continue
+            try:
+                result = await job.future
+            except Exception as exc:
+                error = f"{type(exc).__name__}: {exc}"
+                yield sse("error", {"status": error_status(exc), "error": error})
+            else:
+                yield sse("result", {"result": result, "trace": job.summary})
+            return
+    finally:
+        # Also reached when the client disconnects and the response is cancelled
+        if not job.future.done():
+            job.token.cancel("client disconnected")
+
+
+async def respond(
+    request: Request, name: str, run: Callable[[Job], str], stream: bool
+) -> Response:
+    """
+    Runs a pipeline for a request.
+
+    Args:
+        - request: The HTTP request.
+        - name: The pipeline.
+        - run: Runs the pipeline in a worker thread.
+        - stream: Whether to answer with server-sent events.
+
+    Returns:
+        - The JSON or event stream response.
+    """
+    job = runner.submit(name, run, request.headers.get("x-request-id"))
+    headers = {"X-Request-ID": job.id}
+    if stream:
+        return StreamingResponse(
+            event_stream(job),
+            media_type="text/event-stream",
+            headers={**headers, "Cache-Control": "no-cache"},
+        )
+    result = await wait_for_result(job, request)
+    return JSONResponse(
+        {
+            "request_id": job.id,
+            "result": result,
+            "seconds": round(time.time() - job.created, 3),
+            "trace": job.summary,
+        },
+        headers=headers,
+    )
+
+
+async def read_upload(file: UploadFile) -> bytes:
+    """
+    Reads an uploaded file, refusing files above ``API_MAX_UPLOAD_MB``.
+
+    Args:
+        - file: The uploaded file.
+
+    Returns:
+        - The file content.
+    """
+    data = await file.read(int(MAX_UPLOAD_MB * 1024**2) + 1)
+    if len(data) > MAX_UPLOAD_MB * 1024**2:
+        raise HTTPException(413, f"Files are limited to {MAX_UPLOAD_MB:g} MB")
+    return data
+
+
+class ContentRequest(BaseModel):
+    """
+    Inputs of the content generator crew.
+    """
+
+    topic: str
+    # First stage to regenerate, cached stages are reused by default
+    start_stage: Optional[Literal["plan", "write", "edit"]] = None
+
+
+class SupportRequest(BaseModel):
+    """
+    Inputs of the customer support crew.
+    """
+
+    customer: str
+    person: str
+    inquiry: str
+    memory: bool = True
+
+
+class OutreachRequest(BaseModel):
+    """
+    Inputs of the customer outreach crews.
+    """
+
+    lead_name: str
+    industry: str
+    key_decision_maker: str
+    position: str
+    milestone: str
+    memory: bool = True
+
+
+@app.post("/ask-csv")
+async def ask_csv(
+    request: Request,
+    file: UploadFile = File(...),
+    question: str = Form(...),
+    stream: bool = False,
+) -> Response:
+    """
+    Answers a question about a CSV file.
+    """
+    data = await read_upload(file)
+    return await respond(
+        request,
+        "ask_csv",
+        lambda job: pipelines.ask_csv(data, file.filename, question, job.callbacks()),
+        stream,
+    )
+
+
+@app.post("/ask-doc")
+async def ask_doc(
+    request: Request,
+    file: UploadFile = File(...),
+    question: str = Form(...),
+    stream: bool = False,
+) -> Response:
+    """
+    Answers a question about a text document.
+    """
+    data = await read_upload(file)
+    return await respond(
+        request,
+        "ask_doc",
+        lambda job: pipelines.ask_doc(data, file.filename, question, job.callbacks()),
+        stream,
+    )
+
+
+@app.post("/pdf/summary")
+async def pdf_summary(
+    request: Request, file: UploadFile = File(...), stream: bool = False
+) -> Response:
+    """
+    Summarizes a PDF file.
+    """
+    data = await read_upload(file)
+    return await respond(
+        request,
+        "pdf_summary",
+        lambda job: pipelines.summarize_pdf(data, file.filename, job.callbacks()),
+        stream,
+    )
+
+
+@app.post("/pdf/chat")
+async def pdf_chat(
+    request: Request,
+    file: UploadFile = File(...),
+    question: str = Form(...),
+    stream: bool = False,
+) -> Response:
+    """
+    Answers a question about a PDF file.
+    """
+    data = await read_upload(file)
+    return await respond(
+        request,
+        "pdf_chat",
+        lambda job: pipelines.chat_with_pdf(data, file.filename, question, job.callbacks()),
+        stream,
+    )
+
+
+@app.post("/crews/content")
+async def content(request: Request, body: ContentRequest, stream: bool = False) -> Response:
+    """
+    Generates an article on a topic.
+    """
+    return await respond(
+        request,
+        "content_generator",
+        lambda job: pipelines.generate_content(body.topic, body.start_stage, job.task_callback),
+        stream,
+    )
+
+
+@app.post("/crews/support")
+async def support(request: Request, body: SupportRequest, stream: bool = False) -> Response:
+    """
+    Answers a customer inquiry.
+    """
+    inputs = body.model_dump(exclude={"memory"})
+    return await respond(
+        request,
+        "customer_support",
+        lambda job: pipelines.answer_support(inputs, body.memory, job.task_callback),
+        stream,
+    )
+
+
+@app.post("/crews/outreach")
+async def outreach(request: Request, body: OutreachRequest, stream: bool = False) -> Response:
+    """
+    Writes the outreach campaign of a lead.
+    """
+    inputs = body.model_dump(exclude={"memory"})
+    return await respond(
+        request,
+        "customer_outreach",
+        lambda job: pipelines.run_outreach(inputs, body.memory, job.task_callback),
+        stream,
+    )
+
+
+@app.get("/requests")
+async def list_requests() -> List[Dict[str, Any]]:
+    """
+    Lists the requests running or waiting for a worker.
+    """
+    return [job.info() for job in runner.jobs.values()]
+
+
+@app.delete("/requests/{request_id}", status_code=204)
+async def cancel_request(request_id: str) -> Response:
+    """
+    Cancels a request.
+    """
+    if not runner.cancel(request_id, "cancelled by the client"):
+        raise HTTPException(404, f"No request {request_id} in progress")
+    return Response(status_code=204)
+
+
+@app.get("/health")
+async def health() -> Dict[str, Any]:
+    """
+    Reports the load of the server.
+    """
+    running = sum(1 for job in runner.jobs.values() if job.started)
+    return {
+        "status": "ok",
+        "workers": runner.max_workers,
+        "running": running,
+        "queued": len(runner.jobs) - running,
+        "max_pending": runner.max_pending,
+        "loaded_apps": pipelines.loaded_apps(),
+    }
+
+
+def main():
+    """
+    Parses the command line and serves the API.
+    """
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="LLM Projects Hub API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,731 @@
+"""
+End-to-end benchmark of the six apps, fully offline and reproducible.
+
+Every scenario drives the entry point of one app the way its UI does (asking a
+CSV, asking a document, summarizing and chatting with a PDF, running the
+crews) on synthetic inputs of a given size. Nothing leaves the machine:
+
+- LLM requests, OpenAI and Hugging Face alike, are answered by the mock
+  provider of the LLM gateway after a seeded, simulated latency
+  (``--llm-latency``);
+- embeddings use the deterministic local embedder (``LLM_HUB_FAKE_EMBEDDINGS``);
+- web tools replay the results recorded in ``fixtures/tools.json``
+  (``TOOL_CACHE_MODE=replay``).
+
+Each app and size runs in its own process with fresh caches, so the apps (all
+named ``app.py``) do not clash and the peak RSS belongs to the scenario. The
+inputs differ between iterations so caches do not hide the work, unless
+``--repeat-inputs`` is given to measure the warm path. Every iteration is
+traced; the report lists the throughput, the p50/p95 latency, the peak RSS and
+the calls per iteration by span kind (LLM, HTTP, embedding, retrieval, tool).
+
+``--save-baseline`` stores the results, ``--baseline`` compares a run with
+stored results and exits with status 1 when a scenario got slower, bigger or
+chattier than the tolerance allows.
+
+Usage:
+    python benchmarks/bench_apps.py --apps ask_doc,pdf_chat --sizes small,large
+    python benchmarks/bench_apps.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_apps.py --baseline benchmarks/baseline.json --tolerance 0.2
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "tools.json"
+
+# Directory of every app, by scenario name
+APPS = {
+    "ask_csv": "1-ask_csv",
+    "ask_doc": "2-ask_doc",
+    "pdf_summary": "3-pdf_summary_chat",
+    "pdf_chat": "3-pdf_summary_chat",
+    "content_generator": "4-multi_agent_system_content_generator",
+    "customer_support": "5-multi_agent_customer_support_automation",
+    "customer_outreach": "6-multi_agent_customer_outreach_campaign",
+}
+
+# Input sizes: CSV rows, document and PDF length, instruction files of the outreach app
+SIZES = {
+    "small": {"rows": 1_000, "paragraphs": 20, "pages": 2, "instructions": 2},
+    "medium": {"rows": 50_000, "paragraphs": 200, "pages": 20, "instructions": 5},
+    "large": {"rows": 500_000, "paragraphs": 2_000, "pages": 100, "instructions": 20},
+}
+
+# Metrics compared with the baseline, higher is worse for all of them
+COMPARED = ("p50", "p95", "peak_rss_mb")
+
+WORDS = (
+    "model data agent customer revenue pipeline latency answer document report "
+    "market growth team product support query index vector summary research "
+    "campaign lead strategy cost quality review feedback release platform user "
+    "service contract region quarter forecast risk budget analysis insight trend"
+).split()
+
+
+def sentence(rng: random.Random) -> str:
+    """
+    Builds a random sentence from a small vocabulary.
+
+    Args:
+        - rng: The random generator.
+
+    Returns:
+        - The sentence.
+    """
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 14))]
+    return " ".join(words).capitalize() + "."
+
+
+def make_csv(rows: int, seed: int) -> bytes:
+    """
+    Generates a sales table.
+
+    Args:
+        - rows: The number of rows.
+        - seed: The random seed.
+
+    Returns:
+        - The CSV file as bytes.
+    """
+    rng = random.Random(seed)
+    cities = ["Berlin", "Paris", "Rome", "Madrid", "Lisbon", "Vienna"]
+    lines = ["id,city,product,price,quantity"]
+    for row in range(rows):
+        lines.append(
+            f"{row},{rng.choice(cities)},{rng.choice(WORDS)},"
+            f"{rng.uniform(1, 100):.2f},{rng.randint(1, 50)}"
+        )
+    return ("\n".join(lines) + "\n").encode()
+
+
+def make_text(paragraphs: int, seed: int) -> str:
+    """
+    Generates an article.
+
+    Args:
+        - paragraphs: The number of paragraphs.
+        - seed: The random seed.
+
+    Returns:
+        - The text, paragraphs separated by blank lines.
+    """
+    rng = random.Random(seed)
+    return "\n\n".join(
+        " ".join(sentence(rng) for _ in range(6)) for _ in range(paragraphs)
+    )
+
+
+def make_pdf(pages: int, seed: int) -> bytes:
+    """
+    Generates a text PDF, written by hand so no PDF library is needed.
+
+    Args:
+        - pages: The number of pages.
+        - seed: The random seed.
+
+    Returns:
+        - The PDF file as bytes.
+    """
+    rng = random.Random(seed)
+    # Objects 1 to 3 are the catalog, the page tree and the font
+    objects: Dict[int, bytes] = {
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    for _ in range(pages):
+        lines = [sentence(rng) for _ in range(50)]
+        text = " ".join(f"({line}) '" for line in lines)
+        stream = f"BT /F1 10 Tf 50 800 Td 14 TL {text} ET".encode()
+        content_id = len(objects) + 3
+        page_id = content_id + 1
+        objects[content_id] = (
+            b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        )
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode()
+        kids.append(page_id)
+    objects[1] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[2] = (
+        f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] "
+        f"/Count {len(kids)} >>"
+    ).encode()
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number in range(1, len(objects) + 1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + objects[number] + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode()
+    pdf += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref}\n%%EOF\n"
+    ).encode()
+    return bytes(pdf)
+
+
+class Upload(io.BytesIO):
+    """
+    Stands in for the file returned by Streamlit's file uploader.
+    """
+
+    def __init__(self, data: bytes, name: str):
+        """
+        Initializes the upload.
+
+        Args:
+            - data: The file content.
+            - name: The file name.
+        """
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+        self.file_id = hashlib.sha256(data).hexdigest()[:16]
+
+
+def seed_tool_cache(cached: Any, fixture: str, **kwargs: Any) -> None:
+    """
+    Records a fixture as the result of a tool call, for the replay mode to serve.
+
+    Args:
+        - cached: The cached tool.
+        - fixture: The recorded tool output.
+        - kwargs: The arguments of the call the app will make.
+    """
+    from common.tool_cache import ToolCache, normalize_arguments
+
+    arguments = normalize_arguments(cached.tool, kwargs)
+    key = ToolCache.make_key(cached.name, arguments)
+    cached.cache.put(key, cached.name, arguments, fixture, ttl=365 * 24 * 3600)
+
+
+def trace_callbacks() -> List[Any]:
+    """
+    Returns the callbacks recording the chain steps in the current trace, as the
+    apps' token streaming adds them.
+
+    Returns:
+        - The callback handlers.
+    """
+    from common.tracing import current_trace
+
+    run = current_trace()
+    return [run.handler()] if run is not None else []
+
+
+# A scenario prepares its inputs and returns the function running iteration i
+Scenario = Callable[[Any, Dict[str, int], int, Dict[str, str]], Callable[[int], Any]]
+
+
+def ask_csv(
+    app: Any, size: Dict[str, int], count: int, fixtures: Dict[str, str]
+) -> Callable[[int], Any]:
+    """
+    Asks questions about a sales table, with the engine reused across questions like in a session.
+
+    Args:
+        - app: The app module.
+        - size: The input size.
+        - count: The number of iterations.
+        - fixtures: The recorded tool outputs by tool name.
+
+    Returns:
+        - The function running iteration i.
+    """
+    engine = app.create_engine(Upload(make_csv(size["rows"], 0), "sales.csv"), verbose=False)
+    questions = [f"What is the average price of the orders in city {i}?" for i in range(count)]
+    return lambda i: engine.ask(questions[i], trace_callbacks())
+
+
+def ask_doc(
+    app: Any, size: Dict[str, int], count: int, fixtures: Dict[str, str]
+) -> Callable[[int], Any]:
+    """
+    Asks questions about an article, indexed on the first question.
+
+    Args:
+        - app: The app module.
+        - size: The input size.
+        - count: The number of iterations.
+        - fixtures: The recorded tool outputs by tool name.
+
+    Returns:
+        - The function running iteration i.
+    """
+    upload = Upload(make_text(size["paragraphs"], 0).encode(), "article.txt")
+    return lambda i: app.generate_response(
+        upload, f"What does the article say about topic {i}?", trace_callbacks()
+    )
+
+
+def pdf_summary(
+    app: Any, size: Dict[str, int], count: int, fixtures: Dict[str, str]
+) -> Callable[[int], Any]:
+    """
+    Summarizes a new PDF at every iteration.
+
+    Args:
+        - app: The app module.
+        - size: The input size.
+        - count: The number of iterations.
+        - fixtures: The recorded tool outputs by tool name.
+
+    Returns:
+        - The function running iteration i.
+    """
+    llm = app.create_llm()
+    # One PDF per iteration, summaries are cached per chunk
+    uploads = [Upload(make_pdf(size["pages"], i), f"paper-{i}.pdf") for i in range(count)]
+    return lambda i: app.summarize_pdf(uploads[i], llm, trace_callbacks())
+
+
+def pdf_chat(
+    app: Any, size: Dict[str, int], count: int, fixtures: Dict[str, str]
+) -> Callable[[int], Any]:
+    """
+    Asks questions about a PDF, indexed on the first question.
+
+    Args:
+        - app: The app module.
+        - size: The input size.
+        - count: The number of iterations.
+        - fixtures: The recorded tool outputs by tool name.
+
+    Returns:
+        - The function running iteration i.
+    """
+    llm = app.create_llm()
+    upload = Upload(make_pdf(size["pages"], 0), "paper.pdf")
+    return lambda i: app.chat_with_pdf(
+        upload, f"What are the findings on topic {i}?", llm, trace_callbacks()
+    )
+
+
+def content_generator(
+    app: Any, size: Dict[str, int], count: int, fixtures: Dict[str, str]
+) -> Callable[[int], Any]:
+    """
+    Generates an article on a new topic at every iteration.
+
+    Args:
+        - app: The app module.
+        - size: The input size.
+        - count: The number of iterations.
+        - fixtures: The recorded tool outputs by tool name.
+
+    Returns:
+        - The function running iteration i.
+    """
+    return lambda i: app.run_crew(f"Artificial Intelligence, part {i}", 0)
+
+
+def customer_support(
+    app: Any, size: Dict[str, int], count: int, fixtures: Dict[str, str]
+) -> Callable[[int], Any]:
+    """
+    Answers the inquiry of a new customer at every iteration.
+
+    Args:
+        - app: The app module.
+        - size: The input size.
+        - count: The number of iterations.
+        - fixtures: The recorded tool outputs by tool name.
+
+    Returns:
+        - The function running iteration i.
+    """
+    docs_tool = app.initialize_tools()["docs_tool"]
+    if hasattr(docs_tool, "cache"):
+        seed_tool_cache(docs_tool, fixtures[docs_tool.name])
+
+    def run(i: int) -> str:
+        inputs = {
+            "customer": f"Customer {i}",
+            "person": "Ana",
+            "inquiry": f"How do I add memory to my crew? (ticket {i})",
+        }
+        return app.run_crew(inputs, 0, memory=True)
+
+    return run
+
+
+def customer_outreach(
+    app: Any, size: Dict[str, int], count: int, fixtures: Dict[str, str]
+) -> Callable[[int], Any]:
+    """
+    Writes the outreach campaign of a new lead at every iteration.
+
+    Args:
+        - app: The app module.
+        - size: The input size.
+        - count: The number of iterations.
+        - fixtures: The recorded tool outputs by tool name.
+
+    Returns:
+        - The function running iteration i.
+    """
+    instructions = Path(app.INSTRUCTIONS_DIR)
+    instructions.mkdir(exist_ok=True)
+    for i in range(size["instructions"]):
+        (instructions / f"guideline_{i}.md").write_text(make_text(5, i), encoding="utf-8")
+
+    search_tool = app.initialize_tools()["search_tool"]
+    leads = []
+    for i in range(count):
+        inputs = {
+            "lead_name": f"Lead {i}",
+            "industry": "Online Learning Platform",
+            "key_decision_maker": "Andrew Ng",
+            "position": "CEO",
+            "milestone": "product launch",
+        }
+        seed_tool_cache(
+            search_tool,
+            fixtures[search_tool.name],
+            search_query=f"{inputs['lead_name']} {inputs['industry']}",
+        )
+        leads.append(inputs)
+    return lambda i: app.run_crew(leads[i], 0, memory=True)
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "ask_csv": ask_csv,
+    "ask_doc": ask_doc,
+    "pdf_summary": pdf_summary,
+    "pdf_chat": pdf_chat,
+    "content_generator": content_generator,
+    "customer_support": customer_support,
+    "customer_outreach": customer_outreach,
+}
+
+
+def count_calls(run: Any) -> Tuple[Counter, Dict[str, int]]:
+    """
+    Counts the steps of a traced run by kind, plus its cache hits and tokens.
+
+    Args:
+        - run: The trace of the run.
+
+    Returns:
+        - The step counts by kind, and the cache hit and token totals.
+    """
+    steps = [step for step in run.spans if step is not run.root]
+    totals = {
+        "cache_hits": sum(
+            1
+            for step in steps
+            if step.attributes.get("cache") in ("hit", "disk", "revalidated", "coalesced")
+        ),
+        "total_tokens": run.summary()["total_tokens"],
+    }
+    return Counter(step.kind for step in steps), totals
+
+
+class LastRun:
+    """
+    Trace store keeping the last run in memory instead of the shared database.
+    """
+
+    run: Any = None
+
+    def save(self, run: Any) -> None:
+        """
+        Keeps a finished run.
+
+        Args:
+            - run: The trace.
+        """
+        self.run = run
+
+
+def peak_rss_mb() -> float:
+    """
+    Returns the peak resident set size of this process.
+
+    Returns:
+        - The peak RSS in MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Returns a percentile of measurements.
+
+    Args:
+        - values: The measurements.
+        - fraction: The percentile as a fraction, e.g. 0.95.
+
+    Returns:
+        - The measurement at that percentile.
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_scenario(
+    name: str, size_name: str, iterations: int, repeat_inputs: bool
+) -> Dict[str, Any]:
+    """
+    Runs one scenario in this process, set up by ``main`` in a child process.
+
+    Args:
+        - name: The scenario.
+        - size_name: The input size.
+        - iterations: The number of timed iterations.
+        - repeat_inputs: Whether every iteration gets the inputs of the first one.
+
+    Returns:
+        - The measurements.
+    """
+    app_dir = ROOT / APPS[name]
+    sys.path[:0] = [str(app_dir), str(ROOT)]
+    # Streamlit warns on every call made outside `streamlit run`
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    start = time.perf_counter()
+    import app
+
+    from common.tracing import trace
+
+    import_seconds = time.perf_counter() - start
+    fixtures = json.loads(FIXTURES.read_text(encoding="utf-8"))
+    start = time.perf_counter()
+    run = SCENARIOS[name](app, SIZES[size_name], iterations, fixtures)
+    setup_seconds = time.perf_counter() - start
+
+    last = LastRun()
+    latencies = []
+    calls: Counter = Counter()
+    totals: Counter = Counter()
+    for i in range(iterations):
+        start = time.perf_counter()
+        with trace(name, store=last, iteration=i):
+            run(0 if repeat_inputs else i)
+        latencies.append(time.perf_counter() - start)
+        kinds, run_totals = count_calls(last.run)
+        calls.update(kinds)
+        totals.update(run_totals)
+
+    return {
+        "import_seconds": round(import_seconds, 3),
+        "setup_seconds": round(setup_seconds, 3),
+        "first": round(latencies[0], 4),
+        "p50": round(statistics.median(latencies), 4),
+        "p95": round(percentile(latencies, 0.95), 4),
+        "per_second": round(iterations / sum(latencies), 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "calls": {kind: round(count / iterations, 2) for kind, count in sorted(calls.items())},
+        **{key: round(value / iterations, 1) for key, value in sorted(totals.items())},
+    }
+
+
+def child_env(workdir: Path, args: argparse.Namespace) -> Dict[str, str]:
+    """
+    Builds the environment of a scenario process, cut off from every external service.
+
+    Args:
+        - workdir: The scratch directory of the scenario.
+        - args: The command line arguments.
+
+    Returns:
+        - The environment variables.
+    """
+    env = dict(os.environ)
+    # Traces of the benchmark do not belong in the JSONL export of real runs
+    env.pop("LLM_HUB_TRACE_JSONL", None)
+    env.update(
+        {
+            "LLM_HUB_CACHE_DIR": str(workdir / "cache"),
+            # Hugging Face clients write the token to their home on login
+            "HF_HOME": str(workdir / "huggingface"),
+            "LLM_GATEWAY_PROVIDER": "mock",
+            "LLM_GATEWAY_MOCK_LATENCY": str(args.llm_latency),
+            "LLM_GATEWAY_MOCK_SEED": str(args.seed),
+            "LLM_HUB_FAKE_EMBEDDINGS": "1",
+            "LLM_HUB_TRACING": "1",
+            "TOOL_CACHE_MODE": "replay",
+            "OPENAI_API_KEY": "sk-benchmark",
+            "OPENAI_MODEL_NAME": env.get("OPENAI_MODEL_NAME", "gpt-3.5-turbo"),
+            "HUGGINGFACEHUB_API_TOKEN": "hf_benchmark",
+            "SERPER_API_KEY": "benchmark",
+            "PYTHONHASHSEED": str(args.seed),
+        }
+    )
+    return env
+
+
+def report(results: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Prints the results as a table.
+
+    Args:
+        - results: The measurements by scenario.
+    """
+    print(
+        f"{'scenario':<26}{'first s':>9}{'p50 s':>9}{'p95 s':>9}{'runs/s':>9}"
+        f"{'RSS MB':>9}  calls per run"
+    )
+    for key, result in results.items():
+        if "error" in result:
+            print(f"{key:<26}failed: {result['error']}")
+            continue
+        calls = ", ".join(f"{kind} {count:g}" for kind, count in result["calls"].items())
+        print(
+            f"{key:<26}{result['first']:>9.3f}{result['p50']:>9.3f}{result['p95']:>9.3f}"
+            f"{result['per_second']:>9.2f}{result['peak_rss_mb']:>9.1f}  {calls}"
+        )
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float
+) -> List[str]:
+    """
+    Compares results with a baseline.
+
+    Latencies and memory may exceed the baseline by the tolerance; the number of
+    calls of every kind may not grow at all, as the mock is deterministic.
+
+    Args:
+        - results: The measurements by scenario.
+        - baseline: The baseline measurements by scenario.
+        - tolerance: The allowed relative increase, e.g. 0.1 for 10 %.
+
+    Returns:
+        - A description of every regression.
+    """
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None or "error" in before:
+            continue
+        if "error" in result:
+            regressions.append(f"{key}: failed ({result['error']})")
+            continue
+        for metric in COMPARED:
+            if result[metric] > before[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{key}: {metric} {before[metric]:g} -> {result[metric]:g} "
+                    f"(+{100 * (result[metric] / before[metric] - 1):.0f} %)"
+                )
+        for kind, count in result["calls"].items():
+            if count > before["calls"].get(kind, 0):
+                regressions.append(
+                    f"{key}: {kind} calls {before['calls'].get(kind, 0):g} -> {count:g}"
+                )
+    return regressions
+
+
+def main():
+    """
+    Runs every selected scenario in its own process, then reports and compares the results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--apps", default=",".join(SCENARIOS), help="Comma-separated scenarios")
+    parser.add_argument("--sizes", default="small,medium", help="Comma-separated input sizes")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Mean seconds per LLM call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat-inputs", action="store_true", help="Measure the warm path")
+    parser.add_argument("--baseline", type=Path, help="Results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--save-baseline", type=Path, help="Where to store the results")
+    parser.add_argument("--output", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--size", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        # Child process: run one scenario and hand the measurements back
+        result = run_scenario(args.scenario, args.size, args.iterations, args.repeat_inputs)
+        args.output.write_text(json.dumps(result), encoding="utf-8")
+        return
+
+    apps = args.apps.split(",")
+    sizes = args.sizes.split(",")
+    for choice, known in ((apps, SCENARIOS), (sizes, SIZES)):
+        unknown = set(choice) - set(known)
+        if unknown:
+            parser.error(
+                f"unknown choice(s) {', '.join(sorted(unknown))}, pick from {', '.join(known)}"
+            )
+
+    config = {
+        "iterations": args.iterations,
+        "llm_latency": args.llm_latency,
+        "seed": args.seed,
+        "repeat_inputs": args.repeat_inputs,
+    }
+    print(f"{len(apps)} scenario(s) x {len(sizes)} size(s), {json.dumps(config)}\n")
+    results: Dict[str, Dict[str, Any]] = {}
+    for name in apps:
+        for size in sizes:
+            key = f"{name}/{size}"
+            with tempfile.TemporaryDirectory(prefix="bench-apps-") as tmp:
+                workdir = Path(tmp)
+                output = workdir / "result.json"
+                command = [
+                    sys.executable, str(Path(__file__).resolve()),
+                    "--scenario", name, "--size", size, "--output", str(output),
+                    "--iterations", str(args.iterations),
+                ]
+                if args.repeat_inputs:
+                    command.append("--repeat-inputs")
+                # The apps resolve relative paths (e.g. the instructions directory) from the cwd
+                completed = subprocess.run(
+                    command, cwd=workdir, env=child_env(workdir, args),
+                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                )
+                if completed.returncode == 0:
+                    results[key] = json.loads(output.read_text(encoding="utf-8"))
+                else:
+                    lines = completed.stderr.strip().splitlines() or ["no output"]
+                    results[key] = {"error": lines[-1]}
+            print(f"done {key}", file=sys.stderr)
+
+    report(results)
+
+    if args.save_baseline:
+        args.save_baseline.write_text(
+            json.dumps({"config": config, "results": results}, indent=2) + "\n",
+            encoding="utf-8",
+        )
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline["config"] != config:
+            print(f"\nWarning: the baseline was measured with {json.dumps(baseline['config'])}")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regression against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
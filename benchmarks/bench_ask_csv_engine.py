@@ -0,0 +1,121 @@
+"""
+Micro-benchmark of the per-question overhead of the Ask the Data app.
+
+Compares the old per-question path (parse the CSV, create the chat model and
+the pandas agent for every question) with the reused session engine. The chat
+model is replaced by an instant fake so model latency is excluded.
+
+Usage:
+    python benchmarks/bench_ask_csv_engine.py --rows 200000 --questions 20
+"""
+
+import argparse
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+from langchain.agents.agent_types import AgentType
+from langchain.chat_models import ChatOpenAI
+from langchain_community.chat_models.fake import FakeListChatModel
+from langchain_experimental.agents import create_pandas_dataframe_agent
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "1-ask_csv")]
+
+from engine import AskCsvEngine  # noqa: E402
+
+QUESTION = "Which city has the highest average price?"
+
+
+def make_csv(rows: int) -> bytes:
+    """
+    Generates a synthetic CSV file.
+
+    Args:
+        - rows: The number of rows.
+
+    Returns:
+        - The CSV file as bytes.
+    """
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "id": np.arange(rows),
+            "city": rng.choice(["Berlin", "Paris", "Rome", "Madrid"], rows),
+            "price": rng.uniform(1, 100, rows).round(2),
+            "quantity": rng.integers(1, 50, rows),
+        }
+    )
+    return df.to_csv(index=False).encode()
+
+
+def fake_llm() -> FakeListChatModel:
+    """
+    Returns a chat model that answers instantly with a final answer.
+
+    Returns:
+        - The fake chat model.
+    """
+    return FakeListChatModel(responses=["Paris"])
+
+
+def measure(run: Callable[[], object], repeat: int) -> List[float]:
+    """
+    Times repeated calls of a function.
+
+    Args:
+        - run: The function to time.
+        - repeat: The number of calls.
+
+    Returns:
+        - The duration of every call in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main():
+    """
+    Runs the benchmark and prints the per-question overhead of both paths.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--questions", type=int, default=20)
+    args = parser.parse_args()
+
+    data = make_csv(args.rows)
+
+    def before():
+        # Everything the app used to do for every question
+        # The real client is built as before, the agent talks to the fake one
+        ChatOpenAI(model_name="gpt-3.5-turbo-0613", openai_api_key="sk-bench")
+        df = pd.read_csv(io.BytesIO(data))
+        agent = create_pandas_dataframe_agent(
+            fake_llm(), df, verbose=False, agent_type=AgentType.OPENAI_FUNCTIONS
+        )
+        return agent.run(QUESTION)
+
+    engine = AskCsvEngine(pd.read_csv(io.BytesIO(data)), fake_llm(), verbose=False)
+
+    def after():
+        return engine.ask(QUESTION)
+
+    for name, run in (("before", before), ("after", after)):
+        durations = measure(run, args.questions)
+        print(
+            f"{name:>6}: median {statistics.median(durations) * 1000:8.2f} ms/question, "
+            f"max {max(durations) * 1000:8.2f} ms ({args.rows} rows, {args.questions} questions)"
+        )
+
+
+if __name__ == "__main__":
+    main()
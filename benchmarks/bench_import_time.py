@@ -0,0 +1,229 @@
+"""
+Import-time profile of the six apps: what a cold start and a rerun cost.
+
+Every app runs in its own ``python -X importtime`` process, the way Streamlit
+runs the script, but without a server: widgets return their default values, so
+no file is uploaded and no button is pressed. That is the first paint of the
+page, when the heavy libraries (LangChain, Chroma, crewAI, the OpenAI client,
+pandas) should not be imported yet. The script then runs again to measure the
+cost of a rerun, which Streamlit pays on every widget interaction.
+
+For every app, the report gives the time of the first run (imports included),
+the median time of a rerun, the number of imported modules, the heavy packages
+imported at first paint and the packages taking the most import time, summed
+over their modules. ``--check`` exits with status 1 when an app imports a heavy
+package at first paint.
+
+Usage:
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --apps ask_csv,ask_doc --top 5
+    python benchmarks/bench_import_time.py --json import_time.json --check
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import runpy
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Directory of every app
+APPS = {
+    "ask_csv": "1-ask_csv",
+    "ask_doc": "2-ask_doc",
+    "pdf": "3-pdf_summary_chat",
+    "content_generator": "4-multi_agent_system_content_generator",
+    "customer_support": "5-multi_agent_customer_support_automation",
+    "customer_outreach": "6-multi_agent_customer_outreach_campaign",
+}
+
+# Packages that should only be imported once the user uploads a file or presses a button
+HEAVY = (
+    "chromadb",
+    "crewai",
+    "crewai_tools",
+    "huggingface_hub",
+    "langchain",
+    "langchain_community",
+    "langchain_core",
+    "langchain_experimental",
+    "numpy",
+    "openai",
+    "pandas",
+)
+
+# A line of the `-X importtime` report: self and cumulative microseconds, indented module name
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def run_app(name: str, reruns: int) -> Dict[str, Any]:
+    """
+    Runs the script of an app the way Streamlit does, once cold and then again.
+
+    Args:
+        - name: The app, a key of ``APPS``.
+        - reruns: The number of reruns after the first run.
+
+    Returns:
+        - The time of the first run, the median rerun time and the imported modules.
+    """
+    directory = ROOT / APPS[name]
+    # `streamlit run` puts the folder of the script first on sys.path
+    sys.path.insert(0, str(directory))
+    # Outside `streamlit run`, every page element logs a warning
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    start = time.perf_counter()
+    runpy.run_path(str(directory / "app.py"), run_name="__main__")
+    first = time.perf_counter() - start
+
+    rerun_times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        runpy.run_path(str(directory / "app.py"), run_name="__main__")
+        rerun_times.append(time.perf_counter() - start)
+
+    return {
+        "first_run": first,
+        "rerun": statistics.median(rerun_times) if rerun_times else None,
+        "modules": sorted(sys.modules),
+    }
+
+
+def parse_import_times(stderr: str) -> Dict[str, float]:
+    """
+    Sums the self import time of the modules of every top-level package.
+
+    Args:
+        - stderr: The error output of a ``python -X importtime`` process.
+
+    Returns:
+        - The import seconds by top-level package, slowest first.
+    """
+    by_package: Counter = Counter()
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, _, _, module = match.groups()
+            by_package[module.split(".")[0]] += int(self_us) / 1e6
+    return dict(by_package.most_common())
+
+
+def profile_app(name: str, reruns: int) -> Dict[str, Any]:
+    """
+    Profiles an app in a fresh ``python -X importtime`` process.
+
+    Args:
+        - name: The app, a key of ``APPS``.
+        - reruns: The number of reruns after the first run.
+
+    Returns:
+        - The measurements of the app, or its error.
+    """
+    with tempfile.TemporaryDirectory(prefix="bench-import-") as tmp:
+        workdir = Path(tmp)
+        output = workdir / "result.json"
+        env = dict(os.environ, LLM_HUB_CACHE_DIR=str(workdir / "cache"))
+        command = [
+            sys.executable, "-X", "importtime", str(Path(__file__).resolve()),
+            "--app", name, "--reruns", str(reruns), "--output", str(output),
+        ]
+        # The apps resolve relative paths (e.g. the instructions directory) from the cwd
+        completed = subprocess.run(
+            command, cwd=ROOT / APPS[name], env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        if completed.returncode != 0:
+            errors = [
+                line for line in completed.stderr.splitlines()
+                if line.strip() and not IMPORT_LINE.match(line)
+            ]
+            return {"error": errors[-1] if errors else f"exit status {completed.returncode}"}
+        result = json.loads(output.read_text(encoding="utf-8"))
+
+    modules = result.pop("modules")
+    packages = {module.split(".")[0] for module in modules}
+    result.update(
+        modules=len(modules),
+        import_seconds=parse_import_times(completed.stderr),
+        heavy=[package for package in HEAVY if package in packages],
+    )
+    return result
+
+
+def report(results: Dict[str, Dict[str, Any]], top: int) -> None:
+    """
+    Prints the results as a table.
+
+    Args:
+        - results: The measurements by app.
+        - top: The number of slowest packages listed per app.
+    """
+    print(f"{'app':<20}{'first s':>9}{'rerun ms':>10}{'modules':>9}  heavy at first paint")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<20}failed: {result['error']}")
+            continue
+        rerun = f"{result['rerun'] * 1000:.1f}" if result["rerun"] is not None else "n/a"
+        print(
+            f"{name:<20}{result['first_run']:>9.3f}{rerun:>10}{result['modules']:>9}  "
+            f"{', '.join(result['heavy']) or 'none'}"
+        )
+    print("\nSlowest packages to import (seconds, summed over their modules):")
+    for name, result in results.items():
+        if "error" not in result:
+            slowest = list(result["import_seconds"].items())[:top]
+            print(f"{name:<20}" + ", ".join(f"{package} {sec:.3f}" for package, sec in slowest))
+
+
+def main():
+    """
+    Profiles every selected app in its own process, then reports the results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--apps", default=",".join(APPS), help="Comma-separated apps")
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="Slowest packages listed per app")
+    parser.add_argument("--json", type=Path, help="Where to store the results")
+    parser.add_argument("--check", action="store_true", help="Fail on heavy first-paint imports")
+    parser.add_argument("--output", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--app", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.app:
+        # Child process: run one app and hand the measurements back
+        result = run_app(args.app, args.reruns)
+        args.output.write_text(json.dumps(result), encoding="utf-8")
+        return
+
+    apps = args.apps.split(",")
+    unknown = set(apps) - set(APPS)
+    if unknown:
+        parser.error(f"unknown app(s) {', '.join(sorted(unknown))}, pick from {', '.join(APPS)}")
+
+    results: Dict[str, Dict[str, Any]] = {name: profile_app(name, args.reruns) for name in apps}
+    report(results, args.top)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\nResults saved to {args.json}")
+
+    failed: List[str] = [name for name, result in results.items() if "error" in result]
+    eager = [name for name, result in results.items() if result.get("heavy")]
+    if args.check and eager:
+        print(f"\nHeavy imports at first paint: {', '.join(eager)}")
+    if failed or (args.check and eager):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Checks that the parsed PDF cache stays under its size limit.
+
+A long-lived process, like a Streamlit server, ingests a series of synthetic
+PDFs through the cache of the PDF app. A second process then ingests more PDFs
+into the same cache directory. After every ingestion, the size of the cached
+entries on disk is measured. The check fails, with exit status 1, when either
+process ever exceeds the limit (``PDF_CACHE_MAX_MB`` of the app).
+
+Usage:
+    python benchmarks/bench_index_cache.py
+    python benchmarks/bench_index_cache.py --pdfs 50 --pages 40 --max-mb 0.5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "3-pdf_summary_chat")]
+
+from bench_apps import make_pdf  # noqa: E402
+from common.index_cache import IndexCache  # noqa: E402
+from ingest import ingest_pdf  # noqa: E402
+
+
+def disk_usage(root: Path) -> int:
+    """
+    Returns the size in bytes of the cached entries, the manifest excluded.
+
+    Args:
+        - root: The cache directory.
+
+    Returns:
+        - The size of the entries.
+    """
+    return sum(f.stat().st_size for f in root.glob("*/**/*") if f.is_file())
+
+
+def ingest_series(root: Path, first_seed: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Ingests PDFs one after the other through one long-lived cache.
+
+    Args:
+        - root: The cache directory.
+        - first_seed: The seed of the first PDF, so processes ingest different PDFs.
+        - args: The command line arguments.
+
+    Returns:
+        - The largest size on disk, the largest entry and the number of entries left.
+    """
+    cache = IndexCache(root, max_bytes=int(args.max_mb * 1024**2))
+    peak = largest = 0
+    for seed in range(first_seed, first_seed + args.pdfs):
+        # The handle stays referenced until the next PDF, like a request in flight
+        pdf = ingest_pdf(make_pdf(args.pages, seed), cache, f"{seed}.pdf")
+        largest = max(largest, sum(f.stat().st_size for f in pdf.path.rglob("*") if f.is_file()))
+        peak = max(peak, disk_usage(root))
+    entries = sum(1 for path in root.iterdir() if path.is_dir())
+    return {"peak_bytes": peak, "largest_entry": largest, "entries": entries}
+
+
+def main():
+    """
+    Runs the long-lived process and the second process, then reports their peak usage.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pdfs", type=int, default=30, help="PDFs ingested per process")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--max-mb", type=float, default=0.25, help="Size limit of the cache")
+    parser.add_argument("--root", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--first-seed", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.root:
+        # Second process: ingest into the cache left by the first one
+        print(json.dumps(ingest_series(args.root, args.first_seed, args)))
+        return
+
+    limit = int(args.max_mb * 1024**2)
+    with tempfile.TemporaryDirectory(prefix="bench-index-cache-") as tmp:
+        root = Path(tmp)
+        results = {"long-lived process": ingest_series(root, 0, args)}
+        completed = subprocess.run(
+            [
+                sys.executable, str(Path(__file__).resolve()), "--root", str(root),
+                "--first-seed", str(args.pdfs), "--pdfs", str(args.pdfs),
+                "--pages", str(args.pages), "--max-mb", str(args.max_mb),
+            ],
+            stdout=subprocess.PIPE, text=True, check=True,
+        )
+        results["second process"] = json.loads(completed.stdout.splitlines()[-1])
+
+    print(f"limit {limit / 1024:.0f} KB, {args.pdfs} PDFs of {args.pages} pages per process")
+    over = []
+    for name, result in results.items():
+        print(
+            f"{name:<20}peak {result['peak_bytes'] / 1024:>8.0f} KB, "
+            f"largest entry {result['largest_entry'] / 1024:.0f} KB, "
+            f"{result['entries']} entries left"
+        )
+        if result["peak_bytes"] > limit:
+            over.append(name)
+    if over:
+        print(f"\nOver the limit: {', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Recall-vs-latency benchmark of the retrieval backends on a synthetic corpus.
+
+The corpus is made of noisy points around random topic centres, roughly like
+chunk embeddings of a long manual. Queries are perturbed corpus points and the
+exact index provides the ground truth for recall@k.
+
+Usage:
+    python benchmarks/bench_retrieval.py --chunks 100000 --dim 384 --queries 200
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from common.retrieval import ExactIndex, HnswIndex, IvfIndex, _has_hnswlib  # noqa: E402
+
+
+def make_corpus(
+    chunks: int, dim: int, queries: int, seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Generates a clustered synthetic corpus and queries.
+
+    Args:
+        - chunks: The number of corpus vectors.
+        - dim: The vector dimension.
+        - queries: The number of queries.
+        - seed: The random seed.
+
+    Returns:
+        - The corpus vectors and the query vectors.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(1, chunks // 100), dim)).astype(np.float32)
+    corpus = centres[rng.integers(len(centres), size=chunks)]
+    corpus += 0.6 * rng.standard_normal((chunks, dim)).astype(np.float32)
+    picks = corpus[rng.integers(chunks, size=queries)]
+    query_vectors = picks + 0.3 * rng.standard_normal((queries, dim)).astype(np.float32)
+    return corpus, query_vectors
+
+
+def evaluate(
+    index, queries: np.ndarray, truth: List[set], k: int
+) -> Tuple[float, float, float]:
+    """
+    Measures recall@k and query latency of an index.
+
+    Args:
+        - index: The index to evaluate.
+        - queries: The query vectors.
+        - truth: The exact top-k ids of every query.
+        - k: The number of neighbours.
+
+    Returns:
+        - The mean recall, median latency and p95 latency in milliseconds.
+    """
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        ids, _ = index.search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(expected.intersection(ids.tolist())) / k)
+    latencies.sort()
+    return (
+        statistics.mean(recalls),
+        statistics.median(latencies),
+        latencies[int(0.95 * (len(latencies) - 1))],
+    )
+
+
+def report(name: str, build_seconds: float, rows: Iterable[Tuple[str, float, float, float]]):
+    """
+    Prints the results of one backend.
+    """
+    print(f"{name} (build {build_seconds:.2f}s)")
+    for knob, recall, p50, p95 in rows:
+        print(f"  {knob:<12} recall@k {recall:6.3f}   p50 {p50:8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def main():
+    """
+    Runs the benchmark for every backend and a sweep of its recall knob.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    corpus, queries = make_corpus(args.chunks, args.dim, args.queries)
+    print(f"{args.chunks} chunks, dim {args.dim}, {args.queries} queries, k={args.k}\n")
+
+    start = time.perf_counter()
+    exact = ExactIndex(corpus)
+    build_seconds = time.perf_counter() - start
+    truth = [set(exact.search(query, args.k)[0].tolist()) for query in queries]
+    report("exact", build_seconds, [("-", *evaluate(exact, queries, truth, args.k))])
+
+    start = time.perf_counter()
+    ivf = IvfIndex(corpus)
+    build_seconds = time.perf_counter() - start
+    rows = []
+    for nprobe in (1, 2, 4, 8, 16, 32):
+        ivf.nprobe = nprobe
+        rows.append((f"nprobe={nprobe}", *evaluate(ivf, queries, truth, args.k)))
+    report(f"ivf (nlist={len(ivf.lists)})", build_seconds, rows)
+
+    if not _has_hnswlib():
+        print("hnsw: skipped, hnswlib is not installed")
+        return
+    start = time.perf_counter()
+    hnsw = HnswIndex(corpus)
+    build_seconds = time.perf_counter() - start
+    rows = []
+    for ef in (8, 16, 32, 64, 128, 256):
+        hnsw.ef = ef
+        rows.append((f"ef={ef}", *evaluate(hnsw, queries, truth, args.k)))
+    report("hnsw", build_seconds, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Throughput and agreement of the sentiment backends of the outreach campaign app.
+
+Throughput is measured on a fixed corpus of outreach sentences, repeated to the
+requested size, with the local lexicon backend (cold and warm cache). Those
+sentences were written with the lexicon at hand, so they are not used to judge
+the labels. Agreement is measured on a held-out labelled set given with
+``--labelled``: a CSV (or ``.tsv``) file with a text and a label column, e.g. an
+export of a public sentiment dataset. Labels are positive, neutral or negative
+(or pos, neu, neg); ``--label-map`` translates other values, e.g. the 0/1 labels
+of a binary dataset. Agreement is the share of texts whose label matches the
+reference label. With ``--openai`` and ``OPENAI_API_KEY`` set, the OpenAI
+backend scores the held-out set too, and the share of texts on which both
+backends agree is reported.
+
+Usage:
+    python benchmarks/bench_sentiment.py --repeat 200
+    python benchmarks/bench_sentiment.py --labelled sst2.tsv --text-column sentence \\
+        --label-map 0=negative,1=positive
+    python benchmarks/bench_sentiment.py --labelled held_out.csv --openai --batch-size 20
+"""
+
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "6-multi_agent_customer_outreach_campaign"))
+
+from sentiment import (  # noqa: E402
+    CachedSentiment,
+    LexiconSentiment,
+    OpenAISentiment,
+    SentimentScore,
+)
+
+# Outreach sentences used for throughput only. They were written alongside the
+# lexicon (their cue words are in it), so agreement on them says nothing about quality
+CORPUS: List[str] = [
+    "Congratulations on the fantastic product launch, the whole team must be thrilled!",
+    "We would love to help your team grow faster with a seamless onboarding experience.",
+    "Your recent milestone is truly impressive and we are excited to support what comes next.",
+    "Thank you for the great conversation last week, I really enjoyed it.",
+    "Our customers say the platform is reliable, easy to use and very effective.",
+    "I am confident our partnership would bring real value to your learners.",
+    "It was a pleasure meeting you, and I appreciate your time.",
+    "We are delighted to share an opportunity that fits your growth plans perfectly.",
+    "Your team's innovative approach to online learning is inspiring.",
+    "I would be glad to set up a short call at your convenience.",
+    "Happy to send over a few success stories from similar companies.",
+    "We are proud to work with leaders in your industry and would welcome the chance to talk.",
+    "I hope this message finds you well.",
+    "I am writing to introduce our company and its services.",
+    "Please find the attached document with the pricing details.",
+    "Could we schedule a call on Tuesday or Wednesday afternoon?",
+    "Our platform integrates with the tools your team already uses.",
+    "The proposal covers the first quarter of next year.",
+    "Let me know which time works for you.",
+    "I have copied my colleague who handles enterprise accounts.",
+    "Here is the agenda for the meeting.",
+    "The report includes data from the last three months.",
+    "Unfortunately, the integration failed and the rollout is delayed.",
+    "Many teams struggle with slow, expensive and confusing training tools.",
+    "I am sorry to hear about the problems with your previous vendor.",
+    "Losing learners to a frustrating checkout experience is a costly problem.",
+    "We noticed several issues that could put your launch at risk.",
+    "Your team was disappointed by the poor support from the old provider.",
+    "Missed deadlines and broken workflows are a waste of your budget.",
+    "This is not a good fit and the results were terrible.",
+    "I am worried the current process is too complicated for new hires.",
+    "Without the right tools, scaling becomes difficult and risky.",
+]
+
+# Labels of a held-out set, also accepted in their usual short forms
+LABEL_ALIASES = {
+    "positive": "positive", "pos": "positive",
+    "neutral": "neutral", "neu": "neutral",
+    "negative": "negative", "neg": "negative",
+}
+
+
+def load_labelled(
+    path: Path, text_column: str, label_column: str, label_map: Dict[str, str]
+) -> List[Tuple[str, str]]:
+    """
+    Reads a held-out labelled set.
+
+    Args:
+        - path: The CSV file, tab-separated when its suffix is ``.tsv``.
+        - text_column: The name of the text column.
+        - label_column: The name of the label column.
+        - label_map: Translates raw labels before they are matched to ``LABEL_ALIASES``.
+
+    Returns:
+        - The (text, label) pairs.
+    """
+    delimiter = "\t" if path.suffix.lower() == ".tsv" else ","
+    pairs = []
+    with open(path, newline="", encoding="utf-8") as file:
+        for row in csv.DictReader(file, delimiter=delimiter):
+            raw = row[label_column].strip()
+            label = LABEL_ALIASES.get(label_map.get(raw, raw).lower())
+            if label is None:
+                raise ValueError(f"Unknown label {raw!r}, translate it with --label-map")
+            pairs.append((row[text_column], label))
+    return pairs
+
+
+def agreement(a: List[str], b: List[str]) -> float:
+    """
+    Returns the share of positions where two label lists agree.
+
+    Args:
+        - a: The first labels.
+        - b: The second labels.
+
+    Returns:
+        - The agreement ratio.
+    """
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def timed(backend, texts: List[str], batch_size: int) -> Tuple[List[SentimentScore], float]:
+    """
+    Scores texts in batches and measures the elapsed time.
+
+    Args:
+        - backend: The sentiment backend.
+        - texts: The texts to score.
+        - batch_size: The number of texts per call.
+
+    Returns:
+        - The scores and the elapsed seconds.
+    """
+    start = time.perf_counter()
+    scores: List[SentimentScore] = []
+    for offset in range(0, len(texts), batch_size):
+        scores.extend(backend.score_batch(texts[offset : offset + batch_size]))
+    return scores, time.perf_counter() - start
+
+
+def main():
+    """
+    Runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=100, help="Corpus repetitions")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--labelled", type=Path, help="Held-out labelled CSV or TSV file")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--label-column", default="label")
+    parser.add_argument("--label-map", default="", help="Raw label translations, e.g. 0=negative")
+    parser.add_argument("--openai", action="store_true", help="Also score with OpenAI")
+    args = parser.parse_args()
+
+    # Distinct texts per repetition, so the cold run cannot hit the cache
+    corpus = [f"{text} (#{i})" for i in range(args.repeat) for text in CORPUS]
+    print(f"{len(corpus)} texts, batch size {args.batch_size}\n")
+
+    lexicon = CachedSentiment(LexiconSentiment())
+    _, cold = timed(lexicon, corpus, args.batch_size)
+    _, warm = timed(lexicon, corpus, args.batch_size)
+    print(
+        f"lexicon  cold {len(corpus) / cold:10.0f} texts/s   "
+        f"warm {len(corpus) / warm:10.0f} texts/s"
+    )
+
+    if args.labelled is None:
+        print("\nNo held-out set (--labelled), label agreement not measured")
+        return
+    label_map = dict(item.split("=", 1) for item in args.label_map.split(",") if item)
+    held_out = load_labelled(args.labelled, args.text_column, args.label_column, label_map)
+    texts = [text for text, _ in held_out]
+    reference = [label for _, label in held_out]
+    counts = {label: reference.count(label) for label in ("positive", "neutral", "negative")}
+    print(f"\nHeld-out set {args.labelled.name}: {len(held_out)} texts, {counts}")
+
+    lexicon_labels = [score.label for score in lexicon.score_batch(texts)]
+    print(f"lexicon  agreement with reference {agreement(lexicon_labels, reference):.2f}")
+
+    if not args.openai:
+        return
+    # The remote backend is slow and billed per token, it only scores the held-out set
+    remote = CachedSentiment(OpenAISentiment())
+    scores, elapsed = timed(remote, texts, args.batch_size)
+    remote_labels = [score.label for score in scores]
+    print(
+        f"openai   {len(texts) / elapsed:10.1f} texts/s   "
+        f"agreement with reference {agreement(remote_labels, reference):.2f}   "
+        f"with lexicon {agreement(remote_labels, lexicon_labels):.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
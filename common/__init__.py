@@ -0,0 +1,43 @@
+"""
+Shared building blocks used by the individual project apps.
+
+The apps are plain Streamlit scripts living in sibling folders, so they add the
+repository root to ``sys.path`` before importing from this package.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+
+# Root directory for every on-disk cache written by the apps
+CACHE_ROOT = Path(
+    os.getenv("LLM_HUB_CACHE_DIR", Path.home() / ".cache" / "llm-projects-hub")
+)
+
+
+def cache_dir(name: str) -> Path:
+    """
+    Returns (and creates) a named cache directory under the cache root.
+
+    Args:
+        - name: The name of the cache directory.
+
+    Returns:
+        - The path of the cache directory.
+    """
+    path = CACHE_ROOT / name
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def text_hash(text: str) -> str:
+    """
+    Returns the hash used to identify a chunk of text.
+
+    Args:
+        - text: The text to hash.
+
+    Returns:
+        - The hexadecimal SHA-256 digest of the text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
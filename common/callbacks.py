@@ -0,0 +1,239 @@
+"""
+LangChain callback handlers of the tracing and streaming helpers.
+
+Kept apart from ``common.tracing`` and ``common.streaming`` so that importing
+them does not import LangChain, which would slow down the first paint of every
+app: ``Trace.handler()`` and ``stream_tokens`` import this module on first use.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from common.tracing import Span, Trace, _current_span
+
+
+def _chars(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_chars(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_chars(item) for item in value)
+    if hasattr(value, "to_string"):
+        # Prompt values
+        return len(value.to_string())
+    return len(str(getattr(value, "content", "") or getattr(value, "page_content", "")))
+
+
+def _run_name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any], default: str) -> str:
+    if kwargs.get("name"):
+        return kwargs["name"]
+    serialized = serialized or {}
+    if serialized.get("name"):
+        return serialized["name"]
+    ids = serialized.get("id") or []
+    return ids[-1] if ids else default
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler turning chain, LLM, retriever and tool runs into spans.
+    """
+
+    def __init__(self, trace: Trace, agent: Optional[str] = None):
+        """
+        Initializes the handler.
+
+        Args:
+            - trace: The trace receiving the spans.
+            - agent: The role of the crewAI agent, names its task spans.
+        """
+        self.trace = trace
+        self.agent = agent
+        self._spans: Dict[UUID, Span] = {}
+        self._parents: Dict[UUID, Span] = {}
+        self._lock = threading.Lock()
+
+    def _start(
+        self,
+        run_id: UUID,
+        parent_run_id: Optional[UUID],
+        name: str,
+        kind: str,
+        **attributes: Any,
+    ) -> None:
+        with self._lock:
+            parent = self._spans.get(parent_run_id) if parent_run_id else None
+        if parent is None:
+            # Top-level runs hang below the innermost span of the calling code
+            current = _current_span.get()
+            in_trace = current is not None and current.trace_id == self.trace.trace_id
+            parent = current if in_trace else self.trace.root
+        step = self.trace.start_span(name, kind, parent, **attributes)
+        with self._lock:
+            self._spans[run_id] = step
+            self._parents[run_id] = parent
+        # Steps of the calling code running inside this run (cached tools,
+        # gateway requests) become its children
+        _current_span.set(step)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **attributes: Any):
+        with self._lock:
+            step = self._spans.pop(run_id, None)
+            parent = self._parents.pop(run_id, None)
+        if step is None:
+            return
+        step.set(**attributes)
+        self.trace.end_span(step, error)
+        if _current_span.get() is step:
+            _current_span.set(parent)
+
+    def on_chain_start(
+        self,
+        serialized: Dict[str, Any],
+        inputs: Dict[str, Any],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        if self.agent and parent_run_id is None:
+            # A crewAI agent executor run is the execution of one task
+            self._start(run_id, None, self.agent, "task", input_chars=_chars(inputs))
+        else:
+            name = _run_name(serialized, kwargs, "chain")
+            self._start(run_id, parent_run_id, name, "chain", input_chars=_chars(inputs))
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, output_chars=_chars(outputs))
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_llm_start(
+        self,
+        serialized: Dict[str, Any],
+        prompts: List[str],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_llm(serialized, _chars(prompts), run_id, parent_run_id, kwargs)
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[Any]],
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        self._start_llm(serialized, _chars(messages), run_id, parent_run_id, kwargs)
+
+    def _start_llm(
+        self,
+        serialized: Dict[str, Any],
+        input_chars: int,
+        run_id: UUID,
+        parent_run_id: Optional[UUID],
+        kwargs: Dict[str, Any],
+    ) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = (
+            params.get("model_name") or params.get("model") or params.get("repo_id")
+            or _run_name(serialized, kwargs, "llm")
+        )
+        self._start(run_id, parent_run_id, str(model), "llm", input_chars=input_chars)
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            step = self._spans.get(run_id)
+        if step is not None and "time_to_first_token" not in step.attributes:
+            step.set(time_to_first_token=round(time.time() - step.start, 3))
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        text = "".join(
+            generation.text for generations in response.generations for generation in generations
+        )
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        attributes: Dict[str, Any] = {"output_chars": len(text)}
+        if usage.get("total_tokens"):
+            attributes.update(
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                completion_tokens=usage.get("completion_tokens", 0),
+                total_tokens=usage["total_tokens"],
+            )
+        else:
+            # Rough estimate when the provider does not report usage, e.g. when streaming
+            with self._lock:
+                step = self._spans.get(run_id)
+            input_chars = step.attributes.get("input_chars", 0) if step else 0
+            attributes.update(
+                prompt_tokens=input_chars // 4,
+                completion_tokens=len(text) // 4,
+                total_tokens=(input_chars + len(text)) // 4,
+                tokens_estimated=True,
+            )
+        self._end(run_id, **attributes)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_retriever_start(
+        self,
+        serialized: Dict[str, Any],
+        query: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        name = _run_name(serialized, kwargs, "retriever")
+        self._start(run_id, parent_run_id, name, "retriever", input_chars=len(query))
+
+    def on_retriever_end(self, documents: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, documents=len(documents), output_chars=_chars(list(documents)))
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_tool_start(
+        self,
+        serialized: Dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        parent_run_id: Optional[UUID] = None,
+        **kwargs: Any,
+    ) -> None:
+        name = _run_name(serialized, kwargs, "tool")
+        self._start(run_id, parent_run_id, name, "tool", input_chars=len(input_str))
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, output_chars=_chars(output))
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+
+class QueueCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler forwarding new LLM tokens to a queue.
+    """
+
+    # Kind of the events posted to the queue
+    TOKEN = "token"
+
+    def __init__(self, events: queue.Queue):
+        self.events = events
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.events.put((self.TOKEN, token))
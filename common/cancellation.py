@@ -0,0 +1,124 @@
+"""
+Cooperative cancellation of chain and crew runs.
+
+A blocking chain or crew cannot be interrupted from another thread. Instead,
+the caller runs it under a ``CancelToken`` held in a context variable, like the
+current trace (see ``common.tracing``). The LLM gateway checks the token before
+every request and ``CancellationCallbackHandler`` on every LangChain event, so
+a cancelled run raises ``Cancelled`` at its next LLM call or streamed token and
+frees its thread. Work already sent to a provider is not interrupted.
+"""
+
+import contextlib
+import contextvars
+import threading
+from typing import Any, Iterator, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class Cancelled(Exception):
+    """
+    Raised inside a run whose cancel token was cancelled.
+    """
+
+
+class CancelToken:
+    """
+    Cancellation flag of one run, set from any thread.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = "cancelled"
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """
+        Cancels the run.
+
+        Args:
+            - reason: Why the run was cancelled, e.g. "client disconnected".
+        """
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def raise_if_cancelled(self) -> None:
+        """
+        Stops the run if it was cancelled.
+        """
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+
+_current_token: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar(
+    "cancel_token", default=None
+)
+
+
+def current_token() -> Optional[CancelToken]:
+    """
+    Returns the cancel token of the current context, None outside a cancellable run.
+    """
+    return _current_token.get()
+
+
+def check_cancelled() -> None:
+    """
+    Raises ``Cancelled`` if the run of the current context was cancelled.
+    """
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+@contextlib.contextmanager
+def cancellable(token: CancelToken) -> Iterator[CancelToken]:
+    """
+    Makes the runs started in the block cancellable through a token.
+
+    Args:
+        - token: The cancel token.
+
+    Returns:
+        - A context manager yielding the token.
+    """
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+class CancellationCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler stopping a chain at its next event once cancelled.
+    """
+
+    # Exceptions raised by the handler stop the chain instead of being logged
+    raise_error = True
+
+    def __init__(self, token: CancelToken):
+        self.token = token
+
+    def on_chain_start(self, serialized: Any, inputs: Any, **kwargs: Any) -> None:
+        self.token.raise_if_cancelled()
+
+    def on_llm_start(self, serialized: Any, prompts: Any, **kwargs: Any) -> None:
+        self.token.raise_if_cancelled()
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, **kwargs: Any) -> None:
+        self.token.raise_if_cancelled()
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.token.raise_if_cancelled()
+
+    def on_retriever_start(self, serialized: Any, query: str, **kwargs: Any) -> None:
+        self.token.raise_if_cancelled()
+
+    def on_tool_start(self, serialized: Any, input_str: str, **kwargs: Any) -> None:
+        self.token.raise_if_cancelled()
@@ -0,0 +1,351 @@
+"""
+Batched, concurrent embedding layer with a persistent per-chunk vector cache.
+
+``BatchedEmbeddings`` wraps any LangChain embeddings model. Identical chunks are
+embedded once, vectors already seen are served from a SQLite cache keyed by the
+hash of the chunk text, and the remaining chunks are sent in fixed-size batches
+through a bounded thread pool with exponential backoff on rate limits.
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from common import text_hash
+from common.tracing import span
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    """
+    Checks whether an exception raised by a provider signals a rate limit.
+
+    Args:
+        - exc: The exception to inspect.
+
+    Returns:
+        - True if the request should be retried after backing off.
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None) or getattr(exc, "status_code", None)
+    if status in (429, 503):
+        return True
+    message = str(exc).lower()
+    return "429" in message or "rate limit" in message or "too many requests" in message
+
+
+class EmbeddingCache:
+    """
+    SQLite store mapping (model, chunk text hash) to an embedding vector.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Opens (and creates if needed) the cache database.
+
+        Args:
+            - path: The path of the SQLite database file.
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """
+        Looks up the cached vectors for the given chunk hashes.
+
+        Args:
+            - model: The name of the embedding model.
+            - hashes: The chunk hashes to look up.
+
+        Returns:
+            - A mapping of the hashes found in the cache to their vectors.
+        """
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's limit on bound parameters
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start : start + 500]
+                rows = self._conn.execute(
+                    "SELECT hash, vector FROM embeddings WHERE model = ? "
+                    f"AND hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]) -> None:
+        """
+        Stores vectors in the cache.
+
+        Args:
+            - model: The name of the embedding model.
+            - vectors: A mapping of chunk hashes to their vectors.
+        """
+        rows = [
+            (model, key, np.asarray(vector, dtype=np.float32).tobytes())
+            for key, vector in vectors.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic local stand-in embedder for tests and offline runs.
+
+    Vectors are derived from the text hash, so equal texts always map to the same
+    unit vector and no network access is needed.
+    """
+
+    def __init__(self, size: int = 384):
+        """
+        Initializes the embedder.
+
+        Args:
+            - size: The dimension of the produced vectors.
+        """
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        seed = int(text_hash(text)[:16], 16)
+        vector = np.random.default_rng(seed).standard_normal(self.size)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper adding deduplication, caching, batching and concurrency.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = 32,
+        max_workers: int = 4,
+        max_retries: int = 5,
+        initial_backoff: float = 1.0,
+    ):
+        """
+        Initializes the wrapper.
+
+        Args:
+            - embeddings: The embeddings model doing the actual work.
+            - model_name: The model name, used to namespace cached vectors.
+            - cache: The vector cache, or None to disable caching.
+            - batch_size: The number of chunks sent per request.
+            - max_workers: The maximum number of requests in flight.
+            - max_retries: The number of retries of a rate limited batch.
+            - initial_backoff: The delay in seconds before the first retry.
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds a single batch, backing off and retrying on rate limits.
+
+        Args:
+            - texts: The texts of the batch.
+
+        Returns:
+            - The vectors of the batch.
+        """
+        delay = self.initial_backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as exc:
+                if attempt == self.max_retries or not is_rate_limit_error(exc):
+                    raise
+                # Full jitter keeps concurrent workers from retrying in lockstep
+                time.sleep(random.uniform(0, delay))
+                delay *= 2
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds documents, only sending unseen unique chunks to the model.
+
+        Args:
+            - texts: The texts to embed.
+
+        Returns:
+            - The vectors in the order of the given texts.
+        """
+        with span(
+            "embed_documents",
+            "embedding",
+            model=self.model_name,
+            texts=len(texts),
+            input_chars=sum(len(text) for text in texts),
+        ) as step:
+            hashes = [text_hash(text) for text in texts]
+            # Identical chunks (e.g. repeated boilerplate pages) are embedded once
+            unique = dict(zip(hashes, texts))
+            vectors = self.cache.get_many(self.model_name, list(unique)) if self.cache else {}
+
+            missing = [key for key in unique if key not in vectors]
+            batches = [
+                missing[start : start + self.batch_size]
+                for start in range(0, len(missing), self.batch_size)
+            ]
+            step.set(cache_hits=len(unique) - len(missing), cache_misses=len(missing))
+            if batches:
+                step.set(batches=len(batches))
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    results = executor.map(
+                        lambda batch: self._embed_batch([unique[key] for key in batch]),
+                        batches,
+                    )
+                    for batch, batch_vectors in zip(batches, results):
+                        fresh = dict(zip(batch, batch_vectors))
+                        if self.cache:
+                            self.cache.put_many(self.model_name, fresh)
+                        vectors.update(fresh)
+
+            return [vectors[key] for key in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Embeds a query, reusing the cached vector of a repeated query.
+
+        Args:
+            - text: The query text.
+
+        Returns:
+            - The query vector.
+        """
+        # Queries get their own namespace as some models embed them differently
+        namespace = f"{self.model_name}#query"
+        key = text_hash(text)
+        with span("embed_query", "embedding", model=self.model_name, input_chars=len(text)) as step:
+            if self.cache:
+                cached = self.cache.get_many(namespace, [key])
+                if key in cached:
+                    step.set(cache="hit")
+                    return cached[key]
+            step.set(cache="miss")
+            vector = self.embeddings.embed_query(text)
+            if self.cache:
+                self.cache.put_many(namespace, {key: vector})
+            return vector
+
+
+def fake_embeddings_enabled() -> bool:
+    """
+    Checks whether ``LLM_HUB_FAKE_EMBEDDINGS`` turns the local stand-in on.
+
+    Returns:
+        - True for "1", "true", "yes" or "on" (any case), False when unset or anything else.
+    """
+    return os.getenv("LLM_HUB_FAKE_EMBEDDINGS", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _batched(
+    embeddings: Embeddings, model: str, cache: Optional[EmbeddingCache]
+) -> BatchedEmbeddings:
+    return BatchedEmbeddings(
+        embeddings,
+        model_name=model,
+        cache=cache,
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+        max_workers=int(os.getenv("EMBEDDING_MAX_WORKERS", "4")),
+    )
+
+
+def create_hub_embeddings(
+    model: str, token: Optional[str], cache: Optional[EmbeddingCache] = None
+) -> BatchedEmbeddings:
+    """
+    Creates batched Hugging Face Hub embeddings for the given model.
+
+    Setting ``LLM_HUB_FAKE_EMBEDDINGS=1`` swaps the hub model for the local
+    deterministic stand-in, e.g. for tests.
+
+    Args:
+        - model: The Hugging Face model id.
+        - token: The Hugging Face API token.
+        - cache: The vector cache shared between documents.
+
+    Returns:
+        - The batched embeddings.
+    """
+    if fake_embeddings_enabled():
+        return _batched(FakeEmbeddings(), f"fake/{model}", cache)
+
+    from langchain_community.embeddings import HuggingFaceHubEmbeddings
+
+    from common.llm_gateway import configure_huggingface
+
+    configure_huggingface()
+    embeddings = HuggingFaceHubEmbeddings(
+        model=model,
+        task="feature-extraction",
+        huggingfacehub_api_token=token,
+    )
+    return _batched(embeddings, model, cache)
+
+
+def create_openai_embeddings(
+    model: str, cache: Optional[EmbeddingCache] = None
+) -> BatchedEmbeddings:
+    """
+    Creates batched OpenAI embeddings for the given model.
+
+    The API key is read from ``OPENAI_API_KEY``. ``LLM_HUB_FAKE_EMBEDDINGS=1``
+    swaps the model for the local deterministic stand-in.
+
+    Args:
+        - model: The OpenAI embedding model, e.g. "text-embedding-3-small".
+        - cache: The vector cache shared between documents.
+
+    Returns:
+        - The batched embeddings.
+    """
+    if fake_embeddings_enabled():
+        return _batched(FakeEmbeddings(), f"fake/{model}", cache)
+
+    from langchain_community.embeddings import OpenAIEmbeddings
+
+    from common.llm_gateway import openai_clients
+
+    client, async_client = openai_clients()
+    # Batching is done by the wrapper, one request per wrapper batch
+    embeddings = OpenAIEmbeddings(
+        model=model,
+        chunk_size=1000,
+        client=client.embeddings,
+        async_client=async_client.embeddings,
+    )
+    return _batched(embeddings, f"openai/{model}", cache)
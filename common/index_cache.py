@@ -0,0 +1,265 @@
+"""
+Content-addressed, size-bounded cache of persisted vector indexes.
+
+Every index lives in its own directory named after a key derived from the
+source bytes and the settings used to build it (splitter, embedding model, ...).
+A small JSON manifest tracks the size and last access time of each entry so the
+least recently used indexes can be evicted once the cache outgrows its budget.
+
+The last few indexes opened by the process are kept in memory. An index whose
+object is still referenced elsewhere in the process (e.g. by a session engine)
+is in use: it is reused rather than reopened and never evicted from disk.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from common.tracing import span
+
+# Marker written once an index directory has been fully built
+_COMPLETE_MARKER = ".complete"
+_MANIFEST = "manifest.json"
+
+
+def _dir_size(path: Path) -> int:
+    """
+    Returns the total size in bytes of the files below the given directory.
+
+    Args:
+        - path: The directory to measure.
+
+    Returns:
+        - The size of the directory in bytes.
+    """
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+class IndexCache:
+    """
+    Persists built indexes on disk and evicts the least recently used ones.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = 2 * 1024**3,
+        max_entries: int = 64,
+        max_loaded: int = 8,
+    ):
+        """
+        Initializes the cache.
+
+        Args:
+            - root: The directory holding the cached indexes.
+            - max_bytes: The maximum total size of the cached indexes.
+            - max_entries: The maximum number of cached indexes.
+            - max_loaded: The maximum number of indexes kept in memory by the cache itself,
+              0 to keep only the ones still referenced elsewhere in the process.
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_loaded = max_loaded
+        self._lock = threading.Lock()
+        # Last indexes opened by this process, reused across questions and reruns
+        self._loaded: "OrderedDict[str, Any]" = OrderedDict()
+        # Every index handed out and still referenced somewhere in the process
+        self._in_use: "weakref.WeakValueDictionary[str, Any]" = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def make_key(data: bytes, **settings: Any) -> str:
+        """
+        Builds the cache key for the given source bytes and build settings.
+
+        Args:
+            - data: The raw bytes of the source document.
+            - settings: The settings that influence the built index.
+
+        Returns:
+            - The hexadecimal cache key.
+        """
+        digest = hashlib.sha256(data)
+        digest.update(json.dumps(settings, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        """
+        Returns the directory used to persist the index with the given key.
+
+        Args:
+            - key: The cache key.
+
+        Returns:
+            - The directory of the index.
+        """
+        return self.root / key
+
+    def contains(self, key: str) -> bool:
+        """
+        Checks whether a fully built index exists for the given key.
+
+        Args:
+            - key: The cache key.
+
+        Returns:
+            - True if the index is cached on disk.
+        """
+        return (self.path_for(key) / _COMPLETE_MARKER).exists()
+
+    def get_or_create(
+        self,
+        key: str,
+        build: Callable[[str], Any],
+        load: Callable[[str], Any],
+    ) -> Any:
+        """
+        Returns the index for the given key, building and persisting it if needed.
+
+        Args:
+            - key: The cache key.
+            - build: Builds the index into the given directory and returns it.
+            - load: Opens an existing index from the given directory.
+
+        Returns:
+            - The loaded or freshly built index.
+        """
+        with self._lock, span(self.root.name, "cache") as step:
+            index = self._opened(key)
+            if index is not None and self.contains(key):
+                self._remember(key, index)
+                self._touch(key)
+                step.set(cache="hit")
+                return index
+
+            path = self.path_for(key)
+            if self.contains(key):
+                step.set(cache="disk")
+                index = load(str(path))
+            else:
+                step.set(cache="miss")
+                # Drop leftovers of an interrupted build before starting over
+                shutil.rmtree(path, ignore_errors=True)
+                path.mkdir(parents=True)
+                index = build(str(path))
+                (path / _COMPLETE_MARKER).touch()
+
+            self._remember(key, index)
+            self._touch(key)
+            self._evict(keep=key)
+            return index
+
+    def _opened(self, key: str) -> Optional[Any]:
+        """
+        Returns the index opened by this process for the given key, if still in memory.
+
+        Args:
+            - key: The cache key.
+
+        Returns:
+            - The index, or None.
+        """
+        index = self._loaded.get(key)
+        return index if index is not None else self._in_use.get(key)
+
+    def _remember(self, key: str, index: Any) -> None:
+        """
+        Keeps an opened index in memory, dropping the least recently used ones.
+
+        Args:
+            - key: The cache key.
+            - index: The opened index.
+        """
+        try:
+            self._in_use[key] = index
+        except TypeError:
+            # Objects without weak references are only tracked while in the LRU
+            pass
+        if self.max_loaded > 0:
+            self._loaded[key] = index
+            self._loaded.move_to_end(key)
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+
+    def _release(self, key: str) -> bool:
+        """
+        Forgets the in-memory copy of an index about to be evicted.
+
+        Args:
+            - key: The cache key.
+
+        Returns:
+            - True if the index is still referenced elsewhere in the process.
+        """
+        self._loaded.pop(key, None)
+        # Without the LRU reference, the weak one only survives if someone else holds the index
+        return key in self._in_use
+
+    def _read_manifest(self) -> Dict[str, Dict[str, float]]:
+        """
+        Reads the manifest, ignoring a missing or corrupt file.
+
+        Returns:
+            - A mapping of cache keys to their size and last access time.
+        """
+        try:
+            return json.loads((self.root / _MANIFEST).read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest: Dict[str, Dict[str, float]]) -> None:
+        """
+        Atomically replaces the manifest on disk.
+
+        Args:
+            - manifest: The manifest to write.
+        """
+        tmp_path = self.root / f"{_MANIFEST}.{os.getpid()}.tmp"
+        tmp_path.write_text(json.dumps(manifest))
+        os.replace(tmp_path, self.root / _MANIFEST)
+
+    def _touch(self, key: str) -> None:
+        """
+        Records an access to the given entry.
+
+        Args:
+            - key: The cache key.
+        """
+        manifest = self._read_manifest()
+        entry = manifest.get(key)
+        if entry is None:
+            entry = {"size": _dir_size(self.path_for(key))}
+        entry["last_access"] = time.time()
+        manifest[key] = entry
+        self._write_manifest(manifest)
+
+    def _evict(self, keep: str) -> None:
+        """
+        Removes least recently used entries until the cache fits its budget.
+
+        Args:
+            - keep: The key that must not be evicted.
+        """
+        manifest = self._read_manifest()
+        # Forget entries whose directory disappeared behind our back
+        manifest = {k: v for k, v in manifest.items() if self.contains(k)}
+        total = sum(entry["size"] for entry in manifest.values())
+
+        for key in sorted(manifest, key=lambda k: manifest[k]["last_access"]):
+            if total <= self.max_bytes and len(manifest) <= self.max_entries:
+                break
+            # Indexes in use by this process may still read their files
+            if key == keep or self._release(key):
+                continue
+            shutil.rmtree(self.path_for(key), ignore_errors=True)
+            total -= manifest.pop(key)["size"]
+
+        self._write_manifest(manifest)
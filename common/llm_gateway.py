@@ -0,0 +1,885 @@
+"""
+Process-wide gateway for every LLM and embedding HTTP call of the apps.
+
+The apps talk to their providers through different SDKs: the OpenAI SDK
+(LangChain ``ChatOpenAI`` and ``OpenAIEmbeddings``, crewAI agents, the
+sentiment scorer) goes through ``httpx``, the Hugging Face Hub client through
+``requests``. Instead of wrapping each SDK, the gateway plugs in at the HTTP
+layer: ``GatewayTransport`` for httpx and ``GatewayAdapter`` for requests both
+hand every request to one ``LLMGateway``, which provides
+
+- pooled keep-alive connections, shared by all clients of the process;
+- a token bucket per provider (``LLM_GATEWAY_RPM_<PROVIDER>``);
+- coalescing: identical requests in flight at the same time are sent once;
+- retries with exponential backoff and full jitter on 429, 5xx and connection
+  errors, honouring ``Retry-After``;
+- an exact-match cache of responses in SQLite, per API key and organization
+  (``LLM_GATEWAY_CACHE``): ``deterministic`` (default) caches requests sampled
+  at temperature 0 and embeddings, ``all`` caches every non-streaming request,
+  ``off`` disables it.
+  Streaming requests always bypass the cache and coalescing.
+
+Requests of a cancelled run (see ``common.cancellation``) raise ``Cancelled``
+instead of being sent.
+
+``LLM_GATEWAY_PROVIDER=mock`` answers every request locally with OpenAI or
+Hugging Face shaped responses, so the apps and crews run offline in tests.
+``LLM_GATEWAY_MOCK_LATENCY`` adds a seeded random delay of 0.5 to 1.5 times
+that many seconds to each mocked response (``LLM_GATEWAY_MOCK_SEED``), e.g.
+for benchmarks.
+"""
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from common import cache_dir
+from common.cancellation import check_cancelled
+from common.rate_limit import TokenBucket
+from common.tracing import current_span, span
+
+# Statuses worth retrying: rate limited, overloaded or transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+CACHE_MODES = ("off", "deterministic", "all")
+
+# Default requests per minute per provider, unlimited for unknown hosts
+DEFAULT_RPM: Dict[str, float] = {"openai": 500, "huggingface": 60}
+
+_PROVIDER_HOSTS = {
+    "api.openai.com": "openai",
+    "api-inference.huggingface.co": "huggingface",
+    "huggingface.co": "huggingface",
+}
+
+# Headers describing the encoded body, wrong once the body is decoded
+_DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding", "connection")
+
+# Request headers identifying who a request is sent for, hashed into the cache key
+_CREDENTIAL_HEADERS = ("authorization", "api-key", "openai-organization", "openai-project")
+
+Result = Tuple[int, Dict[str, str], bytes]
+
+
+def provider_for(url: str) -> str:
+    """
+    Names the provider a request goes to.
+
+    Args:
+        - url: The request URL.
+
+    Returns:
+        - The provider, e.g. "openai", or the host for unknown providers.
+    """
+    host = urlsplit(url).hostname or ""
+    return _PROVIDER_HOSTS.get(host, host)
+
+
+def _json_body(body: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        payload = json.loads(body) if body else None
+    except ValueError:
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def is_streaming(body: bytes) -> bool:
+    """
+    Checks whether a request asks for a streamed response.
+
+    Args:
+        - body: The request body.
+
+    Returns:
+        - True for OpenAI ``stream`` and Hugging Face text generation streams.
+    """
+    payload = _json_body(body) or {}
+    return bool(payload.get("stream") or (payload.get("parameters") or {}).get("stream"))
+
+
+def is_deterministic(body: bytes) -> bool:
+    """
+    Checks whether a request always produces the same response.
+
+    Args:
+        - body: The request body.
+
+    Returns:
+        - True for embeddings and for generations at temperature 0 or without sampling.
+    """
+    payload = _json_body(body)
+    if payload is None:
+        return False
+    parameters = payload.get("parameters") or {}
+    if "temperature" in payload:
+        return not payload["temperature"]
+    if parameters:
+        return not parameters.get("do_sample") and not parameters.get("temperature")
+    # Embedding requests carry no sampling parameter; chat requests default to sampling
+    return "messages" not in payload and "prompt" not in payload
+
+
+def credential_hash(headers: Any) -> str:
+    """
+    Hashes the credentials of a request: API key, organization and project.
+
+    Args:
+        - headers: The request headers, a mapping of names to values.
+
+    Returns:
+        - The hexadecimal SHA-256 digest of the credential headers.
+    """
+    credentials = sorted(
+        (name.lower(), value) for name, value in headers.items()
+        if name.lower() in _CREDENTIAL_HEADERS
+    )
+    return hashlib.sha256(json.dumps(credentials).encode()).hexdigest()
+
+
+def request_key(method: str, url: str, body: bytes, credential: str = "") -> str:
+    """
+    Builds the cache and coalescing key of a request.
+
+    The hash of the credentials is part of the key, so responses are never
+    shared between API keys or organizations.
+
+    Args:
+        - method: The HTTP method.
+        - url: The request URL.
+        - body: The request body.
+        - credential: The hash of the credentials, see ``credential_hash``.
+
+    Returns:
+        - The key.
+    """
+    payload = _json_body(body)
+    canonical = json.dumps(payload, sort_keys=True).encode() if payload is not None else body
+    return hashlib.sha256(
+        f"{credential}\0{method} {url}\0".encode() + canonical
+    ).hexdigest()
+
+
+def _clean_headers(headers: Dict[str, str]) -> Dict[str, str]:
+    return {
+        name.lower(): value
+        for name, value in headers.items()
+        if name.lower() not in _DROPPED_HEADERS
+    }
+
+
+class CompletionCache:
+    """
+    SQLite store of responses, keyed by the exact request.
+    """
+
+    def __init__(self, path: Path, ttl: float = 7 * 24 * 3600, max_entries: int = 50_000):
+        """
+        Opens (and creates if needed) the cache database.
+
+        Args:
+            - path: The path of the SQLite database file.
+            - ttl: The number of seconds a response stays valid.
+            - max_entries: The maximum number of responses kept, least recently used first out.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Other processes may hold the write lock briefly, wait for it
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, provider TEXT NOT NULL, status INTEGER NOT NULL, "
+            "headers TEXT NOT NULL, content BLOB NOT NULL, "
+            "created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Result]:
+        """
+        Looks up a response.
+
+        Args:
+            - key: The request key.
+
+        Returns:
+            - The status, headers and body, or None when missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, content FROM responses WHERE key = ? AND created > ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return row[0], json.loads(row[1]), row[2]
+
+    def put(self, key: str, provider: str, result: Result) -> None:
+        """
+        Stores a response, evicting expired and least recently used ones.
+
+        Args:
+            - key: The request key.
+            - provider: The provider of the request.
+            - result: The status, headers and body.
+        """
+        status, headers, content = result
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, provider, status, headers, content, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, status, json.dumps(headers), content, now, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                "ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+
+class _Flight:
+    """
+    A request in flight that identical requests wait for.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Result] = None
+        self.error: Optional[BaseException] = None
+
+    def wait(self) -> Result:
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _mock_text(payload: Dict[str, Any]) -> str:
+    messages = payload.get("messages") or []
+    if messages:
+        prompt = messages[-1].get("content") or ""
+    else:
+        prompt = payload.get("prompt") or payload.get("inputs") or ""
+    excerpt = " ".join(str(prompt).split())[:200]
+    # crewAI agents stop at a final answer, so mocked crews finish in one step
+    return f"Thought: I now can give a great answer\nFinal Answer: [mock] {excerpt}"
+
+
+def _mock_vector(item: Any, size: int = 1536) -> List[float]:
+    seed = int(hashlib.sha256(json.dumps(item).encode()).hexdigest()[:8], 16)
+    generator = random.Random(seed)
+    values = [generator.random() - 0.5 for _ in range(size)]
+    norm = sum(value * value for value in values) ** 0.5
+    return [value / norm for value in values]
+
+
+def _mock_value(schema: Dict[str, Any], definitions: Dict[str, Any], depth: int = 0) -> Any:
+    if "$ref" in schema:
+        schema = definitions.get(schema["$ref"].rsplit("/", 1)[-1], {})
+    for option in schema.get("anyOf") or schema.get("allOf") or ():
+        return _mock_value(option, definitions, depth)
+    kind = schema.get("type")
+    if kind == "object" and depth < 8:
+        properties = schema.get("properties", {})
+        return {
+            name: _mock_value(properties[name], definitions, depth + 1)
+            for name in schema.get("required", properties)
+        }
+    if kind == "array" and depth < 8:
+        return [_mock_value(schema.get("items", {}), definitions, depth + 1)]
+    return {"string": "mock", "number": 5.0, "integer": 5, "boolean": False}.get(kind)
+
+
+def _mock_tool_call(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Calls the function a request forces, with arguments filled from its schema,
+    as structured output libraries (e.g. instructor) expect.
+    """
+    choice = payload.get("tool_choice")
+    if not isinstance(choice, dict) or not payload.get("tools"):
+        return None
+    name = choice.get("function", {}).get("name")
+    for tool in payload["tools"]:
+        function = tool.get("function", {})
+        if function.get("name") == name:
+            schema = function.get("parameters", {})
+            arguments = _mock_value(schema, schema.get("$defs") or schema.get("definitions") or {})
+            return {
+                "id": "call_mock",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments)},
+            }
+    return None
+
+
+def mock_response(url: str, body: bytes) -> Result:
+    """
+    Answers a request locally, in the response format of its provider.
+
+    Args:
+        - url: The request URL.
+        - body: The request body.
+
+    Returns:
+        - The status, headers and body of the mocked response.
+    """
+    payload = _json_body(body) or {}
+    path = urlsplit(url).path
+    text = _mock_text(payload)
+    prompt_tokens = len(json.dumps(payload)) // 4
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(text) // 4,
+        "total_tokens": prompt_tokens + len(text) // 4,
+    }
+    model = payload.get("model", "mock")
+    created = int(time.time())
+
+    if path.endswith("/whoami-v2"):
+        # Hugging Face token check of HuggingFaceEndpoint
+        data = {"type": "user", "name": "mock", "auth": {"accessToken": {"role": "read"}}}
+    elif path.endswith("/embeddings"):
+        inputs = payload.get("input")
+        # A string or a single list of token ids is one input
+        if not isinstance(inputs, list) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        data = {
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": index, "embedding": _mock_vector(item)}
+                for index, item in enumerate(inputs)
+            ],
+            "model": model,
+            "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+        }
+    elif path.endswith("/chat/completions"):
+        if payload.get("stream"):
+            chunk = {
+                "id": "mock",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+            }
+            deltas = [({"role": "assistant", "content": text}, None), ({}, "stop")]
+            events = [
+                {**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": reason}]}
+                for delta, reason in deltas
+            ]
+            stream = "".join(f"data: {json.dumps(event)}\n\n" for event in events)
+            stream += "data: [DONE]\n\n"
+            return 200, {"content-type": "text/event-stream"}, stream.encode()
+        tool_call = _mock_tool_call(payload)
+        message: Dict[str, Any] = {"role": "assistant", "content": text}
+        if tool_call is not None:
+            message = {"role": "assistant", "content": None, "tool_calls": [tool_call]}
+        data = {
+            "id": "mock",
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": message,
+                    "finish_reason": "stop" if tool_call is None else "tool_calls",
+                }
+            ],
+            "usage": usage,
+        }
+    elif path.endswith("/completions"):
+        data = {
+            "id": "mock",
+            "object": "text_completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "text": text, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+    elif "/feature-extraction/" in path or isinstance(payload.get("inputs"), list):
+        # Hugging Face feature extraction
+        inputs = payload.get("inputs")
+        if not isinstance(inputs, list):
+            inputs = [inputs]
+        data = [_mock_vector(item, 768) for item in inputs]
+    elif payload.get("stream"):
+        # Hugging Face text generation, streamed as server-sent events
+        events = [
+            {
+                "index": 1,
+                "token": {"id": 0, "text": text, "logprob": 0.0, "special": False},
+                "generated_text": text,
+                "details": None,
+            }
+        ]
+        stream = "".join(f"data:{json.dumps(event)}\n\n" for event in events)
+        return 200, {"content-type": "text/event-stream"}, stream.encode()
+    else:
+        # Hugging Face text generation
+        data = [{"generated_text": text}]
+    return 200, {"content-type": "application/json"}, json.dumps(data).encode()
+
+
+class LLMGateway:
+    """
+    Rate limiting, coalescing, retries and caching shared by every HTTP client.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[CompletionCache] = None,
+        cache_mode: str = "deterministic",
+        mock: bool = False,
+        mock_latency: float = 0.0,
+        mock_seed: int = 0,
+        max_retries: int = 5,
+        initial_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        rpm: Optional[Dict[str, float]] = None,
+        burst: float = 5,
+    ):
+        """
+        Initializes the gateway.
+
+        Args:
+            - cache: The response cache, None to disable caching.
+            - cache_mode: One of ``CACHE_MODES``.
+            - mock: Whether to answer every request locally.
+            - mock_latency: The mean delay in seconds of a mocked response.
+            - mock_seed: The seed of the mocked response delays.
+            - max_retries: The number of retries of a failed request.
+            - initial_backoff: The maximum delay before the first retry, doubled after each retry.
+            - max_backoff: The maximum delay between two attempts.
+            - rpm: The requests per minute allowed per provider.
+            - burst: The number of requests a provider may receive at once.
+        """
+        if cache_mode not in CACHE_MODES:
+            raise ValueError(f"Unknown LLM gateway cache mode: {cache_mode}")
+        self.cache = cache if cache_mode != "off" else None
+        self.cache_mode = cache_mode
+        self.mock = mock
+        self.mock_latency = mock_latency
+        self._mock_random = random.Random(mock_seed)
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.rpm = dict(DEFAULT_RPM if rpm is None else rpm)
+        self.burst = burst
+        self._buckets: Dict[str, Optional[TokenBucket]] = {}
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _count(self, provider: str, name: str, value: float = 1) -> None:
+        with self._lock:
+            counters = self._stats.setdefault(
+                provider,
+                {"requests": 0, "sent": 0, "cache_hits": 0, "coalesced": 0, "retries": 0},
+            )
+            counters[name] = counters.get(name, 0) + value
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the counters of this process, per provider.
+
+        Returns:
+            - The requests, requests actually sent, cache hits, coalesced requests,
+              retries and seconds spent waiting for the rate limit.
+        """
+        with self._lock:
+            stats = {provider: dict(counters) for provider, counters in self._stats.items()}
+            for provider, bucket in self._buckets.items():
+                if bucket is not None and provider in stats:
+                    stats[provider]["rate_limit_wait"] = round(bucket.waited, 3)
+            return stats
+
+    def _bucket(self, provider: str) -> Optional[TokenBucket]:
+        with self._lock:
+            if provider not in self._buckets:
+                name = "".join(char if char.isalnum() else "_" for char in provider)
+                env = f"LLM_GATEWAY_RPM_{name.upper()}"
+                rpm = float(os.getenv(env, self.rpm.get(provider, 0)))
+                self._buckets[provider] = (
+                    TokenBucket.per_minute(rpm, self.burst) if rpm > 0 else None
+                )
+            return self._buckets[provider]
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after:
+            try:
+                return min(self.max_backoff, float(retry_after))
+            except ValueError:
+                pass
+        # Full jitter keeps concurrent clients from retrying in lockstep
+        return random.uniform(0, min(self.max_backoff, self.initial_backoff * 2**attempt))
+
+    def _send(
+        self,
+        provider: str,
+        perform: Callable[[], Any],
+        inspect: Callable[[Any], Tuple[int, Dict[str, str]]],
+        close: Callable[[Any], None],
+        transport_errors: Tuple[type, ...],
+    ) -> Any:
+        """
+        Sends a request under the provider rate limit, retrying transient failures.
+
+        Args:
+            - provider: The provider of the request.
+            - perform: Sends the request once and returns the native response.
+            - inspect: Returns the status and the lower-cased headers of a native response.
+            - close: Releases a native response that is not returned.
+            - transport_errors: The connection errors of the HTTP library.
+
+        Returns:
+            - The native response of the last attempt.
+        """
+        bucket = self._bucket(provider)
+        for attempt in range(self.max_retries + 1):
+            if bucket is not None:
+                bucket.acquire()
+            self._count(provider, "sent")
+            try:
+                response = perform()
+            except transport_errors:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, None)
+            else:
+                status, headers = inspect(response)
+                if status not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                delay = self._backoff(attempt, headers.get("retry-after"))
+                close(response)
+            self._count(provider, "retries")
+            current_span().add(retries=1)
+            time.sleep(delay)
+
+    def handle(
+        self,
+        method: str,
+        url: str,
+        body: bytes,
+        perform: Callable[[], Any],
+        inspect: Callable[[Any], Tuple[int, Dict[str, str]]],
+        read: Callable[[Any], bytes],
+        close: Callable[[Any], None],
+        build: Callable[[Result], Any],
+        transport_errors: Tuple[type, ...] = (),
+        credential: str = "",
+    ) -> Any:
+        """
+        Handles one request of an HTTP client.
+
+        The callables adapt the gateway to the HTTP library of the client.
+
+        Args:
+            - method: The HTTP method.
+            - url: The request URL.
+            - body: The request body.
+            - perform: Sends the request once and returns the native response.
+            - inspect: Returns the status and the lower-cased headers of a native response.
+            - read: Reads the decoded body of a native response.
+            - close: Releases a native response that is not returned.
+            - build: Builds a native response from a status, headers and body.
+            - transport_errors: The connection errors of the HTTP library.
+            - credential: The hash of the credentials of the request, see ``credential_hash``.
+
+        Returns:
+            - The native response.
+        """
+        # A cancelled run stops here, before its next request is sent or joined
+        check_cancelled()
+        provider = provider_for(url)
+        self._count(provider, "requests")
+        name = f"{method} {provider}{urlsplit(url).path}"
+        with span(name, "http", provider=provider, request_bytes=len(body)) as step:
+            if self.mock:
+                step.set(cache="mock")
+                if self.mock_latency > 0:
+                    with self._lock:
+                        delay = self._mock_random.uniform(0.5, 1.5) * self.mock_latency
+                    time.sleep(delay)
+                return build(mock_response(url, body))
+            if method != "POST" or is_streaming(body):
+                step.set(cache="bypass")
+                return self._send(provider, perform, inspect, close, transport_errors)
+
+            key = request_key(method, url, body, credential)
+            cacheable = self.cache is not None and (
+                self.cache_mode == "all" or is_deterministic(body)
+            )
+            if cacheable:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self._count(provider, "cache_hits")
+                    step.set(cache="hit", status=cached[0], response_bytes=len(cached[2]))
+                    return build(cached)
+
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+            if not leader:
+                self._count(provider, "coalesced")
+                step.set(cache="coalesced")
+                return build(flight.wait())
+
+            try:
+                response = self._send(provider, perform, inspect, close, transport_errors)
+                status, headers = inspect(response)
+                flight.result = (status, _clean_headers(headers), read(response))
+            except BaseException as exc:
+                flight.error = exc
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+
+            step.set(
+                cache="miss" if cacheable else "off",
+                status=flight.result[0],
+                response_bytes=len(flight.result[2]),
+            )
+            if cacheable and flight.result[0] == 200:
+                self.cache.put(key, provider, flight.result)
+            return build(flight.result)
+
+
+class GatewayTransport(httpx.BaseTransport):
+    """
+    httpx transport sending requests through the gateway over pooled connections.
+    """
+
+    def __init__(
+        self,
+        gateway: LLMGateway,
+        max_connections: int = 50,
+        max_keepalive_connections: int = 20,
+    ):
+        self.gateway = gateway
+        self.transport = httpx.HTTPTransport(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            )
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        def read(response: httpx.Response) -> bytes:
+            try:
+                return response.read()
+            finally:
+                response.close()
+
+        return self.gateway.handle(
+            request.method,
+            str(request.url),
+            request.read(),
+            perform=lambda: self.transport.handle_request(request),
+            inspect=lambda response: (
+                response.status_code,
+                {name.lower(): value for name, value in response.headers.items()},
+            ),
+            read=read,
+            close=lambda response: response.close(),
+            build=lambda result: httpx.Response(
+                result[0], headers=result[1], content=result[2], request=request
+            ),
+            transport_errors=(httpx.TransportError,),
+            credential=credential_hash(request.headers),
+        )
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+def _requests_adapter_class():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+
+    class GatewayAdapter(HTTPAdapter):
+        """
+        requests adapter sending requests through the gateway over pooled connections.
+        """
+
+        def __init__(self, gateway: LLMGateway, pool_maxsize: int = 50):
+            super().__init__(pool_connections=10, pool_maxsize=pool_maxsize)
+            self.gateway = gateway
+
+        def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+            def build(result: Result) -> requests.Response:
+                response = requests.Response()
+                response.status_code = result[0]
+                response.headers = CaseInsensitiveDict(result[1])
+                response._content = result[2]
+                # Streaming readers (iter_lines) are served from the buffered body
+                response._content_consumed = True
+                response.encoding = get_encoding_from_headers(response.headers)
+                response.url = request.url
+                response.request = request
+                response.connection = self
+                return response
+
+            body = request.body or b""
+            return self.gateway.handle(
+                request.method,
+                request.url,
+                body.encode() if isinstance(body, str) else body,
+                perform=lambda: super(GatewayAdapter, self).send(
+                    request, stream, timeout, verify, cert, proxies
+                ),
+                inspect=lambda response: (
+                    response.status_code,
+                    {name.lower(): value for name, value in response.headers.items()},
+                ),
+                read=lambda response: response.content,
+                close=lambda response: response.close(),
+                build=build,
+                transport_errors=(requests.ConnectionError, requests.Timeout),
+                credential=credential_hash(request.headers),
+            )
+
+    return GatewayAdapter
+
+
+_gateway: Optional[LLMGateway] = None
+_http_client: Optional[httpx.Client] = None
+_huggingface_configured = False
+_init_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """
+    Returns the gateway of the process, configured from the environment.
+
+    Returns:
+        - The LLM gateway.
+    """
+    global _gateway
+    with _init_lock:
+        if _gateway is None:
+            _gateway = LLMGateway(
+                cache=CompletionCache(
+                    cache_dir("llm_gateway") / "responses.sqlite",
+                    ttl=float(os.getenv("LLM_GATEWAY_CACHE_TTL", str(7 * 24 * 3600))),
+                ),
+                cache_mode=os.getenv("LLM_GATEWAY_CACHE", "deterministic"),
+                mock=os.getenv("LLM_GATEWAY_PROVIDER") == "mock",
+                mock_latency=float(os.getenv("LLM_GATEWAY_MOCK_LATENCY", "0")),
+                mock_seed=int(os.getenv("LLM_GATEWAY_MOCK_SEED", "0")),
+                max_retries=int(os.getenv("LLM_GATEWAY_MAX_RETRIES", "5")),
+            )
+        return _gateway
+
+
+def http_client() -> httpx.Client:
+    """
+    Returns the httpx client of the process, for the OpenAI SDK and LangChain models.
+
+    Clients built on it should not retry themselves (``max_retries=0``), the
+    gateway already does.
+
+    Returns:
+        - The shared httpx client.
+    """
+    global _http_client
+    gateway = get_gateway()
+    with _init_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(
+                transport=GatewayTransport(gateway),
+                timeout=httpx.Timeout(600.0, connect=10.0),
+            )
+        return _http_client
+
+
+def requests_session():
+    """
+    Creates a requests session sending every request through the gateway.
+
+    Returns:
+        - The session.
+    """
+    import requests
+
+    session = requests.Session()
+    adapter = _requests_adapter_class()(get_gateway())
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def configure_huggingface() -> None:
+    """
+    Sends the requests of the Hugging Face Hub client (``HuggingFaceEndpoint``,
+    ``HuggingFaceHubEmbeddings``) through the gateway.
+
+    Safe to call on every Streamlit rerun: the backend is only set once, so
+    the pooled sessions of the Hub client are kept.
+    """
+    global _huggingface_configured
+    from huggingface_hub import configure_http_backend
+
+    with _init_lock:
+        if not _huggingface_configured:
+            configure_http_backend(backend_factory=requests_session)
+            _huggingface_configured = True
+
+
+def openai_clients() -> Tuple[Any, Any]:
+    """
+    Creates OpenAI SDK clients for LangChain models and embeddings.
+
+    LangChain's OpenAI classes reject a sync ``http_client`` for their async
+    client, so they are given prebuilt clients instead (``client=`` and
+    ``async_client=``). The apps call the models synchronously; async calls
+    bypass the gateway.
+
+    Returns:
+        - The sync client, on the gateway and without SDK retries, and the async client.
+    """
+    import openai
+
+    return openai.OpenAI(http_client=http_client(), max_retries=0), openai.AsyncOpenAI()
+
+
+def chat_openai(**kwargs: Any):
+    """
+    Creates a LangChain OpenAI chat model on the gateway.
+
+    A new model is returned on each call, so callbacks added to one agent's
+    model do not leak to the others, while all share connections and limits.
+
+    Args:
+        - kwargs: Extra ``ChatOpenAI`` parameters, e.g. ``temperature``.
+
+    Returns:
+        - The chat model, for ``OPENAI_MODEL_NAME`` unless ``model`` is given.
+    """
+    from langchain_openai import ChatOpenAI
+
+    client, async_client = openai_clients()
+    kwargs.setdefault("model", os.getenv("OPENAI_MODEL_NAME", "gpt-3.5-turbo"))
+    return ChatOpenAI(
+        client=client.chat.completions, async_client=async_client.chat.completions, **kwargs
+    )
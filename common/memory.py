@@ -0,0 +1,479 @@
+"""
+Persistent, bounded memory backend for crewAI crews.
+
+With ``memory=True`` crewAI 0.30 stores short-term and entity memory in Chroma
+collections that are reset on every run, and long-term memory in one SQLite
+file shared by every crew. ``attach_memory`` swaps the three storages for a
+``MemoryStore``: a single SQLite database split into namespaces, e.g. one per
+customer or lead, so what a crew learnt in a previous run with the same
+customer becomes context for the next one and nothing leaks between customers.
+
+Each namespace keeps at most ``max_items`` entries per kind, and at most
+``max_namespaces`` namespaces are kept; the least recently used go first.
+The vectors of a namespace are loaded once into a normalized numpy matrix, so a
+lookup is one query embedding (cached) and one matrix-vector product. Every
+lookup and write is timed, so the metrics show whether memory pays for itself.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+from crewai.memory import EntityMemory, LongTermMemory, ShortTermMemory
+from crewai.memory.memory import Memory
+from crewai.memory.storage.interface import Storage
+from langchain_core.embeddings import Embeddings
+
+from common import cache_dir
+from common.embeddings import EmbeddingCache, create_openai_embeddings
+from common.tracing import span
+
+KINDS = ("short_term", "entities", "long_term")
+
+MAX_ITEMS = int(os.getenv("CREW_MEMORY_MAX_ITEMS", "200"))
+MAX_NAMESPACES = int(os.getenv("CREW_MEMORY_MAX_NAMESPACES", "1000"))
+EMBEDDING_MODEL = os.getenv("CREW_MEMORY_EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Number of namespace matrices kept in process memory
+_MATRIX_CACHE_SIZE = 64
+
+
+class MemoryMetrics:
+    """
+    Latency and usefulness counters of a memory store.
+    """
+
+    def __init__(self, window: int = 1000):
+        """
+        Initializes empty counters.
+
+        Args:
+            - window: The number of latest samples kept per operation for the percentiles.
+        """
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._counts: Dict[str, int] = defaultdict(int)
+        self.hits = 0
+        self.misses = 0
+        self.context_chars = 0
+
+    def record(self, operation: str, seconds: float) -> None:
+        """
+        Records the duration of an operation.
+
+        Args:
+            - operation: The operation name, e.g. "search" or "save".
+            - seconds: The duration in seconds.
+        """
+        with self._lock:
+            self._samples[operation].append(seconds)
+            self._counts[operation] += 1
+
+    def record_search(self, results: List[str]) -> None:
+        """
+        Records whether a lookup found something, and how much context it returned.
+
+        Args:
+            - results: The texts returned by the lookup.
+        """
+        with self._lock:
+            if results:
+                self.hits += 1
+                self.context_chars += sum(len(text) for text in results)
+            else:
+                self.misses += 1
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarizes the counters.
+
+        Returns:
+            - The count, p50 and p95 in milliseconds per operation, the hit rate
+              and the number of context characters returned by lookups.
+        """
+        with self._lock:
+            summary: Dict[str, Any] = {}
+            for operation, samples in self._samples.items():
+                ordered = sorted(samples)
+                summary[operation] = {
+                    "count": self._counts[operation],
+                    "p50_ms": round(1000 * ordered[int(0.5 * (len(ordered) - 1))], 2),
+                    "p95_ms": round(1000 * ordered[int(0.95 * (len(ordered) - 1))], 2),
+                }
+            lookups = self.hits + self.misses
+            summary["hit_rate"] = round(self.hits / lookups, 3) if lookups else None
+            summary["context_chars"] = self.context_chars
+            return summary
+
+
+class MemoryStore:
+    """
+    SQLite store of crew memories with per-namespace vector search.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        embeddings: Embeddings,
+        max_items: int = MAX_ITEMS,
+        max_namespaces: int = MAX_NAMESPACES,
+    ):
+        """
+        Opens (and creates if needed) the memory database.
+
+        Args:
+            - path: The path of the SQLite database file.
+            - embeddings: The embeddings used for memories and lookups.
+            - max_items: The maximum number of entries per namespace and kind.
+            - max_namespaces: The maximum number of namespaces.
+        """
+        self.embeddings = embeddings
+        self.max_items = max_items
+        self.max_namespaces = max_namespaces
+        self.metrics = MemoryMetrics()
+        self._lock = threading.Lock()
+        self._matrices: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]]" = (
+            OrderedDict()
+        )
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS memories ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL, "
+            "kind TEXT NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL, "
+            "score REAL, vector BLOB NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS memories_namespace "
+            "ON memories (namespace, kind, last_used)"
+        )
+        self._conn.commit()
+        self._data_version = self._read_data_version()
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _invalidate(self, namespace: Optional[str] = None) -> None:
+        for key in list(self._matrices):
+            if namespace is None or key[0] == namespace:
+                del self._matrices[key]
+
+    def _matrix(self, namespace: str, kind: str) -> Tuple[np.ndarray, np.ndarray]:
+        # Another connection wrote to the database, the cached matrices may be stale
+        version = self._read_data_version()
+        if version != self._data_version:
+            self._data_version = version
+            self._invalidate()
+
+        key = (namespace, kind)
+        if key in self._matrices:
+            self._matrices.move_to_end(key)
+            return self._matrices[key]
+        rows = self._conn.execute(
+            "SELECT id, vector FROM memories WHERE namespace = ? AND kind = ?",
+            (namespace, kind),
+        ).fetchall()
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        if rows:
+            matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        self._matrices[key] = (ids, matrix)
+        if len(self._matrices) > _MATRIX_CACHE_SIZE:
+            self._matrices.popitem(last=False)
+        return ids, matrix
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def save(
+        self,
+        namespace: str,
+        kind: str,
+        text: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        score: Optional[float] = None,
+    ) -> None:
+        """
+        Stores a memory, evicting the least recently used ones over the limits.
+
+        Args:
+            - namespace: The namespace, e.g. the customer.
+            - kind: One of ``KINDS``.
+            - text: The text that is embedded and returned by lookups.
+            - metadata: Extra data returned with the text.
+            - score: The quality score of a long-term memory.
+        """
+        start = time.perf_counter()
+        vector = self._normalize(self.embeddings.embed_query(text))
+        self.metrics.record("embed", time.perf_counter() - start)
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO memories (namespace, kind, text, metadata, score, vector, "
+                "created, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    namespace,
+                    kind,
+                    text,
+                    json.dumps(metadata or {}, default=str),
+                    score,
+                    vector.tobytes(),
+                    now,
+                    now,
+                ),
+            )
+            self._conn.execute(
+                "DELETE FROM memories WHERE id IN (SELECT id FROM memories "
+                "WHERE namespace = ? AND kind = ? ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (namespace, kind, self.max_items),
+            )
+            evicted = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT namespace FROM memories GROUP BY namespace "
+                    "ORDER BY MAX(last_used) DESC LIMIT -1 OFFSET ?",
+                    (self.max_namespaces,),
+                )
+            ]
+            for name in evicted:
+                self._conn.execute("DELETE FROM memories WHERE namespace = ?", (name,))
+                self._invalidate(name)
+            self._conn.commit()
+            self._invalidate(namespace)
+        self.metrics.record("save", time.perf_counter() - start)
+
+    def search(
+        self,
+        namespace: str,
+        kind: str,
+        query: str,
+        limit: int = 3,
+        score_threshold: float = 0.0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Finds the memories of a namespace most similar to a query.
+
+        Args:
+            - namespace: The namespace, e.g. the customer.
+            - kind: One of ``KINDS``.
+            - query: The lookup text.
+            - limit: The maximum number of memories.
+            - score_threshold: The minimum cosine similarity.
+
+        Returns:
+            - The memories, best first, with their text, metadata, quality score,
+              creation time and similarity.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            ids, matrix = self._matrix(namespace, kind)
+        if len(ids) == 0:
+            # Nothing to compare with, skip the query embedding
+            self.metrics.record("search", time.perf_counter() - start)
+            self.metrics.record_search([])
+            return []
+
+        similarities = matrix @ self._normalize(self.embeddings.embed_query(query))
+        best = np.argsort(-similarities)[:limit]
+        best = [i for i in best if similarities[i] >= score_threshold]
+        results: List[Dict[str, Any]] = []
+        if best:
+            with self._lock:
+                placeholders = ", ".join("?" * len(best))
+                rows = {
+                    row[0]: row[1:]
+                    for row in self._conn.execute(
+                        f"SELECT id, text, metadata, score, created FROM memories "
+                        f"WHERE id IN ({placeholders})",
+                        [int(ids[i]) for i in best],
+                    )
+                }
+                self._conn.execute(
+                    f"UPDATE memories SET last_used = ? WHERE id IN ({placeholders})",
+                    [time.time(), *(int(ids[i]) for i in best)],
+                )
+                self._conn.commit()
+            for i in best:
+                # Evicted by another thread since the matrix was read
+                if int(ids[i]) not in rows:
+                    continue
+                text, metadata, score, created = rows[int(ids[i])]
+                results.append(
+                    {
+                        "text": text,
+                        "metadata": json.loads(metadata),
+                        "score": score,
+                        "created": created,
+                        "similarity": float(similarities[i]),
+                    }
+                )
+        self.metrics.record("search", time.perf_counter() - start)
+        self.metrics.record_search([result["text"] for result in results])
+        return results
+
+    def clear(self, namespace: str) -> None:
+        """
+        Forgets every memory of a namespace.
+
+        Args:
+            - namespace: The namespace.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM memories WHERE namespace = ?", (namespace,))
+            self._conn.commit()
+            self._invalidate(namespace)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the size of the store and its latency metrics.
+
+        Returns:
+            - The number of namespaces and memories, and the metrics summary.
+        """
+        with self._lock:
+            namespaces, memories = self._conn.execute(
+                "SELECT COUNT(DISTINCT namespace), COUNT(*) FROM memories"
+            ).fetchone()
+        return {"namespaces": namespaces, "memories": memories, **self.metrics.summary()}
+
+
+class _Result(dict):
+    """
+    Lookup result in the shape crewAI expects from its RAG storage.
+    """
+
+    # crewAI renders short-term results with "- {result}", show the text, not the dict
+    def __str__(self) -> str:
+        return self["context"]
+
+
+class NamespacedStorage(Storage):
+    """
+    crewAI short-term or entity storage backed by one namespace of a store.
+    """
+
+    def __init__(self, store: MemoryStore, namespace: str, kind: str):
+        self.store = store
+        self.namespace = namespace
+        self.kind = kind
+
+    def save(self, value: Any, metadata: Dict[str, Any]) -> None:  # type: ignore
+        self.store.save(self.namespace, self.kind, str(value), metadata)
+
+    def search(  # type: ignore
+        self,
+        query: str,
+        limit: int = 3,
+        filter: Optional[dict] = None,
+        score_threshold: float = 0.35,
+    ) -> List[Any]:
+        with span(f"memory:{self.kind}", "memory", namespace=self.namespace) as step:
+            results = self.store.search(self.namespace, self.kind, query, limit, score_threshold)
+            step.set(results=len(results), output_chars=sum(len(r["text"]) for r in results))
+        return [
+            _Result(
+                context=result["text"],
+                metadata={**result["metadata"], "score": result["similarity"]},
+            )
+            for result in results
+        ]
+
+
+class NamespacedLongTermStorage(Storage):
+    """
+    crewAI long-term storage backed by one namespace of a store.
+
+    crewAI looks up long-term memories by exact task description; here they are
+    found by similarity, so suggestions carry over between different inquiries
+    of the same customer.
+    """
+
+    def __init__(self, store: MemoryStore, namespace: str):
+        self.store = store
+        self.namespace = namespace
+
+    def save(  # type: ignore
+        self, task_description: str, score: float, metadata: Dict[str, Any], datetime: str
+    ) -> None:
+        self.store.save(
+            self.namespace,
+            "long_term",
+            task_description,
+            {**metadata, "datetime": datetime},
+            score=score,
+        )
+
+    def load(self, task: str, latest_n: int) -> Optional[List[Dict[str, Any]]]:
+        results = self.store.search(self.namespace, "long_term", task, latest_n, 0.5)
+        if not results:
+            return None
+        return [
+            {
+                "metadata": result["metadata"],
+                "datetime": result["metadata"].get("datetime"),
+                "score": result["score"],
+            }
+            for result in results
+        ]
+
+
+class _ShortTermMemory(ShortTermMemory):
+    def __init__(self, storage: Storage):
+        # Skip the Chroma storage created by the parent class
+        Memory.__init__(self, storage)
+
+
+class _EntityMemory(EntityMemory):
+    def __init__(self, storage: Storage):
+        Memory.__init__(self, storage)
+
+
+class _LongTermMemory(LongTermMemory):
+    def __init__(self, storage: Storage):
+        Memory.__init__(self, storage)
+
+
+def attach_memory(crew: Any, store: MemoryStore, namespace: str) -> Any:
+    """
+    Enables memory on a crew created with ``memory=False``, backed by a store namespace.
+
+    Args:
+        - crew: The crewAI crew.
+        - store: The memory store.
+        - namespace: The namespace of the run, e.g. ``customer:<name>``.
+
+    Returns:
+        - The crew.
+    """
+    crew.memory = True
+    crew._short_term_memory = _ShortTermMemory(NamespacedStorage(store, namespace, "short_term"))
+    crew._entity_memory = _EntityMemory(NamespacedStorage(store, namespace, "entities"))
+    crew._long_term_memory = _LongTermMemory(NamespacedLongTermStorage(store, namespace))
+    return crew
+
+
+def create_memory_store(path: Optional[Path] = None) -> MemoryStore:
+    """
+    Creates the memory store shared by the crews of an app.
+
+    Args:
+        - path: The path of the database, ``crew_memory/memory.sqlite`` under the cache root by default.
+
+    Returns:
+        - The memory store.
+    """
+    embeddings = create_openai_embeddings(
+        EMBEDDING_MODEL, EmbeddingCache(cache_dir("embeddings") / "vectors.sqlite")
+    )
+    return MemoryStore(path or cache_dir("crew_memory") / "memory.sqlite", embeddings)
@@ -0,0 +1,104 @@
+"""
+Process-wide rate limiting of LLM calls.
+
+``TokenBucket`` is a thread-safe token bucket. ``RateLimitCallbackHandler``
+takes a token from it when an LLM call starts; LangChain runs synchronous
+callbacks inline, so the call itself waits until the bucket allows it. Sharing
+one bucket between every agent of every concurrent crew caps the overall
+request rate.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at a fixed rate.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Initializes a full bucket.
+
+        Args:
+            - rate: The number of tokens added per second.
+            - capacity: The maximum number of tokens, i.e. the allowed burst, ``rate`` by default.
+        """
+        if rate <= 0:
+            raise ValueError("The rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    @classmethod
+    def per_minute(cls, requests: float, burst: Optional[float] = None) -> "TokenBucket":
+        """
+        Creates a bucket allowing a number of requests per minute.
+
+        Args:
+            - requests: The number of requests per minute.
+            - burst: The number of requests allowed at once, 1 by default.
+
+        Returns:
+            - The token bucket.
+        """
+        return cls(requests / 60.0, burst if burst is not None else 1.0)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """
+        Takes tokens from the bucket, waiting until enough are available.
+
+        Args:
+            - tokens: The number of tokens to take.
+            - timeout: The maximum number of seconds to wait, None to wait forever.
+
+        Returns:
+            - True if the tokens were taken, False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self.waited += time.monotonic() - start
+                    return True
+                delay = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            time.sleep(delay)
+
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler blocking each LLM call until the bucket allows it.
+    """
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+
+    def on_llm_start(
+        self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any
+    ) -> None:
+        self.bucket.acquire()
+
+    def on_chat_model_start(
+        self, serialized: Dict[str, Any], messages: List[List[Any]], **kwargs: Any
+    ) -> None:
+        self.bucket.acquire()
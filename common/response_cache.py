@@ -0,0 +1,317 @@
+"""
+Cache of question answering responses with an optional semantic tier.
+
+Answers are keyed by the document hash, the normalized question and the model
+parameters. Exact hits are served from an in-process LRU, then from SQLite. When
+a similarity threshold is configured, a question whose embedding is close enough
+to an already answered question on the same document reuses that answer. The
+semantic tier searches the SQLite entries, or the in-memory entries when the
+cache has no database file. numpy is only imported by the semantic tier, so the
+apps can create the cache and show its stats at first paint without loading it.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from common.tracing import span
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalizes a question so trivially different phrasings share a cache entry.
+
+    Args:
+        - question: The question text.
+
+    Returns:
+        - The lower-cased question without redundant whitespace or trailing punctuation.
+    """
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+
+class ResponseCache:
+    """
+    Two-tier (memory, SQLite) exact cache plus an optional semantic lookup.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_entries: int = 10_000,
+        max_memory_entries: int = 256,
+        ttl: float = 7 * 24 * 3600,
+        similarity_threshold: Optional[float] = None,
+    ):
+        """
+        Initializes the cache.
+
+        Args:
+            - path: The SQLite database file, or None to keep the cache in memory only.
+            - max_entries: The maximum number of entries kept on disk.
+            - max_memory_entries: The maximum number of entries kept in memory.
+            - ttl: The number of seconds after which an entry expires.
+            - similarity_threshold: The cosine similarity above which a cached answer
+              to a different question is reused, or None to disable the semantic tier.
+        """
+        self.max_entries = max_entries
+        self.max_memory_entries = max_memory_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Key -> (answer, created, scope, embedding or None)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+
+        self._conn = None
+        if path is not None:
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, scope TEXT NOT NULL, answer TEXT NOT NULL, "
+                "embedding BLOB, created REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope)"
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _scope(doc_key: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps([doc_key, params], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def _key(scope: str, question: str) -> str:
+        payload = f"{scope}\0{normalize_question(question)}"
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit and miss counters.
+
+        Returns:
+            - A dictionary with the number of exact hits, semantic hits and misses.
+        """
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+        }
+
+    def get(
+        self,
+        doc_key: str,
+        question: str,
+        params: Dict[str, Any],
+        embed_query: Optional[Callable[[str], List[float]]] = None,
+    ) -> Optional[str]:
+        """
+        Looks up a cached answer.
+
+        Args:
+            - doc_key: The hash of the document the question is about.
+            - question: The question text.
+            - params: The model and chain parameters used to answer.
+            - embed_query: Embeds a question, enabling the semantic tier.
+
+        Returns:
+            - The cached answer, or None on a miss.
+        """
+        return self._lookup(doc_key, question, params, embed_query)[0]
+
+    def _lookup(
+        self,
+        doc_key: str,
+        question: str,
+        params: Dict[str, Any],
+        embed_query: Optional[Callable[[str], List[float]]],
+    ) -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        Looks up a cached answer, embedding the question only if no exact entry matches.
+
+        Args:
+            - doc_key: The hash of the document the question is about.
+            - question: The question text.
+            - params: The model and chain parameters used to answer.
+            - embed_query: Embeds a question, enabling the semantic tier.
+
+        Returns:
+            - The cached answer or None, and the embedding of the question if it was computed.
+        """
+        scope = self._scope(doc_key, params)
+        key = self._key(scope, question)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0], None
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT answer, created FROM responses WHERE key = ? AND created > ?",
+                    (key, now - self.ttl),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE responses SET last_access = ? WHERE key = ?", (now, key)
+                    )
+                    self._conn.commit()
+                    self._remember(key, row[0], row[1], scope)
+                    self.hits += 1
+                    return row[0], None
+
+        vector = None
+        if self.similarity_threshold is not None and embed_query is not None:
+            vector = embed_query(question)
+            answer = self._semantic_get(scope, vector, now)
+            if answer is not None:
+                with self._lock:
+                    self.semantic_hits += 1
+                return answer, vector
+
+        with self._lock:
+            self.misses += 1
+        return None, vector
+
+    def _semantic_get(self, scope: str, vector: List[float], now: float) -> Optional[str]:
+        """
+        Finds the answer of the most similar cached question on the same document.
+
+        Args:
+            - scope: The document and parameter scope.
+            - vector: The embedding of the new question.
+            - now: The current time.
+
+        Returns:
+            - The answer if the best match is above the threshold, else None.
+        """
+        with self._lock:
+            if self._conn is None:
+                rows = [
+                    (answer, embedding)
+                    for answer, created, entry_scope, embedding in self._memory.values()
+                    if entry_scope == scope and embedding is not None
+                    and now - created < self.ttl
+                ]
+            else:
+                rows = self._conn.execute(
+                    "SELECT answer, embedding FROM responses "
+                    "WHERE scope = ? AND embedding IS NOT NULL AND created > ?",
+                    (scope, now - self.ttl),
+                ).fetchall()
+        if not rows:
+            return None
+
+        import numpy as np
+
+        matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+        query = np.asarray(vector, dtype=np.float32)
+        similarities = matrix @ query / (
+            np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12
+        )
+        best = int(np.argmax(similarities))
+        if similarities[best] >= self.similarity_threshold:
+            return rows[best][0]
+        return None
+
+    def put(
+        self,
+        doc_key: str,
+        question: str,
+        params: Dict[str, Any],
+        answer: str,
+        embed_query: Optional[Callable[[str], List[float]]] = None,
+        vector: Optional[List[float]] = None,
+    ) -> None:
+        """
+        Stores an answer.
+
+        Args:
+            - doc_key: The hash of the document the question is about.
+            - question: The question text.
+            - params: The model and chain parameters used to answer.
+            - answer: The answer to store.
+            - embed_query: Embeds a question, enabling the semantic tier.
+            - vector: The embedding of the question if already computed, to skip embed_query.
+        """
+        scope = self._scope(doc_key, params)
+        key = self._key(scope, question)
+        now = time.time()
+
+        embedding = None
+        if self.similarity_threshold is not None:
+            if vector is None and embed_query is not None:
+                vector = embed_query(question)
+            if vector is not None:
+                import numpy as np
+
+                embedding = np.asarray(vector, dtype=np.float32).tobytes()
+
+        with self._lock:
+            self._remember(key, answer, now, scope, embedding)
+            if self._conn is None:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, scope, answer, embedding, created, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, scope, answer, embedding, now, now),
+            )
+            # Drop expired entries, then the least recently used ones over the limit
+            self._conn.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                "ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def _remember(
+        self, key: str, answer: str, created: float, scope: str, embedding: Optional[bytes] = None
+    ) -> None:
+        self._memory[key] = (answer, created, scope, embedding)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_or_compute(
+        self,
+        doc_key: str,
+        question: str,
+        params: Dict[str, Any],
+        compute: Callable[[], str],
+        embed_query: Optional[Callable[[str], List[float]]] = None,
+    ) -> str:
+        """
+        Returns the cached answer, computing and storing it on a miss.
+
+        Args:
+            - doc_key: The hash of the document the question is about.
+            - question: The question text.
+            - params: The model and chain parameters used to answer.
+            - compute: Produces the answer on a cache miss.
+            - embed_query: Embeds a question, enabling the semantic tier.
+
+        Returns:
+            - The answer.
+        """
+        with span("response_cache", "cache") as step:
+            answer, vector = self._lookup(doc_key, question, params, embed_query)
+            step.set(cache="miss" if answer is None else "hit")
+        if answer is None:
+            answer = compute()
+            # The question was already embedded by the semantic lookup, if at all
+            self.put(doc_key, question, params, answer, embed_query, vector=vector)
+        return answer
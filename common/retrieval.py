@@ -0,0 +1,354 @@
+"""
+Pluggable vector retrieval backends with tunable recall.
+
+Three index types share the same ``search`` interface:
+
+- ``ExactIndex``: NumPy brute force, exact and fastest for small corpora.
+- ``IvfIndex``: inverted file over k-means cells, ``nprobe`` trades recall for speed.
+- ``HnswIndex``: hnswlib graph index, ``ef`` trades recall for speed.
+
+``build_index`` picks one based on the number of chunks, and
+``VectorIndexRetriever`` exposes any of them as a LangChain retriever.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the positions of the k highest scores, best first.
+
+    Args:
+        - scores: The scores.
+        - k: The number of positions to return.
+
+    Returns:
+        - The positions of the best scores.
+    """
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class ExactIndex:
+    """
+    Brute-force cosine similarity search.
+    """
+
+    def __init__(self, vectors: np.ndarray):
+        """
+        Initializes the index.
+
+        Args:
+            - vectors: The corpus vectors, one per row.
+        """
+        self.vectors = _normalize(vectors)
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the nearest corpus vectors of a query.
+
+        Args:
+            - query: The query vector.
+            - k: The number of neighbours to return.
+
+        Returns:
+            - The ids and cosine similarities of the neighbours, best first.
+        """
+        scores = self.vectors @ _normalize(query)
+        ids = _top_k(scores, k)
+        return ids, scores[ids]
+
+
+class IvfIndex:
+    """
+    Inverted file index: vectors are bucketed by their nearest k-means centroid
+    and only the ``nprobe`` closest buckets are scanned at query time.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        iterations: int = 10,
+        seed: int = 0,
+    ):
+        """
+        Builds the index.
+
+        Args:
+            - vectors: The corpus vectors, one per row.
+            - nlist: The number of buckets, about sqrt(n) by default.
+            - nprobe: The number of buckets scanned per query.
+            - iterations: The number of k-means iterations.
+            - seed: The seed of the k-means initialization.
+        """
+        self.vectors = _normalize(vectors)
+        self.nprobe = nprobe
+        n = len(self.vectors)
+        nlist = max(1, min(nlist or int(np.sqrt(n)), n))
+
+        # Train the centroids on a sample, spherical k-means on unit vectors
+        rng = np.random.default_rng(seed)
+        sample = self.vectors[rng.choice(n, size=min(n, 64 * nlist), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for cell in range(nlist):
+                members = sample[assignment == cell]
+                if len(members):
+                    centroids[cell] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        self.centroids = centroids
+
+        # Assign the whole corpus in batches to bound the memory of the score matrix
+        assignment = np.concatenate(
+            [
+                np.argmax(self.vectors[start : start + 65536] @ centroids.T, axis=1)
+                for start in range(0, n, 65536)
+            ]
+        )
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        self.lists = [order[bounds[i] : bounds[i + 1]] for i in range(nlist)]
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the approximate nearest corpus vectors of a query.
+
+        Args:
+            - query: The query vector.
+            - k: The number of neighbours to return.
+
+        Returns:
+            - The ids and cosine similarities of the neighbours, best first.
+        """
+        query = _normalize(query)
+        cells = _top_k(self.centroids @ query, self.nprobe)
+        candidates = np.concatenate([self.lists[cell] for cell in cells])
+        scores = self.vectors[candidates] @ query
+        best = _top_k(scores, k)
+        return candidates[best], scores[best]
+
+
+class HnswIndex:
+    """
+    Hierarchical navigable small world graph index backed by hnswlib.
+    """
+
+    def __init__(
+        self, vectors: np.ndarray, ef: int = 64, m: int = 16, ef_construction: int = 200
+    ):
+        """
+        Builds the index.
+
+        Args:
+            - vectors: The corpus vectors, one per row.
+            - ef: The size of the candidate list at query time.
+            - m: The number of graph links per node.
+            - ef_construction: The size of the candidate list while building.
+        """
+        import hnswlib
+
+        vectors = _normalize(vectors)
+        self.index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        self.index.init_index(
+            max_elements=len(vectors), ef_construction=ef_construction, M=m
+        )
+        self.index.add_items(vectors, np.arange(len(vectors)))
+        self.ef = ef
+
+    @property
+    def ef(self) -> int:
+        """
+        Returns the size of the candidate list at query time.
+        """
+        return self._ef
+
+    @ef.setter
+    def ef(self, value: int) -> None:
+        self._ef = value
+        self.index.set_ef(value)
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the approximate nearest corpus vectors of a query.
+
+        Args:
+            - query: The query vector.
+            - k: The number of neighbours to return.
+
+        Returns:
+            - The ids and cosine similarities of the neighbours, best first.
+        """
+        k = min(k, self.index.get_current_count())
+        # hnswlib needs ef >= k
+        if self._ef < k:
+            self.index.set_ef(k)
+        labels, distances = self.index.knn_query(_normalize(query), k=k)
+        if self._ef < k:
+            self.index.set_ef(self._ef)
+        # Inner product distance is 1 - similarity
+        return labels[0].astype(np.int64), 1 - distances[0]
+
+
+def _has_hnswlib() -> bool:
+    try:
+        import hnswlib  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@dataclass
+class RetrieverSettings:
+    """
+    Knobs of the retrieval backend.
+    """
+
+    # "auto", "exact", "ivf" or "hnsw"
+    backend: str = "auto"
+    k: int = 4
+    # Corpora up to this many chunks are searched exactly by the "auto" backend
+    exact_max_chunks: int = 20_000
+    hnsw_ef: int = 64
+    hnsw_m: int = 16
+    ivf_nprobe: int = 8
+
+    @classmethod
+    def from_env(cls) -> "RetrieverSettings":
+        """
+        Reads the settings from ``RETRIEVER_*`` environment variables.
+
+        Returns:
+            - The retriever settings.
+        """
+        defaults = cls()
+        return cls(
+            backend=os.getenv("RETRIEVER_BACKEND", defaults.backend),
+            k=int(os.getenv("RETRIEVER_K", defaults.k)),
+            exact_max_chunks=int(
+                os.getenv("RETRIEVER_EXACT_MAX_CHUNKS", defaults.exact_max_chunks)
+            ),
+            hnsw_ef=int(os.getenv("RETRIEVER_HNSW_EF", defaults.hnsw_ef)),
+            hnsw_m=int(os.getenv("RETRIEVER_HNSW_M", defaults.hnsw_m)),
+            ivf_nprobe=int(os.getenv("RETRIEVER_IVF_NPROBE", defaults.ivf_nprobe)),
+        )
+
+
+def build_index(vectors: np.ndarray, settings: RetrieverSettings) -> Any:
+    """
+    Builds the index selected by the settings.
+
+    With the "auto" backend small corpora get an exact index and large ones an
+    HNSW index, or an IVF index when hnswlib is not installed.
+
+    Args:
+        - vectors: The corpus vectors, one per row.
+        - settings: The retriever settings.
+
+    Returns:
+        - The built index.
+    """
+    backend = settings.backend
+    if backend == "auto":
+        if len(vectors) <= settings.exact_max_chunks:
+            backend = "exact"
+        else:
+            backend = "hnsw" if _has_hnswlib() else "ivf"
+
+    if backend == "exact":
+        return ExactIndex(vectors)
+    if backend == "ivf":
+        return IvfIndex(vectors, nprobe=settings.ivf_nprobe)
+    if backend == "hnsw":
+        return HnswIndex(vectors, ef=settings.hnsw_ef, m=settings.hnsw_m)
+    raise ValueError(f"Unknown retriever backend: {backend}")
+
+
+class VectorIndexRetriever(BaseRetriever):
+    """
+    LangChain retriever searching documents through one of the indexes above.
+    """
+
+    index: Any
+    documents: List[Document]
+    embeddings: Embeddings
+    k: int = 4
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        ids, _ = self.index.search(np.asarray(self.embeddings.embed_query(query)), self.k)
+        return [self.documents[i] for i in ids]
+
+
+def build_retriever(
+    documents: List[Document],
+    embeddings: Embeddings,
+    settings: Optional[RetrieverSettings] = None,
+    vectors: Optional[np.ndarray] = None,
+) -> VectorIndexRetriever:
+    """
+    Embeds documents (unless vectors are given) and builds a retriever over them.
+
+    Args:
+        - documents: The documents to search.
+        - embeddings: The embeddings used for the documents and the queries.
+        - settings: The retriever settings, read from the environment by default.
+        - vectors: Precomputed document vectors, one row per document.
+
+    Returns:
+        - The retriever.
+    """
+    settings = settings or RetrieverSettings.from_env()
+    if vectors is None:
+        vectors = embeddings.embed_documents([doc.page_content for doc in documents])
+    index = build_index(np.asarray(vectors, dtype=np.float32), settings)
+    return VectorIndexRetriever(
+        index=index, documents=documents, embeddings=embeddings, k=settings.k
+    )
+
+
+def retriever_from_chroma(
+    db: Any, embeddings: Embeddings, settings: Optional[RetrieverSettings] = None
+) -> VectorIndexRetriever:
+    """
+    Builds a retriever over the documents and vectors stored in a Chroma store.
+
+    Args:
+        - db: The LangChain Chroma vectorstore.
+        - embeddings: The embeddings used for the queries.
+        - settings: The retriever settings, read from the environment by default.
+
+    Returns:
+        - The retriever.
+    """
+    data = db.get(include=["embeddings", "documents", "metadatas"])
+    documents = [
+        Document(page_content=text, metadata=metadata or {})
+        for text, metadata in zip(data["documents"], data["metadatas"])
+    ]
+    return build_retriever(
+        documents, embeddings, settings, vectors=np.asarray(data["embeddings"])
+    )
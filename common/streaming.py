@@ -0,0 +1,178 @@
+"""
+Streams LLM tokens and crew task outputs into Streamlit as they are produced.
+
+The blocking chain or crew runs in a worker thread. LangChain callbacks (for
+tokens) or crewAI task callbacks (for finished tasks) push events through a
+queue, and the Streamlit script thread drains it to update the page
+incrementally. Time to first token/task and total time are measured.
+"""
+
+import contextvars
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx
+
+from common.tracing import current_trace
+
+_TASK = "task"
+_DONE = "done"
+_ERROR = "error"
+
+# Cursor appended to partial output while it is still streaming
+_CURSOR = "▌"
+
+
+@dataclass
+class StreamResult:
+    """
+    Final output of a streamed run and its latency figures.
+    """
+
+    text: str
+    # Seconds until the first token or task output, None if nothing streamed
+    time_to_first: Optional[float]
+    total_time: float
+
+    def caption(self, unit: str = "token") -> str:
+        """
+        Formats the latency figures for display.
+
+        Args:
+            - unit: What was streamed, e.g. "token" or "task".
+
+        Returns:
+            - The formatted latency figures.
+        """
+        first = (
+            f"{self.time_to_first:.2f}s" if self.time_to_first is not None else "n/a"
+        )
+        return f"Time to first {unit}: {first} · total: {self.total_time:.2f}s"
+
+
+def _start_worker(run: Callable[[], Any], events: queue.Queue) -> None:
+    """
+    Runs a function in a daemon thread, posting its result or error to the queue.
+
+    Args:
+        - run: The blocking function to run.
+        - events: The queue receiving the result.
+    """
+
+    def target():
+        try:
+            events.put((_DONE, run()))
+        except Exception as exc:
+            events.put((_ERROR, exc))
+
+    # The worker sees the trace and span of the caller, see common.tracing
+    context = contextvars.copy_context()
+    thread = threading.Thread(target=context.run, args=(target,), daemon=True)
+    # Lets the worker use st.cache_resource and friends of the current session
+    add_script_run_ctx(thread)
+    thread.start()
+
+
+def stream_tokens(
+    run: Callable[[List[Any]], str],
+    placeholder: Any,
+    render: str = "markdown",
+) -> StreamResult:
+    """
+    Runs a chain in the background and renders its tokens as they arrive.
+
+    Within a trace (see ``common.tracing``), the chain also gets the tracing handler.
+
+    Args:
+        - run: Runs the chain with the given callback handlers and returns the answer.
+        - placeholder: The Streamlit placeholder (``st.empty()``) to update.
+        - render: The placeholder method used to render text, e.g. "markdown" or "info".
+
+    Returns:
+        - The final answer and latency figures.
+    """
+    # LangChain is only imported once a chain runs, see common.callbacks
+    from common.callbacks import QueueCallbackHandler
+
+    events: queue.Queue = queue.Queue()
+    handlers: List[Any] = [QueueCallbackHandler(events)]
+    traced = current_trace()
+    if traced is not None:
+        handlers.append(traced.handler())
+    start = time.perf_counter()
+    _start_worker(lambda: run(handlers), events)
+
+    text = ""
+    time_to_first = None
+    while True:
+        kind, payload = events.get()
+        if kind == QueueCallbackHandler.TOKEN:
+            if time_to_first is None:
+                time_to_first = time.perf_counter() - start
+            text += payload
+            getattr(placeholder, render)(text + _CURSOR)
+        elif kind == _ERROR:
+            raise payload
+        else:
+            # The returned answer is authoritative, e.g. when served from a cache
+            answer = str(payload)
+            getattr(placeholder, render)(answer)
+            return StreamResult(answer, time_to_first, time.perf_counter() - start)
+
+
+def _task_text(output: Any) -> str:
+    """
+    Extracts the text of a crewAI task output.
+
+    Args:
+        - output: The task output.
+
+    Returns:
+        - The raw text of the output.
+    """
+    return str(getattr(output, "raw_output", None) or output)
+
+
+def stream_tasks(run: Callable[[Callable[[Any], None]], Any], container: Any) -> StreamResult:
+    """
+    Runs a crew in the background and renders each task output once it is done.
+
+    Args:
+        - run: Runs the crew with the given task callback and returns its result.
+        - container: The Streamlit container receiving one expander per task.
+
+    Returns:
+        - The final crew output and latency figures.
+    """
+    events: queue.Queue = queue.Queue()
+    start = time.perf_counter()
+    _start_worker(lambda: run(lambda output: events.put((_TASK, output))), events)
+
+    status = container.empty()
+    status.caption("Running crew ...")
+    tasks_done = 0
+    time_to_first = None
+    while True:
+        kind, payload = events.get()
+        if kind == _TASK:
+            tasks_done += 1
+            if time_to_first is None:
+                time_to_first = time.perf_counter() - start
+            description = str(getattr(payload, "description", "")).strip().splitlines()
+            title = description[0][:80] if description else ""
+            with container.expander(f"Task {tasks_done} done: {title}"):
+                st.markdown(_task_text(payload))
+            status.caption(f"{tasks_done} task(s) done, running crew ...")
+        elif kind == _ERROR:
+            status.empty()
+            raise payload
+        else:
+            status.empty()
+            return StreamResult(
+                _task_text(payload), time_to_first, time.perf_counter() - start
+            )
+
@@ -0,0 +1,373 @@
+"""
+Shared on-disk cache for crewAI web tools, with record and replay modes.
+
+``cached_tool`` wraps a crewai_tools tool so identical calls (same tool, same
+normalized arguments) are answered from a SQLite store shared by every process
+on the machine. Each tool type has its own TTL. Expired pages fetched by URL
+are revalidated with a conditional request (ETag / Last-Modified) and kept
+when the server answers 304 Not Modified.
+
+``TOOL_CACHE_MODE`` selects the behaviour:
+
+- ``cache`` (default): serve fresh entries, call the tool on a miss.
+- ``record``: always call the tool and store the result.
+- ``replay``: never call a web tool; serve recorded results regardless of age
+  and a stand-in message on a miss, so crews run fully offline.
+- ``off``: call the tool directly.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from crewai_tools import BaseTool
+
+from common import text_hash
+from common.tracing import current_span, span
+
+# Seconds a result stays fresh, per tool class
+DEFAULT_TTLS: Dict[str, float] = {
+    "ScrapeWebsiteTool": 24 * 3600,
+    "WebsiteSearchTool": 24 * 3600,
+    "SerperDevTool": 6 * 3600,
+}
+FALLBACK_TTL = 3600
+
+MODES = ("cache", "record", "replay", "off")
+
+# Tool fields that act as arguments when they are fixed at construction
+_FIXED_ARGUMENTS = ("website_url", "file_path", "directory")
+
+
+def _normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+def normalize_arguments(tool: Any, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalizes the arguments of a tool call so equivalent calls share an entry.
+
+    Whitespace is collapsed, URLs lose their fragment and trailing slash, and
+    arguments fixed on the tool instance are added when not given explicitly.
+
+    Args:
+        - tool: The wrapped tool.
+        - kwargs: The call arguments.
+
+    Returns:
+        - The normalized arguments.
+    """
+    arguments = {
+        name: getattr(tool, name)
+        for name in _FIXED_ARGUMENTS
+        if getattr(tool, name, None) is not None
+    }
+    arguments.update(kwargs)
+    normalized = {}
+    for name, value in arguments.items():
+        if isinstance(value, str):
+            value = re.sub(r"\s+", " ", value).strip()
+            if name.endswith("url"):
+                value = _normalize_url(value)
+        normalized[name] = value
+    return normalized
+
+
+class ToolCache:
+    """
+    SQLite store of tool results, safe to share between processes.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Opens (and creates if needed) the cache database.
+
+        Args:
+            - path: The path of the SQLite database file.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+        # Other processes may hold the write lock briefly, wait for it
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_results ("
+            "key TEXT PRIMARY KEY, tool TEXT NOT NULL, arguments TEXT NOT NULL, "
+            "result TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+            "created REAL NOT NULL, expires REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+        """
+        Builds the cache key of a tool call.
+
+        Args:
+            - tool_name: The name of the tool.
+            - arguments: The normalized call arguments.
+
+        Returns:
+            - The cache key.
+        """
+        return text_hash(json.dumps([tool_name, arguments], sort_keys=True, default=str))
+
+    def get(self, key: str) -> Optional[Tuple[str, Optional[str], Optional[str], float]]:
+        """
+        Looks up an entry, fresh or not.
+
+        Args:
+            - key: The cache key.
+
+        Returns:
+            - The result, ETag, Last-Modified and expiry time, or None.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT result, etag, last_modified, expires FROM tool_results WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+    def put(
+        self,
+        key: str,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        result: str,
+        ttl: float,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        """
+        Stores a tool result.
+
+        Args:
+            - key: The cache key.
+            - tool_name: The name of the tool.
+            - arguments: The normalized call arguments.
+            - result: The tool output.
+            - ttl: The number of seconds the result stays fresh.
+            - etag: The ETag of the fetched page, if any.
+            - last_modified: The Last-Modified header of the fetched page, if any.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tool_results (key, tool, arguments, result, "
+                "etag, last_modified, created, expires) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    tool_name,
+                    json.dumps(arguments, sort_keys=True, default=str),
+                    result,
+                    etag,
+                    last_modified,
+                    now,
+                    now + ttl,
+                ),
+            )
+            self._conn.commit()
+
+    def touch(self, key: str, ttl: float) -> None:
+        """
+        Extends the freshness of an entry after a successful revalidation.
+
+        Args:
+            - key: The cache key.
+            - ttl: The number of seconds the result stays fresh.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tool_results SET expires = ? WHERE key = ?", (time.time() + ttl, key)
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit, miss and revalidation counters of this process.
+
+        Returns:
+            - A dictionary with the counters.
+        """
+        return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated}
+
+
+def _fetch_validators(url: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Reads the cache validators of a page.
+
+    Args:
+        - url: The page URL.
+
+    Returns:
+        - The ETag and Last-Modified headers, None when missing or unreachable.
+    """
+    import requests
+
+    try:
+        response = requests.head(url, timeout=10, allow_redirects=True)
+    except requests.RequestException:
+        return None, None
+    return response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+
+def _is_unchanged(url: str, etag: Optional[str], last_modified: Optional[str]) -> bool:
+    """
+    Asks the server whether a page changed since it was cached.
+
+    Args:
+        - url: The page URL.
+        - etag: The cached ETag.
+        - last_modified: The cached Last-Modified header.
+
+    Returns:
+        - True if the server answered 304 Not Modified.
+    """
+    import requests
+
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    try:
+        # Streamed so a changed page is not downloaded just to be discarded
+        with requests.get(url, headers=headers, timeout=10, stream=True) as response:
+            return response.status_code == 304
+    except requests.RequestException:
+        return False
+
+
+class CachedTool(BaseTool):
+    """
+    crewai_tools tool delegating to another tool through the shared cache.
+    """
+
+    tool: Any
+    cache: Any
+    ttl: float
+    mode: str = "cache"
+
+    def _generate_description(self):
+        # The description is copied from the wrapped tool, already generated
+        pass
+
+    def _run(self, *args: Any, **kwargs: Any) -> Any:
+        """
+        Answers a tool call from the cache, or runs the wrapped tool, as a tracing span.
+
+        Args:
+            - args: Positional arguments of the call.
+            - kwargs: Keyword arguments of the call.
+
+        Returns:
+            - The tool output.
+        """
+        input_chars = len(json.dumps([args, kwargs], default=str))
+        with span(self.name, "tool", input_chars=input_chars) as step:
+            result = self._cached_run(*args, **kwargs)
+            step.set(output_chars=len(str(result)))
+            return result
+
+    def _cached_run(self, *args: Any, **kwargs: Any) -> Any:
+        """
+        Answers a tool call from the cache, or runs the wrapped tool.
+
+        Args:
+            - args: Positional arguments of the call.
+            - kwargs: Keyword arguments of the call.
+
+        Returns:
+            - The tool output.
+        """
+        if self.mode == "off":
+            return self.tool._run(*args, **kwargs)
+
+        arguments = normalize_arguments(self.tool, kwargs)
+        if args:
+            arguments["_args"] = list(args)
+        key = ToolCache.make_key(self.name, arguments)
+        entry = self.cache.get(key) if self.mode != "record" else None
+
+        if entry is not None:
+            result, etag, last_modified, expires = entry
+            if self.mode == "replay" or time.time() < expires:
+                self.cache.hits += 1
+                current_span().set(cache="hit")
+                return result
+            url = arguments.get("website_url")
+            if url and (etag or last_modified) and _is_unchanged(url, etag, last_modified):
+                self.cache.touch(key, self.ttl)
+                self.cache.revalidated += 1
+                current_span().set(cache="revalidated")
+                return result
+
+        if self.mode == "replay":
+            self.cache.misses += 1
+            current_span().set(cache="miss")
+            return (
+                f"[offline] No recorded result for {self.name} with arguments "
+                f"{json.dumps(arguments, sort_keys=True, default=str)}."
+            )
+
+        self.cache.misses += 1
+        current_span().set(cache="miss")
+        result = str(self.tool._run(*args, **kwargs))
+        etag = last_modified = None
+        if arguments.get("website_url"):
+            etag, last_modified = _fetch_validators(arguments["website_url"])
+        self.cache.put(key, self.name, arguments, result, self.ttl, etag, last_modified)
+        return result
+
+
+def cached_tool(
+    tool: BaseTool,
+    cache: ToolCache,
+    ttl: Optional[float] = None,
+    mode: Optional[str] = None,
+) -> CachedTool:
+    """
+    Wraps a tool with the shared cache.
+
+    The TTL defaults to ``TOOL_CACHE_TTL_<TOOL CLASS NAME>`` (e.g.
+    ``TOOL_CACHE_TTL_SERPERDEVTOOL``), then to the per-tool defaults above.
+
+    Args:
+        - tool: The tool to wrap.
+        - cache: The shared tool cache.
+        - ttl: The number of seconds a result stays fresh.
+        - mode: The cache mode, ``TOOL_CACHE_MODE`` by default.
+
+    Returns:
+        - The cached tool, a drop-in replacement for the wrapped one.
+    """
+    class_name = type(tool).__name__
+    if ttl is None:
+        ttl = float(
+            os.getenv(
+                f"TOOL_CACHE_TTL_{class_name.upper()}",
+                DEFAULT_TTLS.get(class_name, FALLBACK_TTL),
+            )
+        )
+    mode = mode or os.getenv("TOOL_CACHE_MODE", "cache")
+    if mode not in MODES:
+        raise ValueError(f"Unknown tool cache mode: {mode}")
+    return CachedTool(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        tool=tool,
+        cache=cache,
+        ttl=ttl,
+        mode=mode,
+    )
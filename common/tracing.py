@@ -0,0 +1,493 @@
+"""
+Per-run tracing of chains and crews: where the time and the tokens go.
+
+A run is traced with ``with trace("app") as run:``. Inside it, every step
+becomes a span: LangChain chains, LLM calls, retrievers and tools through
+``run.handler()`` (a callback handler), crewAI tasks through
+``run.attach(agents)``, and the shared building blocks (embeddings, caches,
+cached tools, the LLM gateway) through ``span()``. Spans carry their duration
+and attributes such as token counts, cache hits and payload sizes.
+
+The current trace and span live in context variables, so nested spans get
+their parent without passing anything around. Spans created outside a trace
+are no-ops. Finished traces are written to a SQLite store (the last
+``LLM_HUB_TRACE_MAX_RUNS`` runs are kept) and, when ``LLM_HUB_TRACE_JSONL``
+names a file, appended to it as JSON lines. ``trace_panel(run.trace_id)``
+shows the waterfall of a run in Streamlit. ``LLM_HUB_TRACING=0`` turns tracing
+off.
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from common import cache_dir
+
+ENABLED = os.getenv("LLM_HUB_TRACING", "1") != "0"
+MAX_RUNS = int(os.getenv("LLM_HUB_TRACE_MAX_RUNS", "200"))
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+@dataclass
+class Span:
+    """
+    One timed step of a run.
+    """
+
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    kind: str
+    start: float
+    end: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+    def set(self, **attributes: Any) -> None:
+        """
+        Adds attributes to the span.
+
+        Args:
+            - attributes: The attributes, e.g. ``cache="hit"`` or ``total_tokens=120``.
+        """
+        self.attributes.update(attributes)
+
+    def add(self, **counters: float) -> None:
+        """
+        Increments numeric attributes of the span.
+
+        Args:
+            - counters: The increments, e.g. ``retries=1``.
+        """
+        for key, value in counters.items():
+            self.attributes[key] = self.attributes.get(key, 0) + value
+
+
+class _NoopSpan:
+    """
+    Span returned outside a trace, ignoring everything.
+    """
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def add(self, **counters: float) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """
+    The spans of one run.
+    """
+
+    def __init__(self, name: str, **attributes: Any):
+        """
+        Starts a trace and its root span.
+
+        Args:
+            - name: The name of the run, usually the app.
+            - attributes: Attributes of the root span.
+        """
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.root = self.start_span(name, "run", None, **attributes)
+
+    def start_span(
+        self, name: str, kind: str, parent: Optional[Span], **attributes: Any
+    ) -> Span:
+        """
+        Starts a span of this trace.
+
+        Args:
+            - name: The name of the step.
+            - kind: The kind of step, e.g. "llm", "retriever", "tool", "task" or "cache".
+            - parent: The parent span, None for the root.
+            - attributes: The initial attributes.
+
+        Returns:
+            - The started span.
+        """
+        span = Span(
+            trace_id=self.trace_id,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent is not None else None,
+            name=name,
+            kind=kind,
+            start=time.time(),
+            attributes=dict(attributes),
+        )
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    @staticmethod
+    def end_span(span: Span, error: Optional[BaseException] = None) -> None:
+        """
+        Ends a span, once.
+
+        Args:
+            - span: The span.
+            - error: The exception that ended the step, if any.
+        """
+        if span.end is None:
+            span.end = time.time()
+            if error is not None:
+                span.error = f"{type(error).__name__}: {error}"
+
+    def handler(self, agent: Optional[str] = None) -> Any:
+        """
+        Creates a LangChain callback handler adding the spans of a chain or agent to this trace.
+
+        Args:
+            - agent: The role of the crewAI agent the handler is attached to.
+
+        Returns:
+            - The callback handler.
+        """
+        # LangChain is only imported once a chain is traced, see common.callbacks
+        from common.callbacks import TracingCallbackHandler
+
+        return TracingCallbackHandler(self, agent)
+
+    def attach(self, agents: Iterable[Any]) -> None:
+        """
+        Traces the tasks of crewAI agents: each agent run becomes a task span
+        holding its LLM calls.
+
+        Args:
+            - agents: The crewAI agents of the run.
+        """
+        for agent in agents:
+            agent.callbacks = [*(agent.callbacks or []), self.handler(agent.role)]
+
+    def detach(self, agents: Iterable[Any]) -> None:
+        """
+        Removes the handlers added by ``attach``, so agents can be reused.
+
+        Args:
+            - agents: The crewAI agents of the run.
+        """
+        for agent in agents:
+            agent.callbacks = [
+                handler
+                for handler in agent.callbacks or []
+                if getattr(handler, "trace", None) is not self
+            ]
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Sums up the run.
+
+        Returns:
+            - The duration, the LLM calls and tokens, and the time spent per kind of step.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        llm_spans = [span for span in spans if span.kind == "llm"]
+        seconds: Dict[str, float] = {}
+        for span in spans:
+            if span is not self.root and span.duration is not None:
+                seconds[span.kind] = seconds.get(span.kind, 0.0) + span.duration
+        return {
+            "seconds": round(self.root.duration or 0.0, 3),
+            "spans": len(spans),
+            "llm_calls": len(llm_spans),
+            "total_tokens": sum(span.attributes.get("total_tokens", 0) for span in llm_spans),
+            "seconds_per_kind": {kind: round(value, 3) for kind, value in seconds.items()},
+            "errors": sum(1 for span in spans if span.error),
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    """
+    Returns the trace of the current context, None outside a trace.
+    """
+    return _current_trace.get()
+
+
+def current_span() -> Any:
+    """
+    Returns the innermost span of the current context, a no-op span outside a trace.
+    """
+    return _current_span.get() or _NOOP_SPAN
+
+
+@contextlib.contextmanager
+def trace(
+    name: str, store: Optional["TraceStore"] = None, **attributes: Any
+) -> Iterator[Optional[Trace]]:
+    """
+    Traces a run, saving its spans when it ends.
+
+    Args:
+        - name: The name of the run, usually the app.
+        - store: The trace store, the shared one by default.
+        - attributes: Attributes of the root span.
+
+    Returns:
+        - A context manager yielding the trace, None when tracing is off.
+    """
+    if not ENABLED:
+        yield None
+        return
+
+    run = Trace(name, **attributes)
+    trace_token = _current_trace.set(run)
+    span_token = _current_span.set(run.root)
+    error = None
+    try:
+        yield run
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        run.end_span(run.root, error)
+        run.root.set(**run.summary())
+        (store or get_trace_store()).save(run)
+
+
+@contextlib.contextmanager
+def span(name: str, kind: str = "step", **attributes: Any) -> Iterator[Any]:
+    """
+    Times a step as a child of the current span.
+
+    Args:
+        - name: The name of the step.
+        - kind: The kind of step.
+        - attributes: The initial attributes.
+
+    Returns:
+        - A context manager yielding the span, a no-op span outside a trace.
+    """
+    run = _current_trace.get()
+    if run is None:
+        yield _NOOP_SPAN
+        return
+
+    step = run.start_span(name, kind, _current_span.get(), **attributes)
+    token = _current_span.set(step)
+    try:
+        yield step
+    except BaseException as exc:
+        run.end_span(step, exc)
+        raise
+    finally:
+        _current_span.reset(token)
+        run.end_span(step)
+
+
+class TraceStore:
+    """
+    SQLite store of the spans of the last runs.
+    """
+
+    def __init__(self, path: Path, max_runs: int = MAX_RUNS, jsonl_path: Optional[Path] = None):
+        """
+        Opens (and creates if needed) the trace database.
+
+        Args:
+            - path: The path of the SQLite database file.
+            - max_runs: The number of runs kept, oldest first out.
+            - jsonl_path: A file every span is also appended to, as one JSON line.
+        """
+        self.max_runs = max_runs
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spans ("
+            "trace_id TEXT NOT NULL, span_id TEXT NOT NULL, parent_id TEXT, "
+            "run TEXT NOT NULL, name TEXT NOT NULL, kind TEXT NOT NULL, "
+            "start REAL NOT NULL, end REAL, attributes TEXT NOT NULL, error TEXT, "
+            "PRIMARY KEY (trace_id, span_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS spans_run ON spans (run, start)")
+        self._conn.commit()
+
+    def save(self, run: Trace) -> None:
+        """
+        Stores the spans of a finished run, dropping the oldest runs.
+
+        Args:
+            - run: The trace.
+        """
+        rows = [
+            (
+                span.trace_id,
+                span.span_id,
+                span.parent_id,
+                run.name,
+                span.name,
+                span.kind,
+                span.start,
+                span.end,
+                json.dumps(span.attributes, default=str),
+                span.error,
+            )
+            for span in list(run.spans)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.execute(
+                "DELETE FROM spans WHERE trace_id IN (SELECT trace_id FROM spans "
+                "WHERE parent_id IS NULL ORDER BY start DESC LIMIT -1 OFFSET ?)",
+                (self.max_runs,),
+            )
+            self._conn.commit()
+        if self.jsonl_path is not None:
+            with open(self.jsonl_path, "a", encoding="utf-8") as file:
+                for span in list(run.spans):
+                    file.write(json.dumps({"run": run.name, **asdict(span)}, default=str) + "\n")
+
+    def load(self, trace_id: str) -> List[Span]:
+        """
+        Loads the spans of a run.
+
+        Args:
+            - trace_id: The id of the trace of the run.
+
+        Returns:
+            - The spans ordered by start time, empty when the run is unknown or was dropped.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT trace_id, span_id, parent_id, name, kind, start, end, attributes, "
+                "error FROM spans WHERE trace_id = ? ORDER BY start",
+                (trace_id,),
+            ).fetchall()
+        return [
+            Span(
+                trace_id=trace_id,
+                span_id=span_id,
+                parent_id=parent_id,
+                name=span_name,
+                kind=kind,
+                start=start,
+                end=end,
+                attributes=json.loads(attributes),
+                error=error,
+            )
+            for trace_id, span_id, parent_id, span_name, kind, start, end, attributes, error in rows
+        ]
+
+
+_store: Optional[TraceStore] = None
+_store_lock = threading.Lock()
+
+
+def get_trace_store() -> TraceStore:
+    """
+    Returns the trace store of the process, under the shared cache directory.
+
+    Returns:
+        - The trace store.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            jsonl = os.getenv("LLM_HUB_TRACE_JSONL")
+            _store = TraceStore(
+                cache_dir("traces") / "traces.sqlite",
+                jsonl_path=Path(jsonl) if jsonl else None,
+            )
+        return _store
+
+
+def _depths(spans: List[Span]) -> Dict[str, int]:
+    parents = {span.span_id: span.parent_id for span in spans}
+    depths: Dict[str, int] = {}
+    for span in spans:
+        depth, parent = 0, span.parent_id
+        while parent is not None and parent in parents and depth < 32:
+            depth, parent = depth + 1, parents[parent]
+        depths[span.span_id] = depth
+    return depths
+
+
+def trace_panel(trace_id: Optional[str], container: Any = None) -> None:
+    """
+    Shows the waterfall of a traced run in Streamlit.
+
+    The run is looked up by its id, never by app name, so a session only sees
+    its own runs.
+
+    Args:
+        - trace_id: The id of the trace yielded by ``trace``, None when tracing is off.
+        - container: The Streamlit container, the page by default.
+    """
+    import altair as alt
+    import pandas as pd
+    import streamlit as st
+
+    spans = get_trace_store().load(trace_id) if ENABLED and trace_id else []
+    if not spans:
+        return
+
+    root = next((span for span in spans if span.parent_id is None), spans[0])
+    depths = _depths(spans)
+    rows = []
+    for order, span in enumerate(spans):
+        end = span.end if span.end is not None else span.start
+        rows.append(
+            {
+                "step": f"{order:03d} {'  ' * depths[span.span_id]}{span.name}",
+                "kind": span.kind,
+                "start": round(span.start - root.start, 3),
+                "end": round(end - root.start, 3),
+                "seconds": round(end - span.start, 3),
+                "tokens": span.attributes.get("total_tokens"),
+                "cache": span.attributes.get("cache"),
+                "attributes": json.dumps(span.attributes, default=str),
+                "error": span.error,
+            }
+        )
+    frame = pd.DataFrame(rows)
+
+    summary = root.attributes
+    with (container or st).expander(
+        f"Trace of this run: {summary.get('seconds', 0):.2f}s, "
+        f"{summary.get('llm_calls', 0)} LLM call(s), {summary.get('total_tokens', 0)} tokens"
+    ):
+        chart = (
+            alt.Chart(frame)
+            .mark_bar()
+            .encode(
+                x=alt.X("start:Q", title="seconds"),
+                x2="end:Q",
+                y=alt.Y("step:N", sort=None, title=None),
+                color="kind:N",
+                tooltip=["step", "kind", "seconds", "tokens", "cache", "attributes", "error"],
+            )
+            .properties(height=max(120, 22 * len(frame)))
+        )
+        st.altair_chart(chart, use_container_width=True)
+        st.dataframe(frame.drop(columns=["start", "end"]), hide_index=True)